@@ -1,8 +1,160 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, Dict, Any
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Tuple, Dict, Any, List, Optional, Iterable
+import hashlib
+import json
 import sys
 from pathlib import Path
 import re
+import unicodedata
+
+
+class TokenStream:
+    """Поток токенов файла: идентификаторы в интернированном словаре и смещения"""
+
+    def __init__(self, vocabulary: List[str], ids: array, offsets: array):
+        """
+        Args:
+            vocabulary: Словарь уникальных токенов, индекс в списке - идентификатор
+            ids: Идентификаторы токенов в порядке следования в тексте
+            offsets: Смещения начала каждого токена в тексте (в символах)
+        """
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.offsets = offsets
+        self._frequencies = None
+
+    @classmethod
+    def from_text(cls, text: str) -> "TokenStream":
+        """Разбивает текст по пробельным символам и интернирует токены"""
+        index: Dict[str, int] = {}
+        vocabulary: List[str] = []
+        ids = array('I')
+        offsets = array('Q')
+        for match in re.finditer(r'\S+', text):
+            token = match.group()
+            token_id = index.get(token)
+            if token_id is None:
+                token_id = index[token] = len(vocabulary)
+                vocabulary.append(token)
+            ids.append(token_id)
+            offsets.append(match.start())
+        return cls(vocabulary, ids, offsets)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def frequencies(self) -> array:
+        """Количество вхождений каждого токена словаря (вычисляется один раз)"""
+        if self._frequencies is None:
+            frequencies = array('I', [0]) * len(self.vocabulary)
+            for token_id, count in Counter(self.ids).items():
+                frequencies[token_id] = count
+            self._frequencies = frequencies
+        return self._frequencies
+
+    def occurrences(self, token_id: int) -> List[int]:
+        """Смещения всех вхождений токена в тексте"""
+        return [offset for current, offset in zip(self.ids, self.offsets) if current == token_id]
+
+
+class TokenStreamCache:
+    """Кэш потоков токенов с хранением на диске и инвалидацией по размеру и времени изменения файла"""
+
+    VERSION = 1
+    SUFFIX = ".tokens"
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Args:
+            cache_dir: Директория для файлов кэша; если не задана, кэш сохраняется рядом с файлом
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._memory: Dict[str, Tuple[Dict[str, Any], TokenStream]] = {}
+
+    def get(self, file_path: str, encoding: str = "utf-8") -> TokenStream:
+        """Возвращает поток токенов файла, перестраивая его при изменении файла"""
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        signature = {
+            "version": self.VERSION,
+            "source": str(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "encoding": encoding,
+            "byteorder": sys.byteorder,
+        }
+
+        cached = self._memory.get(str(path))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        cache_path = self.cache_path(path)
+        stream = self._load(cache_path, signature)
+        if stream is None:
+            with open(path, 'r', encoding=encoding) as file:
+                stream = TokenStream.from_text(file.read())
+            self._save(cache_path, signature, stream)
+
+        self._memory[str(path)] = (signature, stream)
+        return stream
+
+    def cache_path(self, path: Path) -> Path:
+        """Путь к файлу кэша для исходного файла"""
+        if self.cache_dir is None:
+            return path.with_name(f".{path.name}{self.SUFFIX}")
+        digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}{self.SUFFIX}"
+
+    @staticmethod
+    def _load(cache_path: Path, signature: Dict[str, Any]) -> Optional[TokenStream]:
+        """Загружает поток из файла кэша, если он соответствует исходному файлу"""
+        try:
+            with open(cache_path, 'rb') as file:
+                header = json.loads(file.readline())
+                if header.get("signature") != signature:
+                    return None
+                vocabulary_blob = file.read(header["vocabulary_bytes"])
+                ids = array('I')
+                offsets = array('Q')
+                if ids.itemsize != header["id_size"] or offsets.itemsize != header["offset_size"]:
+                    return None
+                ids.frombytes(file.read(header["tokens"] * ids.itemsize))
+                offsets.frombytes(file.read(header["tokens"] * offsets.itemsize))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        vocabulary = vocabulary_blob.decode("utf-8").split("\n") if vocabulary_blob else []
+        if len(vocabulary) != header["vocabulary"] or len(ids) != header["tokens"]:
+            return None
+        return TokenStream(vocabulary, ids, offsets)
+
+    @staticmethod
+    def _save(cache_path: Path, signature: Dict[str, Any], stream: TokenStream):
+        """Сохраняет поток в файл кэша; ошибки записи не мешают анализу"""
+        # Токены не содержат пробельных символов, поэтому перевод строки - надежный разделитель
+        vocabulary_blob = "\n".join(stream.vocabulary).encode("utf-8")
+        header = {
+            "signature": signature,
+            "vocabulary": len(stream.vocabulary),
+            "vocabulary_bytes": len(vocabulary_blob),
+            "tokens": len(stream.ids),
+            "id_size": stream.ids.itemsize,
+            "offset_size": stream.offsets.itemsize,
+        }
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            with open(tmp_path, 'wb') as file:
+                file.write(json.dumps(header).encode("utf-8") + b"\n")
+                file.write(vocabulary_blob)
+                file.write(stream.ids.tobytes())
+                file.write(stream.offsets.tobytes())
+            tmp_path.replace(cache_path)
+        except OSError:
+            pass
 
 
 class ITextProcessor(ABC):
@@ -18,6 +170,42 @@ class ITextProcessor(ABC):
         """Обработка файла"""
         pass
 
+    def process_stream(self, stream: TokenStream, search_word: str) -> Optional[Tuple[int, int]]:
+        """Обработка закэшированного потока токенов; None - если процессор не может ответить по потоку"""
+        return None
+
+
+class PunctuationTable(dict):
+    """Таблица символов пунктуации Unicode (категории P*): пунктуация отображается в None"""
+
+    def __init__(self, extra: str = ""):
+        """
+        Args:
+            extra: Дополнительные удаляемые символы
+        """
+        super().__init__((ord(char), None) for char in extra)
+
+    def __missing__(self, code: int) -> Optional[int]:
+        # Категория символа вычисляется один раз и запоминается в таблице
+        value = None if unicodedata.category(chr(code)).startswith('P') else code
+        self[code] = value
+        return value
+
+    def strip(self, word: str) -> str:
+        """Удаляет пунктуацию по краям слова; пунктуация внутри слова сохраняется"""
+        start, end = 0, len(word)
+        while start < end and self[ord(word[start])] is None:
+            start += 1
+        while end > start and self[ord(word[end - 1])] is None:
+            end -= 1
+        return word[start:end]
+
+
+@lru_cache(maxsize=None)
+def punctuation_table(extra: str = "") -> PunctuationTable:
+    """Общая таблица нормализации для заданного набора дополнительных символов"""
+    return PunctuationTable(extra)
+
 
 class SimpleTextProcessor(ITextProcessor):
     """Простой процессор текста"""
@@ -25,27 +213,39 @@ class SimpleTextProcessor(ITextProcessor):
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {
             "punctuation": ".,!?;:()\"'",
-            "encoding": "utf-8"
+            "encoding": "utf-8",
+            "block_size": 1 << 20
         }
+
+    def normalize(self, word: str) -> str:
+        """Удаляет пунктуацию по краям слова и приводит его к регистронезависимой форме"""
+        return punctuation_table(self.config["punctuation"]).strip(word).casefold()
     
     def process_text(self, text: str, search_word: str) -> Tuple[int, int]:
+        block_size = self.config.get("block_size", 1 << 20)
+        blocks = (text[start:start + block_size] for start in range(0, len(text), block_size))
+        return self._process_blocks(blocks, search_word)
+
+    def process_stream(self, stream: TokenStream, search_word: str) -> Optional[Tuple[int, int]]:
+        # Нормализация выполняется один раз на токен словаря, а не на каждое вхождение
+        search_word_normalized = self.normalize(search_word)
         total_words = 0
         word_count = 0
-        search_word_lower = search_word.lower()
-        
-        for word in text.split():
-            clean_word = word.strip(self.config["punctuation"]).lower()
+
+        for token, frequency in zip(stream.vocabulary, stream.frequencies()):
+            clean_word = self.normalize(token)
             if clean_word:
-                total_words += 1
-                word_count += clean_word == search_word_lower
-                
+                total_words += frequency
+                if clean_word == search_word_normalized:
+                    word_count += frequency
+
         return total_words, word_count
     
     def process_file(self, file_path: str, search_word: str) -> Tuple[int, int]:
         try:
             with open(file_path, 'r', encoding=self.config["encoding"]) as file:
-                text = file.read()
-                return self.process_text(text, search_word)
+                block_size = self.config.get("block_size", 1 << 20)
+                return self._process_blocks(iter(lambda: file.read(block_size), ''), search_word)
         except FileNotFoundError:
             print("Ошибка: файл не найден.")
             sys.exit(1)
@@ -53,6 +253,36 @@ class SimpleTextProcessor(ITextProcessor):
             print(f"Ошибка: {e}")
             sys.exit(1)
 
+    def _process_blocks(self, blocks: Iterable[str], search_word: str) -> Tuple[int, int]:
+        """Разбивает текст на слова крупными блоками и нормализует каждое различное слово один раз"""
+        words = Counter()
+        tail = ''
+
+        for block in blocks:
+            block = tail + block
+            # Незавершенное слово в конце блока переносим в следующий блок
+            tail = ''
+            if not block[-1].isspace():
+                parts = block.rsplit(None, 1)
+                tail = parts[-1]
+                block = parts[0] if len(parts) == 2 else ''
+
+            words.update(block.split())
+
+        words.update(tail.split())
+        search_word_normalized = self.normalize(search_word)
+        total_words = 0
+        word_count = 0
+
+        for word, frequency in words.items():
+            clean_word = self.normalize(word)
+            if clean_word:
+                total_words += frequency
+                if clean_word == search_word_normalized:
+                    word_count += frequency
+
+        return total_words, word_count
+
 
 class RegexTextProcessor(ITextProcessor):
     """Процессор текста с использованием регулярных выражений"""
@@ -80,6 +310,26 @@ class RegexTextProcessor(ITextProcessor):
         word_count = len(matches)
         
         return total_words, word_count
+
+    def process_stream(self, stream: TokenStream, search_word: str) -> Optional[Tuple[int, int]]:
+        # Слово с пробелами может совпасть через границу токенов - такой поиск делаем по тексту
+        if search_word.split() != [search_word]:
+            return None
+
+        if self.config["case_sensitive"]:
+            pattern = re.compile(r'\b' + re.escape(search_word) + r'\b')
+        else:
+            pattern = re.compile(r'\b' + re.escape(search_word.lower()) + r'\b')
+
+        total_words = 0
+        word_count = 0
+        for token, frequency in zip(stream.vocabulary, stream.frequencies()):
+            total_words += frequency * len(re.findall(r'\b\w+\b', token))
+            if not self.config["case_sensitive"]:
+                token = token.lower()
+            word_count += frequency * len(pattern.findall(token))
+
+        return total_words, word_count
     
     def process_file(self, file_path: str, search_word: str) -> Tuple[int, int]:
         try:
@@ -109,10 +359,21 @@ class TextProcessorFactory:
 class TextAnalyzer:
     """Основной класс для анализа текста"""
     
-    def __init__(self, processor: ITextProcessor):
+    def __init__(self, processor: ITextProcessor, cache: Optional[TokenStreamCache] = None):
         self.processor = processor
+        self.cache = cache
     
     def analyze_file(self, file_path: str, search_word: str) -> Tuple[int, int]:
+        if self.cache is not None:
+            try:
+                stream = self.cache.get(file_path, self.processor.config.get("encoding", "utf-8"))
+            except (OSError, ValueError):
+                # Ошибки чтения сообщает сам процессор
+                stream = None
+            if stream is not None:
+                result = self.processor.process_stream(stream, search_word)
+                if result is not None:
+                    return result
         return self.processor.process_file(file_path, search_word)
     
     def print_results(self, total_words: int, word_count: int, search_word: str):
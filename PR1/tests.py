@@ -1,5 +1,7 @@
 import unittest
 import os
+import tempfile
+import time
 from unittest.mock import patch, MagicMock
 
 from main import (
@@ -8,6 +10,8 @@ from main import (
     TextProcessorFactory,
     TextAnalyzer,
     ITextProcessor,
+    TokenStream,
+    TokenStreamCache,
     main
 )
 
@@ -56,6 +60,34 @@ class TestTextProcessing(unittest.TestCase):
         self.assertEqual(total_words, 8)
         self.assertEqual(word_count, 2)
 
+    def test_process_text_unicode_punctuation(self):
+        """Тест удаления пунктуации Unicode и приведения регистра"""
+        processor = SimpleTextProcessor()
+        text = "«Привет», — сказал он. “ПРИВЕТ!” привет… Straße"
+        self.assertEqual(processor.process_text(text, "привет"), (6, 3))
+        self.assertEqual(processor.process_text(text, "«Привет»"), (6, 3))
+        self.assertEqual(processor.process_text(text, "strasse"), (6, 1))
+
+    def test_process_text_inner_punctuation_kept(self):
+        """Тест: пунктуация удаляется только по краям слова, внутри слова сохраняется"""
+        processor = SimpleTextProcessor()
+        self.assertEqual(processor.process_text("cat cats cat's cat's cat's\ncat", "cats"), (6, 1))
+        self.assertEqual(processor.process_text("cat cats cat's cat's cat's\ncat", "cat's"), (6, 3))
+        self.assertEqual(processor.process_text("hello-world «hello-world»", "helloworld"), (2, 0))
+        self.assertEqual(processor.process_text("hello-world «hello-world»", "hello-world"), (2, 2))
+
+    def test_process_text_small_blocks(self):
+        """Тест подсчета слов, разрезанных границами блоков"""
+        text = "Hello world! Hello everyone.\nHello again."
+        for block_size in [1, 2, 3, 5, 7, 64]:
+            processor = SimpleTextProcessor({
+                "punctuation": ".,!?;:()\"'",
+                "encoding": "utf-8",
+                "block_size": block_size
+            })
+            self.assertEqual(processor.process_text(text, "hello"), (6, 3))
+            self.assertEqual(TextAnalyzer(processor).analyze_file("test.txt", "hello"), (6, 3))
+
     def test_empty_file(self):
         for processor in [SimpleTextProcessor(), RegexTextProcessor()]:
             analyzer = TextAnalyzer(processor)
@@ -127,6 +159,65 @@ class TestTextAnalyzer(unittest.TestCase):
             mocked_print.assert_any_call("Количество повторений слова 'word': 10")
 
 
+class TestTokenStreamCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        with open("stream.txt", "w", encoding="utf-8") as f:
+            f.write("Hello world! Hello everyone.\nHello again, cat's (cat) CAT \"cat\"")
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+        if os.path.exists("stream.txt"):
+            os.remove("stream.txt")
+
+    def test_stream_from_text(self):
+        stream = TokenStream.from_text("a b  a\nc")
+        self.assertEqual(stream.vocabulary, ["a", "b", "c"])
+        self.assertEqual(list(stream.ids), [0, 1, 0, 2])
+        self.assertEqual(list(stream.offsets), [0, 2, 5, 7])
+        self.assertEqual(list(stream.frequencies()), [2, 1, 1])
+        self.assertEqual(stream.occurrences(0), [0, 5])
+
+    def test_cached_results_match_processors(self):
+        cache = TokenStreamCache(self.cache_dir.name)
+        processors = [
+            SimpleTextProcessor(),
+            RegexTextProcessor(),
+            RegexTextProcessor({"encoding": "utf-8", "case_sensitive": True}),
+        ]
+        for processor in processors:
+            cached = TextAnalyzer(processor, cache)
+            direct = TextAnalyzer(processor)
+            for word in ["hello", "Hello", "cat", "cat's", "s", "missing", "hello world"]:
+                self.assertEqual(cached.analyze_file("stream.txt", word),
+                                 direct.analyze_file("stream.txt", word))
+
+    def test_cache_persisted_and_invalidated(self):
+        cache = TokenStreamCache(self.cache_dir.name)
+        stream = cache.get("stream.txt")
+        self.assertTrue(cache.cache_path(os.path.abspath("stream.txt")).exists())
+
+        # Новый экземпляр кэша читает поток с диска
+        reloaded = TokenStreamCache(self.cache_dir.name).get("stream.txt")
+        self.assertEqual(reloaded.vocabulary, stream.vocabulary)
+        self.assertEqual(reloaded.ids, stream.ids)
+        self.assertEqual(reloaded.offsets, stream.offsets)
+
+        # Изменение файла приводит к перестроению потока
+        time.sleep(0.01)
+        with open("stream.txt", "w", encoding="utf-8") as f:
+            f.write("new text")
+        analyzer = TextAnalyzer(SimpleTextProcessor(), cache)
+        self.assertEqual(analyzer.analyze_file("stream.txt", "new"), (2, 1))
+
+    def test_cache_file_not_found(self):
+        analyzer = TextAnalyzer(SimpleTextProcessor(), TokenStreamCache(self.cache_dir.name))
+        with patch('builtins.print') as mocked_print:
+            with self.assertRaises(SystemExit):
+                analyzer.analyze_file("nonexistent.txt", "test")
+            mocked_print.assert_any_call("Ошибка: файл не найден.")
+
+
 class TestMain(unittest.TestCase):
     def setUp(self):
         """Создаёт временные файлы для тестирования."""
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Сравнение исполнителей FileAnalysisService: пул потоков и пул процессов
+
+Исполнитель задается как backend[:transport], например process:shared_memory
+
+Пример:
+    python benchmark/analysis_backends.py --files 16 --size 4000000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from websocket.analysis_service import FileAnalysisService
+
+WORDS = ["анализ", "файл", "word", "text", "строка", "пример", "data", "сервер"]
+
+
+def generate_content(size: int, seed: int) -> str:
+    """Генерирует текст заданного размера (в символах)"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15)))
+        parts.append(line)
+        length += len(line) + 1
+    return "\n".join(parts)[:size]
+
+
+async def run_backend(backend: str, files: list, workers: int, repeat: int) -> float:
+    """Возвращает лучшее время анализа пакета файлов для исполнителя"""
+    backend, _, transport = backend.partition(":")
+    # Кэш результатов отключен, иначе повторы измеряли бы только попадания в кэш
+    service = FileAnalysisService(max_workers=workers, backend=backend, transport=transport or "pickle",
+                                  cache_entries=0)
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await service.analyze_files(files)
+            best = min(best, time.perf_counter() - started)
+        return best
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=16, help="Количество файлов в пакете")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Размер файла в символах")
+    parser.add_argument("--workers", type=int, default=4, help="Количество воркеров")
+    parser.add_argument("--repeat", type=int, default=3, help="Количество повторов")
+    parser.add_argument("--backends", default="thread,process,process:shared_memory", help="Исполнители через запятую")
+    args = parser.parse_args()
+
+    files = [
+        {"filename": f"file{i}.txt", "content": generate_content(args.size, i)}
+        for i in range(args.files)
+    ]
+    total_mb = args.files * args.size / 1_000_000
+    print(f"CPU: {os.cpu_count()}, файлов: {args.files}, размер: {args.size} симв., воркеров: {args.workers}")
+    for backend in args.backends.split(","):
+        elapsed = asyncio.run(run_backend(backend, files, args.workers, args.repeat))
+        print(f"{backend:>22}: {elapsed:.3f} с, {total_mb / elapsed:.1f} Мсимв/с")
+
+
+if __name__ == "__main__":
+    main()
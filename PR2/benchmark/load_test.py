@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест WebSocket сервера анализа: много одновременных клиентов
+
+Запускает сервер в отдельном процессе (или подключается к уже запущенному по --url),
+открывает заданное число соединений и после подключения всех клиентов одновременно
+начинает отправлять пакеты files (stream) с размерами файлов из заданного распределения.
+Каждый клиент отправляет следующий пакет после batch_complete предыдущего (замкнутый цикл).
+Измеряются пропускная способность и p50/p99/p999 времени до результата файла и пакета.
+
+Результаты сохраняются в JSON (--output) и сравниваются с сохраненным прогоном (--compare):
+при ухудшении больше допуска скрипт завершается с кодом 1.
+
+Пример:
+    python benchmark/load_test.py --clients 1000 --batches 5 --output base.json
+    python benchmark/load_test.py --clients 1000 --batches 5 --compare base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import websockets
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.analysis_backends import generate_content
+
+# Версия формата файла результатов
+REPORT_FORMAT = 1
+# Сколько рукопожатий выполняется одновременно: иначе при 1000 клиентах переполняется backlog
+CONNECT_CONCURRENCY = 100
+SERVER_START_TIMEOUT = 15.0
+
+# Метрики, по которым сравниваются прогоны: (путь в results, больше - лучше)
+COMPARED_METRICS = (
+    ("files_per_s", True),
+    ("file_latency_ms.p50", False),
+    ("file_latency_ms.p99", False),
+    ("batch_latency_ms.p50", False),
+    ("batch_latency_ms.p99", False),
+)
+# Показываются при сравнении, но не считаются регрессией: слишком шумные
+INFORMATIONAL_METRICS = ("file_latency_ms.p999", "batch_latency_ms.p999")
+
+
+def parse_sizes(spec: str) -> List[Tuple[int, float]]:
+    """
+    Разбирает распределение размеров файлов
+
+    Args:
+        spec: Пары размер:вес через запятую, например "1000:70,10000:25,100000:5"
+
+    Returns:
+        Список (размер в символах, вес)
+
+    Raises:
+        ValueError: Если спецификация некорректна
+    """
+    sizes = []
+    for part in spec.split(","):
+        size, _, weight = part.strip().partition(":")
+        size, weight = int(size), float(weight or 1)
+        if size <= 0 or weight <= 0:
+            raise ValueError(f"Некорректный размер или вес: {part!r}")
+        sizes.append((size, weight))
+    if not sizes:
+        raise ValueError("Не задано ни одного размера")
+    return sizes
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Процентиль q (0..100) отсортированной выборки по методу ближайшего ранга"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * q // 100))
+    return values[min(len(values), int(rank)) - 1]
+
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    """Сводка распределения задержек в миллисекундах"""
+    values = sorted(seconds)
+    summary = {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "p999": percentile(values, 99.9),
+        "max": values[-1] if values else 0.0,
+    }
+    return {key: value if key == "count" else round(value * 1000, 3) for key, value in summary.items()}
+
+
+class LoadStats:
+    """Измерения всех клиентов прогона (заполняются из одного event loop)"""
+
+    def __init__(self):
+        self.connect_times: List[float] = []
+        self.file_latencies: List[float] = []
+        self.batch_latencies: List[float] = []
+        self.files = 0
+        self.chars = 0
+        self.batches = 0
+        self.busy = 0
+        self.errors = 0
+        self.connect_errors = 0
+        self.dropped = 0
+        self.close_codes: Dict[int, int] = {}
+
+
+class LoadClient:
+    """Один клиент нагрузочного теста"""
+
+    def __init__(self, client_id: int, batches: int, files_per_batch: int,
+                 sizes: List[Tuple[int, float]], pool: Dict[int, str], seed: int, unique: bool):
+        """
+        Args:
+            client_id: Номер клиента
+            batches: Количество пакетов
+            files_per_batch: Количество файлов в пакете
+            sizes: Распределение размеров файлов
+            pool: Заготовленное содержимое для каждого размера
+            seed: Начальное значение генератора размеров
+            unique: Делать содержимое каждого файла уникальным (иначе работает кэш результатов)
+        """
+        self.client_id = client_id
+        self.batches = batches
+        self.files_per_batch = files_per_batch
+        self.sizes = [size for size, _ in sizes]
+        self.weights = [weight for _, weight in sizes]
+        self.pool = pool
+        self.rng = random.Random(seed * 1_000_003 + client_id)
+        self.unique = unique
+
+    def make_batch(self, batch_index: int) -> List[dict]:
+        """Файлы очередного пакета"""
+        files = []
+        for size in self.rng.choices(self.sizes, self.weights, k=self.files_per_batch):
+            index = len(files)
+            content = self.pool[size]
+            if self.unique:
+                content = f"c{self.client_id} b{batch_index} f{index}\n{content}"
+            files.append({"filename": f"c{self.client_id}-{batch_index}-{index}.txt", "content": content})
+        return files
+
+    async def run(self, url: str, stats: LoadStats, connect_limit: asyncio.Semaphore,
+                  connected: asyncio.Event, ready: List[int], start: asyncio.Event, think_time: float):
+        """Подключается, ждет общего старта и отправляет пакеты"""
+        websocket = None
+        async with connect_limit:
+            started = time.perf_counter()
+            try:
+                websocket = await websockets.connect(url, max_size=None, open_timeout=30)
+                stats.connect_times.append(time.perf_counter() - started)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+                stats.connect_errors += 1
+        ready[0] -= 1
+        if ready[0] == 0:
+            connected.set()
+        if websocket is None:
+            return
+
+        try:
+            await start.wait()
+            for batch_index in range(self.batches):
+                await self._run_batch(websocket, batch_index, stats)
+                if think_time:
+                    await asyncio.sleep(self.rng.expovariate(1 / think_time))
+        except websockets.ConnectionClosed as e:
+            # Например, 1009 - сообщение больше max_size сервера
+            stats.dropped += 1
+            stats.close_codes[e.code] = stats.close_codes.get(e.code, 0) + 1
+        finally:
+            await websocket.close()
+
+    async def _run_batch(self, websocket, batch_index: int, stats: LoadStats):
+        files = self.make_batch(batch_index)
+        batch_id = f"c{self.client_id}-{batch_index}"
+        # Как браузер: текст в UTF-8, без экранирования \uXXXX (сервер ограничивает размер сообщения)
+        message = json.dumps({"type": "files", "stream": True, "batch_id": batch_id, "files": files},
+                             ensure_ascii=False)
+        sent = time.perf_counter()
+        await websocket.send(message)
+        while True:
+            reply = json.loads(await websocket.recv())
+            now = time.perf_counter()
+            if reply.get("batch_id") != batch_id:
+                if reply.get("type") == "error":
+                    # Ошибка всего сообщения: результатов пакета не будет
+                    stats.errors += 1
+                    return
+                continue
+            kind = reply.get("type")
+            if kind == "analysis":
+                stats.file_latencies.append(now - sent)
+                stats.files += 1
+                stats.chars += len(files[reply["index"]]["content"])
+            elif kind == "batch_complete":
+                stats.batch_latencies.append(now - sent)
+                stats.batches += 1
+                return
+            elif reply.get("code") == "busy":
+                stats.busy += 1
+            else:
+                stats.errors += 1
+
+
+async def run_load(url: str, clients: int, batches: int, files_per_batch: int,
+                   sizes: List[Tuple[int, float]], seed: int = 0, unique: bool = True,
+                   think_time: float = 0.0) -> Dict[str, object]:
+    """
+    Выполняет нагрузочный прогон против запущенного сервера
+
+    Args:
+        url: Адрес WebSocket сервера
+        clients: Количество одновременных клиентов
+        batches: Количество пакетов от каждого клиента
+        files_per_batch: Количество файлов в пакете
+        sizes: Распределение размеров файлов (см. parse_sizes)
+        seed: Начальное значение генератора (одинаковые параметры - одинаковая нагрузка)
+        unique: Делать содержимое каждого файла уникальным
+        think_time: Средняя пауза клиента между пакетами в секундах
+
+    Returns:
+        Раздел results отчета
+    """
+    pool = {size: generate_content(size, seed + size) for size, _ in sizes}
+    stats = LoadStats()
+    connect_limit = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    connected = asyncio.Event()
+    start = asyncio.Event()
+    ready = [clients]
+    tasks = [
+        asyncio.ensure_future(
+            LoadClient(client_id, batches, files_per_batch, sizes, pool, seed, unique)
+            .run(url, stats, connect_limit, connected, ready, start, think_time)
+        )
+        for client_id in range(clients)
+    ]
+
+    await connected.wait()
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    duration = time.perf_counter() - started
+
+    return {
+        "duration_s": round(duration, 3),
+        "connections": len(stats.connect_times),
+        "batches": stats.batches,
+        "files": stats.files,
+        "chars": stats.chars,
+        "files_per_s": round(stats.files / duration, 1) if duration else 0.0,
+        "mchars_per_s": round(stats.chars / duration / 1_000_000, 3) if duration else 0.0,
+        "file_latency_ms": summarize(stats.file_latencies),
+        "batch_latency_ms": summarize(stats.batch_latencies),
+        "connect_ms": summarize(stats.connect_times),
+        "busy": stats.busy,
+        "errors": stats.errors,
+        "connect_errors": stats.connect_errors,
+        "dropped": stats.dropped,
+        "close_codes": {str(code): count for code, count in sorted(stats.close_codes.items())},
+    }
+
+
+def lookup(results: dict, path: str) -> Optional[float]:
+    """Значение метрики по пути вида "file_latency_ms.p99" """
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> Tuple[List[str], List[str]]:
+    """
+    Сравнивает результаты прогона с сохраненными
+
+    Args:
+        results: Раздел results текущего прогона
+        baseline: Раздел results сохраненного прогона
+        tolerance: Допустимое относительное ухудшение (0.1 - 10%)
+
+    Returns:
+        Строки таблицы сравнения и список регрессий
+    """
+    lines = []
+    regressions = []
+    for path, higher_is_better in COMPARED_METRICS + tuple((path, None) for path in INFORMATIONAL_METRICS):
+        current, previous = lookup(results, path), lookup(baseline, path)
+        if current is None or previous is None:
+            continue
+        change = (current - previous) / previous if previous else 0.0
+        regressed = higher_is_better is not None and (
+            change < -tolerance if higher_is_better else change > tolerance
+        )
+        mark = "РЕГРЕССИЯ" if regressed else ""
+        lines.append(f"{path:>22}: {previous:>12} -> {current:>12} ({change:+.1%}) {mark}".rstrip())
+        if regressed:
+            regressions.append(path)
+    return lines, regressions
+
+
+def raise_open_files_limit(required: int):
+    """Поднимает мягкий лимит открытых файлов: каждому клиенту нужен сокет"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = required if hard == resource.RLIM_INFINITY else min(required, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, backend: str, workers: int) -> subprocess.Popen:
+    """Запускает сервер этим же скриптом в режиме --serve и ждет, пока он начнет принимать соединения"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--backend", backend, "--workers", str(workers)],
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            with socket.create_connection(("localhost", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Сервер не запустился вовремя")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def serve(port: int, backend: str, workers: int):
+    """Режим --serve: WebSocket сервер до SIGTERM"""
+    from websocket.server import WebSocketServer
+
+    server = WebSocketServer(port=port, backend=backend, max_workers=workers)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(server.stop()))
+    await server.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100, help="Количество одновременных клиентов")
+    parser.add_argument("--batches", type=int, default=5, help="Количество пакетов от каждого клиента")
+    parser.add_argument("--files-per-batch", type=int, default=4, help="Количество файлов в пакете")
+    parser.add_argument("--sizes", default="1000:70,10000:25,100000:5",
+                        help="Распределение размеров файлов: размер:вес через запятую")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Средняя пауза клиента между пакетами, с")
+    parser.add_argument("--cached", action="store_true",
+                        help="Повторять содержимое файлов (измеряется кэш результатов)")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение генератора нагрузки")
+    parser.add_argument("--url", help="Адрес запущенного сервера; по умолчанию сервер запускается локально")
+    parser.add_argument("--backend", default="thread", help="Исполнитель анализа локального сервера")
+    parser.add_argument("--workers", type=int, default=4, help="Количество воркеров анализа локального сервера")
+    parser.add_argument("--output", help="Файл для сохранения результатов (JSON)")
+    parser.add_argument("--compare", help="Файл сохраненных результатов для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Допустимое ухудшение при сравнении (доля)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    raise_open_files_limit(args.clients + 256)
+    if args.serve:
+        asyncio.run(serve(args.port, args.backend, args.workers))
+        return 0
+
+    sizes = parse_sizes(args.sizes)
+    config = {
+        "clients": args.clients,
+        "batches": args.batches,
+        "files_per_batch": args.files_per_batch,
+        "sizes": args.sizes,
+        "think_time": args.think_time,
+        "cached": args.cached,
+        "seed": args.seed,
+        "server": args.url or f"local:{args.backend}:{args.workers}",
+    }
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port, args.backend, args.workers)
+        url = f"ws://localhost:{port}"
+    try:
+        results = asyncio.run(run_load(
+            url, args.clients, args.batches, args.files_per_batch, sizes,
+            seed=args.seed, unique=not args.cached, think_time=args.think_time
+        ))
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    report = {
+        "format": REPORT_FORMAT,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+    file_ms, batch_ms = results["file_latency_ms"], results["batch_latency_ms"]
+    print(f"Клиентов: {results['connections']}/{args.clients}, пакетов: {results['batches']}, "
+          f"файлов: {results['files']} за {results['duration_s']} с")
+    print(f"Пропускная способность: {results['files_per_s']} файлов/с, {results['mchars_per_s']} Мсимв/с")
+    print(f"Файл, мс:  p50 {file_ms['p50']}, p99 {file_ms['p99']}, p999 {file_ms['p999']}")
+    print(f"Пакет, мс: p50 {batch_ms['p50']}, p99 {batch_ms['p99']}, p999 {batch_ms['p999']}")
+    print(f"Отказы busy: {results['busy']}, ошибки: {results['errors']}, "
+          f"ошибки подключения: {results['connect_errors']}, разрывы: {results['dropped']} {results['close_codes'] or ''}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("config") != config:
+            print("Внимание: параметры прогонов различаются, сравнение может быть некорректным")
+        lines, regressions = compare(results, baseline["results"], args.tolerance)
+        print(f"Сравнение с {args.compare}:")
+        print("\n".join(lines))
+        if regressions:
+            print(f"Регрессии (допуск {args.tolerance:.0%}): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class StaticAsset:
+    """Статический файл, загруженный в память вместе со сжатым вариантом"""
+    path: str
+    body: bytes
+    gzip_body: Optional[bytes]
+    content_type: str
+    etag: str
+    gzip_etag: Optional[str]
+    mtime_ns: int
+    size: int
+    last_modified: str
+
+    @property
+    def mtime(self) -> int:
+        """Время изменения с точностью до секунды (точность заголовка Last-Modified)"""
+        return self.mtime_ns // 1_000_000_000
+
+    def matches_etag(self, header: str) -> bool:
+        """Проверяет заголовок If-None-Match (слабое сравнение, RFC 7232)"""
+        if header.strip() == "*":
+            return True
+        tags = self._etags(header)
+        return self.etag in tags or (self.gzip_etag is not None and self.gzip_etag in tags)
+
+    def not_modified_etag(self, header: Optional[str], use_gzip: bool) -> str:
+        """
+        ETag для ответа 304: тот, что совпал с If-None-Match
+
+        Args:
+            header: Заголовок If-None-Match (None - ответ по If-Modified-Since)
+            use_gzip: Выбрано ли сжатое представление для этого клиента
+
+        Returns:
+            Совпавший ETag; если совпали оба, "*" или заголовка нет - ETag выбранного представления
+        """
+        selected = self.gzip_etag if use_gzip and self.gzip_etag is not None else self.etag
+        if header is None or header.strip() == "*":
+            return selected
+        tags = self._etags(header)
+        if selected in tags:
+            return selected
+        return self.gzip_etag if self.gzip_etag in tags else self.etag
+
+    @staticmethod
+    def _etags(header: str) -> set:
+        return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+class AssetCache:
+    """Кэш статических файлов каталога в памяти с отслеживанием изменений"""
+
+    def __init__(self, directory: str, max_asset_size: int = 1 << 20,
+                 min_gzip_size: int = 256, check_interval: float = 1.0):
+        """
+        Инициализирует кэш статических файлов
+
+        Args:
+            directory: Каталог со статическими файлами
+            max_asset_size: Максимальный размер файла, хранимого в памяти
+            min_gzip_size: Минимальный размер файла, для которого готовится gzip-вариант
+            check_interval: Интервал (в секундах) между проверками изменения файла
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_asset_size = max_asset_size
+        self.min_gzip_size = min_gzip_size
+        self.check_interval = check_interval
+        self._assets: Dict[str, StaticAsset] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Загружает в память все подходящие файлы каталога"""
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                self._refresh(os.path.join(root, filename))
+
+    def get(self, url_path: str) -> Optional[StaticAsset]:
+        """
+        Возвращает файл по пути из URL, перечитывая его при изменении на диске
+
+        Args:
+            url_path: Путь из строки запроса
+
+        Returns:
+            Файл из кэша или None, если файл не найден или не кэшируется
+        """
+        path = self.resolve(url_path)
+        if path is None:
+            return None
+
+        now = time.monotonic()
+        asset = self._assets.get(path)
+        if asset is not None and now - self._checked_at.get(path, 0) < self.check_interval:
+            return asset
+        self._checked_at[path] = now
+        return self._refresh(path)
+
+    def resolve(self, url_path: str) -> Optional[str]:
+        """Преобразует путь из URL в путь файла внутри каталога"""
+        path = urllib.parse.unquote(url_path.split('?', 1)[0].split('#', 1)[0])
+        path = posixpath.normpath(path)
+        if path in ("/", "."):
+            path = "/index.html"
+        parts = [part for part in path.split('/') if part and part not in (".", "..")]
+        full_path = os.path.join(self.directory, *parts)
+        if not full_path.startswith(self.directory + os.sep):
+            return None
+        return full_path
+
+    def _refresh(self, path: str) -> Optional[StaticAsset]:
+        """Перечитывает файл, если изменились его размер или время изменения"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._assets.pop(path, None)
+            return None
+
+        asset = self._assets.get(path)
+        if asset is not None and asset.mtime_ns == stat.st_mtime_ns and asset.size == stat.st_size:
+            return asset
+        if not os.path.isfile(path) or stat.st_size > self.max_asset_size:
+            self._assets.pop(path, None)
+            return None
+
+        with self._lock:
+            try:
+                with open(path, 'rb') as file:
+                    body = file.read()
+            except OSError:
+                self._assets.pop(path, None)
+                return None
+            asset = self._build(path, body, stat.st_mtime_ns)
+            self._assets[path] = asset
+            return asset
+
+    def _build(self, path: str, body: bytes, mtime_ns: int) -> StaticAsset:
+        """Готовит файл к отдаче: тип, сильный ETag и сжатый вариант"""
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+
+        gzip_body = None
+        if len(body) >= self.min_gzip_size:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                gzip_body = compressed
+
+        return StaticAsset(
+            path=path,
+            body=body,
+            gzip_body=gzip_body,
+            content_type=content_type,
+            etag=f'"{digest}"',
+            gzip_etag=f'"{digest}-gz"' if gzip_body is not None else None,
+            mtime_ns=mtime_ns,
+            size=len(body),
+            last_modified=email.utils.formatdate(mtime_ns / 1_000_000_000, usegmt=True)
+        )
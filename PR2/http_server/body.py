@@ -0,0 +1,315 @@
+import email.parser
+from email.message import Message
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, Optional
+
+# Размер блока, читаемого из сокета за один раз
+READ_SIZE = 64 << 10
+# Предельная длина строки размера части chunked и заголовков части multipart
+MAX_LINE_SIZE = 8 << 10
+MAX_HEADER_SIZE = 16 << 10
+
+
+class BodyError(ValueError):
+    """Тело запроса оборвано или не соответствует заявленному формату"""
+
+
+class LimitedReader:
+    """Тело запроса с известной длиной (Content-Length)"""
+
+    def __init__(self, stream: BinaryIO, length: int):
+        """
+        Инициализирует чтение тела
+
+        Args:
+            stream: Буферизованный поток соединения
+            length: Длина тела в байтах
+        """
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size: int = READ_SIZE) -> bytes:
+        """
+        Читает уже поступившие данные тела, не дожидаясь заполнения всего блока
+
+        Args:
+            size: Максимальный размер блока
+
+        Returns:
+            Блок данных; пустой - тело прочитано полностью
+
+        Raises:
+            BodyError: Если соединение закрыто до конца тела
+        """
+        if self.remaining <= 0:
+            return b''
+        data = self.stream.read1(min(size, self.remaining))
+        if not data:
+            raise BodyError("Соединение закрыто до конца тела запроса")
+        self.remaining -= len(data)
+        return data
+
+
+class ChunkedReader:
+    """Тело запроса в кодировании Transfer-Encoding: chunked"""
+
+    def __init__(self, stream: BinaryIO):
+        """
+        Инициализирует чтение тела
+
+        Args:
+            stream: Буферизованный поток соединения
+        """
+        self.stream = stream
+        # Непрочитанный остаток текущей части
+        self.remaining = 0
+        self.done = False
+
+    def read(self, size: int = READ_SIZE) -> bytes:
+        """
+        Читает уже поступившие данные тела, не дожидаясь заполнения всего блока
+
+        Args:
+            size: Максимальный размер блока
+
+        Returns:
+            Блок данных; пустой - тело прочитано полностью
+
+        Raises:
+            BodyError: Если соединение закрыто до конца тела или нарушен формат частей
+        """
+        while self.remaining == 0:
+            if self.done:
+                return b''
+            self._next_chunk()
+        data = self.stream.read1(min(size, self.remaining))
+        if not data:
+            raise BodyError("Соединение закрыто до конца тела запроса")
+        self.remaining -= len(data)
+        if self.remaining == 0 and self._readline() != b"\r\n":
+            raise BodyError("Нет разделителя после части тела")
+        return data
+
+    def _next_chunk(self):
+        """Читает строку размера следующей части; нулевая часть завершает тело"""
+        line = self._readline()
+        try:
+            # Расширения части после ';' не используются
+            size = int(line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise BodyError(f"Неверный размер части тела: {line[:32]!r}") from None
+        if size < 0:
+            raise BodyError(f"Неверный размер части тела: {line[:32]!r}")
+        if size == 0:
+            # Завершающие заголовки (trailers) пропускаются до пустой строки
+            while self._readline() != b"\r\n":
+                pass
+            self.done = True
+        self.remaining = size
+
+    def _readline(self) -> bytes:
+        line = self.stream.readline(MAX_LINE_SIZE + 1)
+        if not line.endswith(b"\n") or len(line) > MAX_LINE_SIZE:
+            raise BodyError("Оборванная или слишком длинная строка в теле запроса")
+        return line
+
+
+class MultipartPart:
+    """Часть тела multipart/form-data; содержимое читается по мере поступления"""
+
+    def __init__(self, reader: "MultipartReader", headers: Message):
+        self._reader = reader
+        self.headers = headers
+        self.finished = False
+
+    @property
+    def name(self) -> Optional[str]:
+        """Имя поля формы"""
+        return self.headers.get_param("name", header="content-disposition")
+
+    @property
+    def filename(self) -> Optional[str]:
+        """Имя загружаемого файла; None - обычное поле формы"""
+        return self.headers.get_filename()
+
+    @property
+    def charset(self) -> Optional[str]:
+        """Кодировка из Content-Type части"""
+        return self.headers.get_content_charset()
+
+    def read(self, size: int = READ_SIZE) -> bytes:
+        """
+        Читает следующий блок содержимого части
+
+        Args:
+            size: Максимальный размер блока
+
+        Returns:
+            Блок данных; пустой - часть прочитана полностью
+        """
+        if self.finished:
+            return b''
+        data = self._reader._read_part(size)
+        if not data:
+            self.finished = True
+        return data
+
+    def drain(self):
+        """Пропускает непрочитанное содержимое части"""
+        while self.read():
+            pass
+
+
+class MultipartReader:
+    """
+    Потоковый разбор тела multipart/form-data
+
+    Части выдаются по одной, а их содержимое читается блоками прямо из тела запроса:
+    в буфере находится не больше блока чтения и хвоста, который может оказаться началом
+    разделителя, поэтому память не зависит от размера частей. Следующая часть доступна
+    после того, как предыдущая прочитана или пропущена.
+    """
+
+    def __init__(self, body, boundary: str, read_size: int = READ_SIZE):
+        """
+        Инициализирует разбор тела
+
+        Args:
+            body: Тело запроса с методом read(size) (LimitedReader или ChunkedReader)
+            boundary: Разделитель частей из Content-Type
+            read_size: Размер блока, читаемого из тела за один раз
+        """
+        if not boundary or len(boundary) > 70:
+            raise BodyError("Неверный разделитель частей multipart")
+        self.body = body
+        self.read_size = read_size
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # Первому разделителю не предшествует перевод строки: добавляем его, чтобы все
+        # разделители искались одинаково
+        self._buffer = bytearray(b"\r\n")
+        self._started = False
+        self._done = False
+        self._part: Optional[MultipartPart] = None
+
+    def __iter__(self) -> Iterator[MultipartPart]:
+        return self
+
+    def __next__(self) -> MultipartPart:
+        if self._part is not None:
+            self._part.drain()
+            self._part = None
+        if self._done:
+            raise StopIteration
+        if not self._started:
+            self._started = True
+            self._skip_preamble()
+        while len(self._buffer) < 2:
+            self._fill()
+        marker = bytes(self._buffer[:2])
+        del self._buffer[:2]
+        if marker == b"--":
+            # Эпилог после последнего разделителя пропускается
+            self._done = True
+            self._buffer.clear()
+            while self.body.read(self.read_size):
+                pass
+            raise StopIteration
+        if marker != b"\r\n":
+            raise BodyError("Нет перевода строки после разделителя части")
+        self._part = MultipartPart(self, self._read_headers())
+        return self._part
+
+    def _fill(self):
+        data = self.body.read(self.read_size)
+        if not data:
+            raise BodyError("Тело multipart оборвано до последнего разделителя")
+        self._buffer += data
+
+    def _skip_preamble(self):
+        """Пропускает данные до первого разделителя"""
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                del self._buffer[:index + len(self._delimiter)]
+                return
+            del self._buffer[:max(len(self._buffer) - len(self._delimiter) + 1, 0)]
+            self._fill()
+
+    def _read_headers(self) -> Message:
+        """Читает заголовки части до пустой строки"""
+        while True:
+            if self._buffer.startswith(b"\r\n"):
+                raw, end = b"", 2
+                break
+            index = self._buffer.find(b"\r\n\r\n")
+            if index >= 0:
+                raw, end = bytes(self._buffer[:index]), index + 4
+                break
+            if len(self._buffer) > MAX_HEADER_SIZE:
+                raise BodyError("Слишком длинные заголовки части multipart")
+            self._fill()
+        del self._buffer[:end]
+        # Браузеры передают имена файлов в UTF-8 без кодирования по RFC 2231
+        return email.parser.HeaderParser().parsestr(raw.decode("utf-8", "replace"))
+
+    def _read_part(self, size: int) -> bytes:
+        """Читает блок содержимого текущей части; пустой - достигнут разделитель"""
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index == 0:
+                del self._buffer[:len(self._delimiter)]
+                return b''
+            # Хвост буфера короче разделителя может оказаться его началом
+            available = index if index > 0 else len(self._buffer) - len(self._delimiter) + 1
+            if available > 0:
+                data = bytes(self._buffer[:min(available, size)])
+                del self._buffer[:len(data)]
+                return data
+            self._fill()
+
+
+def iter_chunks(body, size: int) -> Iterator[bytes]:
+    """
+    Выдает содержимое блоками примерно по size байт, объединяя короткие чтения
+
+    Args:
+        body: Источник с методом read(size) (тело запроса или часть multipart)
+        size: Желаемый размер блока
+
+    Yields:
+        Блоки содержимого; последний может быть короче
+    """
+    chunk = bytearray()
+    while True:
+        data = body.read(size - len(chunk))
+        if not data:
+            break
+        chunk += data
+        if len(chunk) >= size:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+async def aiter_chunks(read: Callable[[int], Awaitable[bytes]], size: int) -> AsyncIterator[bytes]:
+    """
+    Выдает содержимое блоками примерно по size байт из асинхронного источника (см. iter_chunks)
+
+    Args:
+        read: Корутина чтения до n байт; пустой результат - конец содержимого
+        size: Желаемый размер блока
+
+    Yields:
+        Блоки содержимого; последний может быть короче
+    """
+    chunk = bytearray()
+    while True:
+        data = await read(size - len(chunk))
+        if not data:
+            break
+        chunk += data
+        if len(chunk) >= size:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
@@ -1,28 +1,579 @@
+import asyncio
+import email.utils
 import http.server
+import json
+import os
+import re
+import urllib.parse
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
 
+from http_server.asset_cache import AssetCache, StaticAsset
+from http_server.body import BodyError, ChunkedReader, LimitedReader, MultipartReader, iter_chunks
 from http_server.interfaces import WebServerHandlerInterface
+from monitoring.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from websocket.admission import AdmissionController, AdmissionRejected
+from websocket.analysis_service import FileAnalysisService, StreamAnalysis
+from websocket.engine import parse_encoding, parse_metrics
+from websocket.scheduler import job_owner
+
+# Каталог статических файлов не зависит от текущей рабочей директории
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+UNSATISFIABLE = (-1, -1)
+# Размер части тела, передаваемой анализатору одной задачей
+STREAM_CHUNK_SIZE = 256 << 10
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном байт
+
+    Args:
+        header: Значение заголовка Range
+        size: Размер файла
+
+    Returns:
+        Пара (начало, конец включительно), None - если заголовок не поддерживается
+        или синтаксически неверен и нужно отдать файл целиком (RFC 9110, 14.2),
+        UNSATISFIABLE - если диапазон вне файла
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Суффиксный диапазон: последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            return UNSATISFIABLE
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and start > int(last):
+        # Неверный диапазон: заголовок игнорируется
+        return None
+    if start >= size:
+        return UNSATISFIABLE
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def accepts_gzip(headers: Mapping[str, str]) -> bool:
+    """Проверяет, принимает ли клиент ответ в gzip"""
+    for coding in headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def not_modified_since(header: Optional[str], mtime: int) -> bool:
+    """Проверяет, что файл не менялся с указанной в заголовке даты"""
+    if header is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return since.timestamp() >= mtime
+
+
+def is_not_modified(headers: Mapping[str, str], matches_etag: Callable[[str], bool], mtime: int) -> bool:
+    """
+    Проверяет условные заголовки If-None-Match и If-Modified-Since
+
+    Args:
+        headers: Заголовки запроса
+        matches_etag: Проверяет, совпадает ли значение заголовка с ETag файла
+        mtime: Время изменения файла
+
+    Returns:
+        True, если можно ответить 304 Not Modified
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        # If-Modified-Since игнорируется при наличии If-None-Match (RFC 7232)
+        return matches_etag(if_none_match)
+    return not_modified_since(headers.get("If-Modified-Since"), mtime)
+
+
+def requested_range(headers: Mapping[str, str], size: int, matches_etag: Callable[[str], bool],
+                    mtime: int) -> Optional[Tuple[int, int]]:
+    """
+    Возвращает запрошенный диапазон с учетом If-Range
+
+    Args:
+        headers: Заголовки запроса
+        size: Размер файла
+        matches_etag: Проверяет, совпадает ли значение заголовка с ETag файла
+        mtime: Время изменения файла
+
+    Returns:
+        Диапазон, UNSATISFIABLE или None (см. parse_byte_range)
+    """
+    range_header = headers.get("Range")
+    if range_header is None:
+        return None
+    if_range = headers.get("If-Range")
+    if if_range is not None:
+        # If-Range с устаревшим валидатором означает запрос всего файла
+        valid = (matches_etag(if_range) and not if_range.strip().startswith("W/")) \
+            if if_range.strip().endswith('"') else not_modified_since(if_range, mtime)
+        if not valid:
+            return None
+    return parse_byte_range(range_header, size)
+
+
+def parse_analyze_query(query: str) -> Tuple[Tuple[str, ...], str, str]:
+    """
+    Разбирает параметры запроса POST /analyze
+
+    Args:
+        query: Строка параметров URL
+
+    Returns:
+        Метрики, кодировка и имя файла (для тела с одним файлом)
+
+    Raises:
+        ValueError: Если метрика неизвестна
+        LookupError: Если кодировка неизвестна или не является текстовой
+    """
+    params = urllib.parse.parse_qs(query)
+    names = [name for value in params.get('metrics', []) for name in value.split(',') if name]
+    metrics = parse_metrics(names if 'metrics' in params else None)
+    encoding = parse_encoding(params.get('encoding', ['utf-8'])[0])
+    return metrics, encoding, params.get('filename', ['file'])[0]
+
+
+async def feed_admitted(stream: StreamAnalysis, chunk: bytes, admission: Optional[AdmissionController],
+                        key: object):
+    """
+    Передает блок загрузки POST /analyze анализатору после контроля допуска
+
+    Args:
+        stream: Потоковый анализ файла
+        chunk: Блок содержимого
+        admission: Контроль допуска (None - без контроля)
+        key: Запрос, от которого пришел блок (лимиты соединения)
+
+    Raises:
+        AdmissionRejected: Если бюджет не освободился за max_wait секунд
+    """
+    if admission is None:
+        await stream.feed(chunk)
+        return
+    async with admission.admit(key, len(chunk)):
+        await stream.feed(chunk)
+
+
+def analyze_response(results: List[Tuple[str, object]]) -> dict:
+    """
+    Формирует ответ POST /analyze
+
+    Args:
+        results: Пары (имя файла, результат анализа или исключение) в порядке файлов запроса
+
+    Returns:
+        {'results': [...], 'count': N, 'failed': K} с сообщениями analysis или error
+    """
+    messages = []
+    for index, (filename, result) in enumerate(results):
+        if isinstance(result, AdmissionRejected):
+            message = {'type': 'error', 'code': 'busy', 'message': str(result),
+                       'retry_after': result.retry_after, 'filename': filename}
+        elif isinstance(result, Exception):
+            message = {'type': 'error', 'message': f"Ошибка при анализе файла: {result}", 'filename': filename}
+        else:
+            message = result.to_dict()
+        message['index'] = index
+        messages.append(message)
+    failed = sum(message['type'] == 'error' for message in messages)
+    return {'results': messages, 'count': len(messages), 'failed': failed}
 
 
 class HttpHandler(http.server.SimpleHTTPRequestHandler, WebServerHandlerInterface):
     """Обработчик HTTP-запросов"""
 
-    def __init__(self, *args, **kwargs):
+    protocol_version = "HTTP/1.1"
+    # Простаивающее keep-alive соединение закрывается по таймауту и освобождает поток
+    timeout = 30
+
+    # Максимальное число файлов в одном запросе POST /analyze
+    max_upload_files = 1000
+
+    def __init__(self, *args, keep_alive: bool = True, assets: Optional[AssetCache] = None,
+                 registry: Optional[Registry] = None, analysis_service: Optional[FileAnalysisService] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 admission: Optional[AdmissionController] = None, **kwargs):
         """
         Инициализирует HTTP обработчик
 
         Args:
             *args: Позиционные аргументы для родительского класса
+            keep_alive: Использовать HTTP/1.1 с постоянными соединениями
+            assets: Кэш статических файлов; без него файлы читаются с диска
+            registry: Реестр метрик, выдаваемый по /metrics; без него /metrics не обслуживается
+            analysis_service: Сервис анализа для POST /analyze; без него POST не обслуживается
+            loop: Event loop, в котором работает сервис анализа
+            admission: Контроль допуска блоков POST /analyze (обычно общий с WebSocket сервером)
             **kwargs: Именованные аргументы для родительского класса
         """
-        super().__init__(*args, directory="templates", **kwargs)
+        if not keep_alive:
+            self.protocol_version = "HTTP/1.0"
+        self.assets = assets
+        self.registry = registry
+        self.analysis_service = analysis_service
+        self.loop = loop
+        self.admission = admission
+        super().__init__(*args, directory=TEMPLATES_DIR, **kwargs)
 
     def do_GET(self):
         """Обработка GET-запросов"""
         try:
-            super().do_GET()
+            if self._send_metrics():
+                return
+            if not self._send_cached_asset() and not self._send_file():
+                super().do_GET()
+        except Exception:
+            self.send_error(500)
+
+    def do_HEAD(self):
+        """Обработка HEAD-запросов"""
+        try:
+            if self._send_metrics(include_body=False):
+                return
+            if not self._send_cached_asset(include_body=False) and not self._send_file(include_body=False):
+                super().do_HEAD()
         except Exception:
             self.send_error(500)
 
     def do_POST(self):
         """Обработка POST-запросов"""
-        self.send_error(405)
\ No newline at end of file
+        try:
+            if not self._analyze_upload():
+                self.send_error(405)
+        except Exception:
+            # Тело запроса могло остаться непрочитанным
+            self.close_connection = True
+            self.send_error(500)
+
+    def _analyze_upload(self) -> bool:
+        """
+        Анализирует файлы из тела запроса POST /analyze
+
+        Тело - один файл (имя и кодировка в параметрах filename и encoding или charset
+        в Content-Type) или multipart/form-data с файлами в частях. Тело читается блоками
+        по мере поступления, и каждый блок сразу передается анализатору общего сервиса
+        анализа, поэтому загрузка не хранится в памяти целиком. Параметр metrics
+        (через запятую) выбирает метрики.
+
+        Returns:
+            True, если запрошен /analyze и ответ отправлен
+        """
+        path, _, query = self.path.partition('?')
+        if self.analysis_service is None or path != "/analyze":
+            return False
+        # Задачи соединения планируются в его собственной очереди (см. JobScheduler)
+        job_owner.set(('http', id(self)))
+        try:
+            metrics, encoding, filename = parse_analyze_query(query)
+            body = self._request_body()
+        except (ValueError, LookupError) as e:
+            self.close_connection = True
+            self._send_json(400, {'type': 'error', 'message': str(e)})
+            return True
+        if body is None:
+            self.close_connection = True
+            self._send_json(411, {'type': 'error', 'message': "Требуется Content-Length или chunked"})
+            return True
+
+        try:
+            if self.headers.get_content_type() == "multipart/form-data":
+                results = self._analyze_parts(MultipartReader(body, self.headers.get_param("boundary")),
+                                              encoding, metrics)
+            else:
+                encoding = self.headers.get_content_charset() or encoding
+                results = [self._analyze_stream(filename, iter_chunks(body, STREAM_CHUNK_SIZE), encoding, metrics)]
+        except BodyError as e:
+            self.close_connection = True
+            self._send_json(400, {'type': 'error', 'message': str(e)})
+            return True
+        except OverflowError as e:
+            self.close_connection = True
+            self._send_json(413, {'type': 'error', 'message': str(e)})
+            return True
+
+        self._send_json(200, analyze_response(results))
+        return True
+
+    def _request_body(self):
+        """
+        Возвращает поток тела запроса
+
+        Returns:
+            Источник с методом read(size); None - длина тела не указана
+
+        Raises:
+            ValueError: Если Content-Length неверен
+        """
+        if self.headers.get("Transfer-Encoding", "").strip().lower() == "chunked":
+            return ChunkedReader(self.rfile)
+        length = self.headers.get("Content-Length")
+        if length is None:
+            return None
+        if not length.strip().isdigit():
+            raise ValueError(f"Неверный Content-Length: {length}")
+        return LimitedReader(self.rfile, int(length))
+
+    def _analyze_parts(self, reader: MultipartReader, encoding: str,
+                       metrics: Tuple[str, ...]) -> List[Tuple[str, object]]:
+        """
+        Анализирует файлы из частей multipart по мере их поступления
+
+        Части без имени файла (обычные поля формы) пропускаются
+
+        Returns:
+            Пары (имя файла, результат анализа или исключение)
+
+        Raises:
+            BodyError: Если тело оборвано или нарушен формат multipart
+            OverflowError: Если файлов больше max_upload_files
+        """
+        results = []
+        for part in reader:
+            filename = part.filename
+            if not filename:
+                continue
+            if len(results) >= self.max_upload_files:
+                raise OverflowError(f"Больше {self.max_upload_files} файлов в одном запросе")
+            results.append(self._analyze_stream(filename, iter_chunks(part, STREAM_CHUNK_SIZE),
+                                                part.charset or encoding, metrics))
+        return results
+
+    def _analyze_stream(self, filename: str, chunks: Iterable[bytes], encoding: str,
+                        metrics: Tuple[str, ...]) -> Tuple[str, object]:
+        """
+        Передает блоки содержимого анализатору сервиса в его event loop
+
+        Следующий блок читается из сокета, пока анализируется предыдущий; ошибка анализа
+        не прерывает чтение, чтобы тело запроса было дочитано до конца
+
+        Returns:
+            Пара (имя файла, результат анализа или исключение)
+
+        Raises:
+            BodyError: Если тело оборвано или нарушен формат
+        """
+        error = None
+        pending = None
+        try:
+            stream = self.analysis_service.open_stream(filename, encoding, metrics)
+        except LookupError as e:
+            stream, error = None, e
+        for chunk in chunks:
+            if stream is None:
+                continue
+            if pending is not None:
+                error = self._wait(pending)
+            if error is not None:
+                stream = None
+                continue
+            pending = asyncio.run_coroutine_threadsafe(
+                feed_admitted(stream, chunk, self.admission, job_owner.get()), self.loop)
+        if pending is not None and error is None:
+            error = self._wait(pending)
+        if error is not None:
+            return filename, error
+        try:
+            return filename, asyncio.run_coroutine_threadsafe(stream.finish(), self.loop).result()
+        except ValueError as e:
+            return filename, e
+
+    @staticmethod
+    def _wait(future) -> Optional[Exception]:
+        """Ждет анализа блока; возвращает ошибку декодирования или отказ допуска вместо исключения"""
+        try:
+            future.result()
+        except (ValueError, AdmissionRejected) as e:
+            return e
+        return None
+
+    def _send_json(self, status: int, payload: dict):
+        """Отправляет ответ в JSON"""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_metrics(self, include_body: bool = True) -> bool:
+        """
+        Отдает метрики процесса в текстовом формате Prometheus
+
+        Args:
+            include_body: Отправлять ли тело ответа (False для HEAD)
+
+        Returns:
+            True, если запрошен /metrics и ответ отправлен
+        """
+        if self.registry is None or self.path.split('?', 1)[0] != "/metrics":
+            return False
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+        return True
+
+    def _send_cached_asset(self, include_body: bool = True) -> bool:
+        """
+        Отдает файл из кэша с поддержкой условных запросов и gzip
+
+        Args:
+            include_body: Отправлять ли тело ответа (False для HEAD)
+
+        Returns:
+            True, если ответ отправлен из кэша
+        """
+        if self.assets is None:
+            return False
+        asset = self.assets.get(self.path)
+        if asset is None:
+            return False
+
+        if self._is_not_modified(asset.matches_etag, asset.mtime):
+            # В ответе 304 - ETag, совпавший с If-None-Match (сжатого или несжатого представления)
+            use_gzip = asset.gzip_body is not None and self._accepts_gzip()
+            self.send_response(304)
+            self._send_asset_headers(asset, asset.not_modified_etag(self.headers.get("If-None-Match"), use_gzip))
+            self.end_headers()
+            return True
+
+        byte_range = self._requested_range(asset.size, asset.matches_etag, asset.mtime)
+        if byte_range is not None:
+            # Диапазоны относятся к несжатому представлению
+            if byte_range == UNSATISFIABLE:
+                self._send_unsatisfiable(asset.size)
+                return True
+            start, end = byte_range
+            self.send_response(206)
+            self._send_asset_headers(asset, asset.etag)
+            self.send_header("Content-Type", asset.content_type)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{asset.size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if include_body:
+                self.wfile.write(asset.body[start:end + 1])
+            return True
+
+        use_gzip = asset.gzip_body is not None and self._accepts_gzip()
+        etag = asset.gzip_etag if use_gzip else asset.etag
+        body = asset.gzip_body if use_gzip else asset.body
+
+        self.send_response(200)
+        self._send_asset_headers(asset, etag)
+        self.send_header("Content-Type", asset.content_type)
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+        return True
+
+    def _send_file(self, include_body: bool = True) -> bool:
+        """
+        Отдает файл, не помещенный в кэш, через sendfile с поддержкой Range
+
+        Args:
+            include_body: Отправлять ли тело ответа (False для HEAD)
+
+        Returns:
+            True, если ответ отправлен
+        """
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and path.endswith("/"):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            return False
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            return False
+
+        with file:
+            stat = os.fstat(file.fileno())
+            size = stat.st_size
+            mtime = int(stat.st_mtime)
+            # Валидатор по размеру и времени изменения не требует чтения файла
+            etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+            last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+            def matches_etag(header: str) -> bool:
+                tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+                return header.strip() == "*" or etag in tags
+
+            if self._is_not_modified(matches_etag, mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                return True
+
+            start, end = 0, size - 1
+            byte_range = self._requested_range(size, matches_etag, mtime)
+            if byte_range == UNSATISFIABLE:
+                self._send_unsatisfiable(size)
+                return True
+            if byte_range is not None:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+
+            if include_body and end >= start:
+                # socket.sendfile использует os.sendfile: данные идут из page cache в сокет без копирования
+                # в Python и с учетом таймаута сокета
+                self.connection.sendfile(file, start, end - start + 1)
+        return True
+
+    def _send_asset_headers(self, asset: StaticAsset, etag: str):
+        """Отправляет заголовки валидации кэша"""
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Accept-Ranges", "bytes")
+        if asset.gzip_body is not None:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def _accepts_gzip(self) -> bool:
+        """Проверяет, принимает ли клиент ответ в gzip"""
+        return accepts_gzip(self.headers)
+
+    def _is_not_modified(self, matches_etag: Callable[[str], bool], mtime: int) -> bool:
+        """Проверяет условные заголовки If-None-Match и If-Modified-Since"""
+        return is_not_modified(self.headers, matches_etag, mtime)
+
+    def _requested_range(self, size: int, matches_etag: Callable[[str], bool],
+                         mtime: int) -> Optional[Tuple[int, int]]:
+        """Возвращает запрошенный диапазон с учетом If-Range"""
+        return requested_range(self.headers, size, matches_etag, mtime)
+
+    def _send_unsatisfiable(self, size: int):
+        """Отправляет ответ 416 для диапазона вне файла"""
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
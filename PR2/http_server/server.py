@@ -1,40 +1,81 @@
 import asyncio
+import functools
+import http.server
 import socketserver
 from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
+from http_server.asset_cache import AssetCache
 from http_server.interfaces import ServerInterface
+from monitoring.metrics import REGISTRY, Registry
+from websocket.admission import AdmissionController
+from websocket.analysis_service import FileAnalysisService
 
-from http_server.handler import HttpHandler
+from http_server.handler import HttpHandler, TEMPLATES_DIR
 
 
 class HttpServer(ServerInterface):
     """Класс для управления HTTP сервером"""
+
+    MODES = ("threading", "single")
     
-    def __init__(self, host: str = "", port: int = 8000):
+    def __init__(self, host: str = "", port: int = 8000, mode: str = "threading",
+                 registry: Optional[Registry] = REGISTRY, analysis_service: Optional[FileAnalysisService] = None,
+                 admission: Optional[AdmissionController] = None):
         """
         Инициализирует HTTP сервер
         
         Args:
             host: Хост для привязки сервера
             port: Порт для привязки сервера
+            mode: Режим обслуживания: "threading" - поток на соединение и HTTP/1.1 keep-alive,
+                  "single" - последовательная обработка запросов по HTTP/1.0
+            registry: Реестр метрик для /metrics (по умолчанию - реестр процесса, None - отключить)
+            analysis_service: Сервис анализа для POST /analyze (обычно общий с WebSocket сервером);
+                              должен работать в том же event loop, в котором запускается сервер
+            admission: Контроль допуска блоков POST /analyze (обычно общий с WebSocket сервером,
+                       чтобы загрузки по HTTP входили в тот же бюджет)
         """
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим HTTP сервера: {mode}")
         self.host = host
         self.port = port
+        self.mode = mode
         self.httpd = None
+        self.assets = AssetCache(TEMPLATES_DIR)
+        self.registry = registry
+        self.analysis_service = analysis_service
+        self.admission = admission or AdmissionController()
+        self._loop = None
         self._executor = ThreadPoolExecutor(max_workers=1)
 
+    def _create_httpd(self) -> socketserver.TCPServer:
+        """Создает сервер в соответствии с выбранным режимом"""
+        if self.mode == "threading":
+            handler = functools.partial(HttpHandler, keep_alive=True, assets=self.assets,
+                                        registry=self.registry, analysis_service=self.analysis_service,
+                                        loop=self._loop, admission=self.admission)
+            return http.server.ThreadingHTTPServer((self.host, self.port), handler)
+        # В последовательном режиме keep-alive заблокировал бы остальных клиентов
+        handler = functools.partial(HttpHandler, keep_alive=False, assets=self.assets,
+                                    registry=self.registry, analysis_service=self.analysis_service,
+                                    loop=self._loop, admission=self.admission)
+        return socketserver.TCPServer((self.host, self.port), handler)
+
     async def start(self):
         """Запускает HTTP-сервер"""
         loop = asyncio.get_event_loop()
+        # Потоки запросов POST /analyze передают части тела сервису анализа в этот event loop
+        self._loop = loop
         
         try:
-            self.httpd = socketserver.TCPServer(
-                (self.host, self.port),
-                HttpHandler
-            )
+            # Статические файлы загружаются в память до приема первого запроса
+            self.assets.load()
+            self.httpd = self._create_httpd()
             print(f"HTTP сервер запущен на http://{self.host or 'localhost'}:{self.port}")
             
-            # Запускаем сервер в отдельном потоке, чтобы не блокировать event loop
+            # Цикл приема соединений работает в отдельном потоке, чтобы не блокировать event loop;
+            # в режиме threading каждое соединение обслуживается своим потоком
             await loop.run_in_executor(
                 self._executor,
                 self.httpd.serve_forever
@@ -52,4 +93,4 @@ class HttpServer(ServerInterface):
                 self._executor.shutdown(wait=False)
                 print("HTTP сервер остановлен")
             except:
-                pass 
\ No newline at end of file
+                pass
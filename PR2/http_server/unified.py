@@ -0,0 +1,336 @@
+import asyncio
+import functools
+import json
+import os
+import urllib.parse
+from typing import Optional, Set, Tuple, Union
+
+import websockets
+from aiohttp import WSMsgType, web
+from websockets.frames import Close
+
+from http_server.asset_cache import AssetCache, StaticAsset
+from http_server.body import aiter_chunks
+from http_server.handler import (STREAM_CHUNK_SIZE, TEMPLATES_DIR, UNSATISFIABLE, HttpHandler, accepts_gzip,
+                                 analyze_response, feed_admitted, is_not_modified, parse_analyze_query,
+                                 requested_range)
+from http_server.interfaces import ServerInterface
+from monitoring.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, Registry
+from websocket.admission import AdmissionController, AdmissionRejected
+from websocket.analysis_service import FileAnalysisService
+from websocket.handler import WebSocketHandler
+from websocket.scheduler import job_owner
+from websocket.session import SessionStore
+
+# route - обработчик запроса: static, metrics, analyze, websocket или none (маршрут не найден)
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP запросы единого сервера", ["route", "status"])
+
+
+class AiohttpWebSocket:
+    """
+    WebSocket соединение aiohttp с интерфейсом соединения websockets
+
+    WebSocketHandler использует только recv, send, wait_closed и close, поэтому обработчик
+    работает с соединениями обоих серверов без изменений
+    """
+
+    def __init__(self, response: web.WebSocketResponse):
+        self.response = response
+        self._closed = asyncio.Event()
+
+    async def recv(self) -> Union[str, bytes]:
+        """
+        Получает следующее сообщение
+
+        Raises:
+            websockets.exceptions.ConnectionClosed: Если соединение закрыто
+        """
+        message = await self.response.receive()
+        if message.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+            return message.data
+        self._closed.set()
+        if message.type == WSMsgType.CLOSE:
+            raise websockets.exceptions.ConnectionClosed(Close(message.data, message.extra or ''), None)
+        raise websockets.exceptions.ConnectionClosed(None, None)
+
+    async def send(self, message: Union[str, bytes]):
+        """
+        Отправляет текстовое или бинарное сообщение
+
+        Raises:
+            websockets.exceptions.ConnectionClosed: Если соединение закрыто
+        """
+        if self.response.closed:
+            raise websockets.exceptions.ConnectionClosed(None, None)
+        try:
+            if isinstance(message, str):
+                await self.response.send_str(message)
+            else:
+                await self.response.send_bytes(message)
+        except ConnectionResetError:
+            self._closed.set()
+            raise websockets.exceptions.ConnectionClosed(None, None) from None
+
+    async def wait_closed(self):
+        """Ждет закрытия соединения"""
+        await self._closed.wait()
+
+    async def close(self, code: int = 1000, reason: str = ''):
+        """Закрывает соединение с указанным кодом"""
+        try:
+            await self.response.close(code=code, message=reason.encode('utf-8'))
+        finally:
+            self._closed.set()
+
+
+class UnifiedServer(ServerInterface):
+    """
+    HTTP и WebSocket сервер на одном порту и в одном event loop (aiohttp)
+
+    Запрос с заголовком Upgrade: websocket на любой путь обслуживает WebSocketHandler,
+    остальные запросы - статические файлы, /metrics и POST /analyze. Отдельный поток
+    для HTTP сервера не нужен, а обработчики HTTP и WebSocket используют общий сервис
+    анализа и реестр метрик напрямую из event loop.
+    """
+
+    # Сколько ждать завершения обработчиков при остановке сервера
+    SHUTDOWN_TIMEOUT = 5.0
+
+    def __init__(self, host: str = 'localhost', port: int = 8765, backend: str = "thread", max_workers: int = 4,
+                 admission: Optional[AdmissionController] = None, files_root: Optional[str] = None,
+                 session_store: Optional[SessionStore] = None, registry: Optional[Registry] = REGISTRY,
+                 max_message_size: int = 1 << 20, ping_interval: Optional[float] = 20.0):
+        """
+        Инициализирует единый сервер
+
+        Args:
+            host: Хост для привязки сервера
+            port: Порт для привязки сервера
+            backend: Исполнитель анализа файлов: "thread" или "process"
+            max_workers: Количество рабочих потоков или процессов анализа
+            admission: Контроль допуска задач анализа (общий бюджет и лимиты на соединение)
+            files_root: Каталог, файлы которого клиенты могут анализировать по ссылке (запрос paths)
+            session_store: Хранилище сессий отключившихся клиентов
+            registry: Реестр метрик для /metrics (None - отключить)
+            max_message_size: Максимальный размер WebSocket сообщения (как max_size у websockets)
+            ping_interval: Период ping для обнаружения разорванных WebSocket соединений (None - без ping)
+        """
+        self.host = host
+        self.port = port
+        self.analysis_service = FileAnalysisService(max_workers=max_workers, backend=backend)
+        self.admission = admission or AdmissionController()
+        self.handler = WebSocketHandler(self.analysis_service, admission=self.admission, files_root=files_root,
+                                        session_store=session_store)
+        self.assets = AssetCache(TEMPLATES_DIR)
+        self.registry = registry
+        self.max_message_size = max_message_size
+        self.ping_interval = ping_interval
+        self.max_upload_files = HttpHandler.max_upload_files
+        self.app = web.Application(middlewares=[self._count_requests])
+        if registry is not None:
+            self.app.router.add_get("/metrics", self._metrics, name="metrics")
+        self.app.router.add_post("/analyze", self._analyze, name="analyze")
+        self.app.router.add_get("/{path:.*}", self._get, name="static")
+        self.runner: Optional[web.AppRunner] = None
+        self._websockets: Set[AiohttpWebSocket] = set()
+        self._stopped = asyncio.Event()
+
+    async def start(self):
+        """Запускает сервер и ждет его остановки"""
+        # Статические файлы загружаются в память до приема первого запроса
+        self.assets.load()
+        self.runner = web.AppRunner(self.app, access_log=None, shutdown_timeout=self.SHUTDOWN_TIMEOUT)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        print(f"HTTP и WebSocket сервер запущен на http://{self.host}:{self.port}")
+        await self._stopped.wait()
+
+    async def stop(self):
+        """Останавливает сервер"""
+        if self.runner is not None:
+            # Обработчики WebSocket завершаются, когда их соединения закрыты
+            await asyncio.gather(*(websocket.close(1001, "server shutdown") for websocket in list(self._websockets)),
+                                 return_exceptions=True)
+            await self.runner.cleanup()
+            print("HTTP и WebSocket сервер остановлен")
+        self._stopped.set()
+        # Ожидание пула выполняется вне event loop
+        await self.analysis_service.close()
+
+    @web.middleware
+    async def _count_requests(self, request: web.Request, handler) -> web.StreamResponse:
+        """Учитывает запросы по обработчикам и кодам ответа"""
+        route = request.match_info.route.name or "none"
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            HTTP_REQUESTS.labels(route, str(e.status)).inc()
+            raise
+        if isinstance(response, web.WebSocketResponse):
+            route = "websocket"
+        HTTP_REQUESTS.labels(route, str(response.status)).inc()
+        return response
+
+    async def _get(self, request: web.Request) -> web.StreamResponse:
+        """GET и HEAD: переход на WebSocket или статический файл"""
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await self._websocket(request)
+        asset = self.assets.get(request.raw_path)
+        if asset is not None:
+            return self._asset_response(request, asset)
+        path = self._static_path(request.path)
+        if path is None:
+            raise web.HTTPNotFound()
+        # FileResponse отдает файл через sendfile с ETag, условными запросами и Range
+        return web.FileResponse(path)
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        """Обслуживает WebSocket соединение обработчиком WebSocketHandler"""
+        response = web.WebSocketResponse(max_msg_size=self.max_message_size, heartbeat=self.ping_interval)
+        await response.prepare(request)
+        websocket = AiohttpWebSocket(response)
+        self._websockets.add(websocket)
+        try:
+            await self.handler.handle_client(websocket, request.path_qs)
+        finally:
+            self._websockets.discard(websocket)
+            await response.close()
+        return response
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        """Метрики процесса в текстовом формате Prometheus"""
+        return web.Response(body=self.registry.render().encode("utf-8"),
+                            headers={"Content-Type": METRICS_CONTENT_TYPE, "Cache-Control": "no-store"})
+
+    def _asset_response(self, request: web.Request, asset: StaticAsset) -> web.Response:
+        """Ответ из кэша статических файлов с условными запросами, Range и gzip (как у HttpHandler)"""
+        headers = {
+            "ETag": asset.etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+        }
+        if asset.gzip_body is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if is_not_modified(request.headers, asset.matches_etag, asset.mtime):
+            # В ответе 304 - ETag, совпавший с If-None-Match (сжатого или несжатого представления)
+            use_gzip = asset.gzip_body is not None and accepts_gzip(request.headers)
+            headers["ETag"] = asset.not_modified_etag(request.headers.get("If-None-Match"), use_gzip)
+            return web.Response(status=304, headers=headers)
+
+        byte_range = requested_range(request.headers, asset.size, asset.matches_etag, asset.mtime)
+        if byte_range == UNSATISFIABLE:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{asset.size}"})
+        headers["Content-Type"] = asset.content_type
+        if byte_range is not None:
+            # Диапазоны относятся к несжатому представлению
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{asset.size}"
+            return web.Response(status=206, body=asset.body[start:end + 1], headers=headers)
+
+        if asset.gzip_body is not None and accepts_gzip(request.headers):
+            headers["ETag"] = asset.gzip_etag
+            headers["Content-Encoding"] = "gzip"
+            return web.Response(body=asset.gzip_body, headers=headers)
+        return web.Response(body=asset.body, headers=headers)
+
+    @staticmethod
+    def _static_path(path: str) -> Optional[str]:
+        """Путь файла из каталога статических файлов; None - файла нет или путь вне каталога"""
+        directory = os.path.realpath(TEMPLATES_DIR)
+        full_path = os.path.realpath(os.path.join(directory, urllib.parse.unquote(path).lstrip("/")))
+        if os.path.commonpath([directory, full_path]) != directory:
+            return None
+        if os.path.isdir(full_path):
+            full_path = os.path.join(full_path, "index.html")
+        return full_path if os.path.isfile(full_path) else None
+
+    async def _analyze(self, request: web.Request) -> web.Response:
+        """
+        POST /analyze: анализ файлов из тела запроса по мере его поступления (см. HttpHandler)
+
+        Части тела передаются анализатору сервиса прямо из event loop, без потока на запрос
+        """
+        # Задачи запроса планируются в его собственной очереди (см. JobScheduler)
+        job_owner.set(('http', id(request)))
+        try:
+            metrics, encoding, filename = parse_analyze_query(request.query_string)
+        except (ValueError, LookupError) as e:
+            return web.json_response({'type': 'error', 'message': str(e)}, status=400)
+        try:
+            if request.content_type == "multipart/form-data":
+                results = await self._analyze_parts(await request.multipart(), encoding, metrics)
+            else:
+                results = [await self._analyze_stream(filename, request.content.read,
+                                                      request.charset or encoding, metrics)]
+        except OverflowError as e:
+            return web.json_response({'type': 'error', 'message': str(e)}, status=413)
+        except ValueError as e:
+            # Нарушен формат multipart
+            return web.json_response({'type': 'error', 'message': str(e)}, status=400)
+        return web.json_response(analyze_response(results), dumps=functools.partial(json.dumps, ensure_ascii=False))
+
+    async def _analyze_parts(self, reader, encoding: str, metrics: Tuple[str, ...]) -> list:
+        """Анализирует файлы из частей multipart по мере их поступления; поля формы пропускаются"""
+        results = []
+        while True:
+            part = await reader.next()
+            if part is None:
+                return results
+            filename = getattr(part, "filename", None)
+            if not filename:
+                await part.release()
+                continue
+            if len(results) >= self.max_upload_files:
+                raise OverflowError(f"Больше {self.max_upload_files} файлов в одном запросе")
+            results.append(await self._analyze_stream(filename, part.read_chunk, part.get_charset(encoding),
+                                                      metrics))
+
+    async def _analyze_stream(self, filename: str, read, encoding: str,
+                              metrics: Tuple[str, ...]) -> Tuple[str, object]:
+        """
+        Передает блоки содержимого анализатору сервиса
+
+        Следующий блок читается, пока анализируется предыдущий; ошибка анализа не прерывает
+        чтение, чтобы тело запроса было дочитано до конца
+
+        Returns:
+            Пара (имя файла, результат анализа или исключение)
+        """
+        error = None
+        pending = None
+        try:
+            stream = self.analysis_service.open_stream(filename, encoding, metrics)
+        except LookupError as e:
+            stream, error = None, e
+        try:
+            async for chunk in aiter_chunks(read, STREAM_CHUNK_SIZE):
+                if stream is None:
+                    continue
+                if pending is not None:
+                    error = await self._wait(pending)
+                if error is not None:
+                    stream = None
+                    continue
+                pending = asyncio.ensure_future(feed_admitted(stream, chunk, self.admission, job_owner.get()))
+            if pending is not None and error is None:
+                error = await self._wait(pending)
+        finally:
+            if pending is not None:
+                pending.cancel()
+        if error is not None:
+            return filename, error
+        try:
+            return filename, await stream.finish()
+        except ValueError as e:
+            return filename, e
+
+    @staticmethod
+    async def _wait(task: asyncio.Future) -> Optional[Exception]:
+        """Ждет анализа блока; возвращает ошибку декодирования или отказ допуска вместо исключения"""
+        try:
+            await task
+        except (ValueError, AdmissionRejected) as e:
+            return e
+        return None
@@ -1,25 +1,82 @@
+import argparse
 import asyncio
+import os
+import shutil
 import signal
 import sys
-from typing import List
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
 
 from PR2.http_server.server import HttpServer
+from PR2.http_server.unified import UnifiedServer
+from monitoring.metrics import REGISTRY, MultiProcessRegistry
 from PR2.websocket.interfaces import ServerInterface
 from PR2.websocket.server import WebSocketServer
 
+# Как часто воркер записывает снимок своих метрик для /metrics супервизора (секунды)
+METRICS_SNAPSHOT_INTERVAL = 1.0
+# Сколько ждать завершения воркеров после SIGTERM, прежде чем завершить их SIGKILL
+WORKER_STOP_TIMEOUT = 10.0
+# Воркер, проработавший меньше, считается упавшим при запуске: перезапуск откладывается
+WORKER_MIN_UPTIME = 1.0
+WORKER_MAX_RESTART_DELAY = 5.0
+
 
 class Application:
     """Основной класс приложения"""
     
-    def __init__(self):
-        """Инициализирует приложение"""
+    def __init__(self, analysis_backend: str = "thread", files_root: Optional[str] = None,
+                 workers: int = 1, unified: bool = False):
+        """
+        Инициализирует приложение
+
+        Args:
+            analysis_backend: Исполнитель анализа файлов: "thread" или "process"
+            files_root: Каталог, файлы которого можно анализировать по ссылке (None - отключено)
+            workers: Число процессов WebSocket сервера; больше 1 - режим супервизора (см. run)
+            unified: HTTP и WebSocket на одном порту 8765 в одном event loop (UnifiedServer)
+                     вместо HTTP сервера в отдельном потоке на порту 8000
+        """
+        if unified and workers > 1:
+            raise ValueError("Единый сервер работает в одном процессе")
         self.servers: List[ServerInterface] = []
         self.running = False
+        self.analysis_backend = analysis_backend
+        self.files_root = files_root
+        self.workers = workers
+        self.unified = unified
+        # Режим супервизора: pid воркера -> (номер, время запуска)
+        self.worker_pids: Dict[int, tuple] = {}
+        self.worker_restarts = 0
+        self.metrics_dir: Optional[str] = None
+
+    def run(self) -> int:
+        """
+        Запускает приложение до остановки
+
+        С одним воркером WebSocket и HTTP серверы работают в текущем процессе.
+        С несколькими текущий процесс становится супервизором (см. run_supervisor).
+
+        Returns:
+            Код завершения процесса
+        """
+        if self.workers > 1:
+            return self.run_supervisor()
+        asyncio.run(self.start())
+        return 0
         
     def setup_servers(self):
         """Настраивает серверы"""
-        http_server = HttpServer(port=8000)
-        websocket_server = WebSocketServer(port=8765)
+        if self.unified:
+            self.servers.append(UnifiedServer(port=8765, backend=self.analysis_backend, files_root=self.files_root))
+            return
+        websocket_server = WebSocketServer(port=8765, backend=self.analysis_backend, files_root=self.files_root)
+        # POST /analyze использует тот же сервис анализа: общие пул, планировщик и кэш результатов
+        http_server = HttpServer(port=8000, analysis_service=websocket_server.analysis_service,
+                                 admission=websocket_server.admission)
         
         self.servers.append(http_server)
         self.servers.append(websocket_server)
@@ -64,12 +121,167 @@ class Application:
         loop = asyncio.get_event_loop()
         loop.stop()
 
+    def run_supervisor(self) -> int:
+        """
+        Режим супервизора: несколько процессов WebSocket сервера на одном порту
+
+        Каждый воркер создается через fork, привязывает порт с SO_REUSEPORT и работает со своим
+        event loop и FileAnalysisService, поэтому разбор JSON и отправка ответов используют
+        несколько ядер. Супервизор обслуживает HTTP сервер, где /metrics суммирует метрики
+        воркеров, перезапускает упавших воркеров и по SIGTERM/SIGINT останавливает всех.
+
+        Returns:
+            Код завершения процесса
+        """
+        self.running = True
+        self.metrics_dir = tempfile.mkdtemp(prefix="pr2-metrics-")
+        registry = self.supervisor_registry()
+        restarts = registry.get("supervisor_worker_restarts_total")
+
+        # Первые воркеры создаются до запуска потока HTTP сервера. Перезапускаемые воркеры создаются
+        # при работающем потоке: они сразу заменяют унаследованное состояние собственным event loop
+        # (см. _run_worker), а блокировки метрик, которые поток мог держать в момент fork,
+        # пересоздаются в дочернем процессе (os.register_at_fork в monitoring.metrics)
+        for index in range(self.workers):
+            self._spawn_worker(index)
+
+        http_server = HttpServer(port=8000, registry=registry)
+        http_thread = threading.Thread(target=asyncio.run, args=(http_server.start(),), daemon=True)
+        http_thread.start()
+
+        def request_stop(signum, frame):
+            self.running = False
+            for pid in list(self.worker_pids):
+                self._signal_worker(pid, signal.SIGTERM)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, request_stop)
+
+        failures: Dict[int, int] = {}
+        try:
+            while self.worker_pids:
+                try:
+                    pid, status = os.waitpid(-1, 0)
+                except ChildProcessError:
+                    break
+                if pid not in self.worker_pids:
+                    continue
+                index, started = self.worker_pids.pop(pid)
+                if not self.running:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                print(f"Воркер {index} (pid {pid}) завершился с кодом {code}, перезапуск")
+                # Воркер, падающий сразу после запуска, перезапускается с растущей задержкой
+                failures[index] = failures.get(index, 0) + 1 if time.monotonic() - started < WORKER_MIN_UPTIME else 0
+                if failures[index]:
+                    time.sleep(min(0.1 * 2 ** failures[index], WORKER_MAX_RESTART_DELAY))
+                if self.running:
+                    restarts.inc()
+                    self.worker_restarts += 1
+                    self._spawn_worker(index)
+        finally:
+            self._stop_workers()
+            asyncio.run(http_server.stop())
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        return 0
+
+    def supervisor_registry(self) -> MultiProcessRegistry:
+        """
+        Реестр /metrics супервизора: его метрики, реестр процесса и снимки воркеров из metrics_dir
+
+        Returns:
+            Реестр с метриками supervisor_workers_alive и supervisor_worker_restarts_total
+        """
+        registry = MultiProcessRegistry(self.metrics_dir, REGISTRY, lambda pid: pid in self.worker_pids)
+        # Метрики супервизора регистрируются в его собственном реестре, а не в REGISTRY,
+        # который наследуют воркеры: иначе они попали бы и в снимки воркеров
+        registry.gauge("supervisor_workers_alive", "Работающие процессы-воркеры") \
+            .set_function(lambda: len(self.worker_pids))
+        registry.counter("supervisor_worker_restarts_total", "Перезапуски упавших воркеров")
+        return registry
+
+    def _spawn_worker(self, index: int):
+        """Создает процесс-воркер с номером index"""
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._run_worker(index)
+            except Exception:
+                # os._exit не печатает необработанное исключение, поэтому трассировка выводится здесь
+                traceback.print_exc()
+            finally:
+                # Дочерний процесс не должен возвращаться в код супервизора; os._exit не сбрасывает буферы
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.worker_pids[pid] = (index, time.monotonic())
+
+    def _run_worker(self, index: int) -> int:
+        """Точка входа процесса-воркера"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_DFL)
+        asyncio.run(self._serve_worker())
+        return 0
+
+    async def _serve_worker(self):
+        """WebSocket сервер воркера; SIGTERM/SIGINT останавливают его штатно"""
+        server = WebSocketServer(port=8765, backend=self.analysis_backend, files_root=self.files_root,
+                                 reuse_port=True, metrics_dir=self.metrics_dir,
+                                 metrics_interval=METRICS_SNAPSHOT_INTERVAL)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(server.stop()))
+        await server.start()
+
+    def _stop_workers(self):
+        """Останавливает воркеров: SIGTERM, затем SIGKILL тем, кто не завершился вовремя"""
+        for pid in list(self.worker_pids):
+            self._signal_worker(pid, signal.SIGTERM)
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        while self.worker_pids and time.monotonic() < deadline:
+            for pid in list(self.worker_pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self.worker_pids.pop(pid, None)
+            time.sleep(0.05)
+        for pid in list(self.worker_pids):
+            self._signal_worker(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.worker_pids.pop(pid, None)
+
+    @staticmethod
+    def _signal_worker(pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Точка входа в приложение"""
+    parser = argparse.ArgumentParser(description="Анализатор текстовых файлов")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число процессов WebSocket сервера на одном порту (SO_REUSEPORT)")
+    parser.add_argument("--backend", choices=("thread", "process"), default="thread",
+                        help="исполнитель анализа файлов")
+    parser.add_argument("--files-root", default=None,
+                        help="каталог, файлы которого можно анализировать по ссылке")
+    parser.add_argument("--unified", action="store_true",
+                        help="HTTP и WebSocket на одном порту 8765 в одном event loop")
+    args = parser.parse_args(argv)
+    if args.unified and args.workers > 1:
+        parser.error("--unified работает только с --workers 1")
     try:
-        app = Application()
-        asyncio.run(app.start())
+        app = Application(analysis_backend=args.backend, files_root=args.files_root, workers=args.workers,
+                          unified=args.unified)
+        return app.run()
     except KeyboardInterrupt:
         print("\nПриложение остановлено пользователем")
     except Exception as e:
@@ -0,0 +1,389 @@
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм задержек по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus"""
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Метки в формате {name="value",...} с экранированием значений"""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# Владельцы блокировок метрик. Супервизор создает воркеров через fork, пока поток HTTP сервера
+# выдает /metrics; блокировка, которую этот поток держал в момент fork, в дочернем процессе
+# не освободится никогда, поэтому после fork все блокировки создаются заново
+_lock_owners: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _new_lock(owner) -> threading.Lock:
+    """Блокировка объекта owner, пересоздаваемая в дочернем процессе после fork"""
+    _lock_owners.add(owner)
+    return threading.Lock()
+
+
+def _reinit_locks():
+    for owner in list(_lock_owners):
+        owner._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinit_locks)
+
+
+class _Metric(ABC):
+    """Общая часть метрик: имя, описание, метки и дочерние значения по меткам"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = _new_lock(self)
+
+    def labels(self, *values: str):
+        """
+        Возвращает значение метрики для набора меток
+
+        Дочернее значение создается один раз; вызывающий код может сохранить его и не искать повторно
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Создает значение метрики для нового набора меток"""
+        pass
+
+    def _default(self):
+        """Значение метрики без меток"""
+        return self.labels()
+
+    def render(self) -> List[str]:
+        """Строки метрики в текстовом формате Prometheus"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+    def snapshot(self) -> dict:
+        """Значения метрики в виде, пригодном для JSON"""
+        return {
+            "name": self.name,
+            "type": self.type_name,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(values), self._snapshot_child(child)] for values, child in list(self._children.items())]
+        }
+
+    def _snapshot_child(self, child):
+        return child.get()
+
+    def merge_sample(self, values: Sequence[str], sample):
+        """Прибавляет значение из снимка другого процесса"""
+        self.labels(*values).inc(sample)
+
+
+class _Value:
+    """
+    Числовое значение счетчика или индикатора
+
+    Обновления выполняются из event loop; чтение при выдаче /metrics из потока HTTP сервера
+    безопасно под GIL, поэтому блокировка на каждое изменение не нужна
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        return self.value
+
+
+class _FunctionValue:
+    """Значение, вычисляемое при выдаче метрик"""
+
+    __slots__ = ("function",)
+
+    def __init__(self, function: Callable[[], float]):
+        self.function = function
+
+    def get(self) -> float:
+        return self.function()
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Индикатор, значение которого может расти и уменьшаться"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, function: Callable[[], float], *values: str):
+        """Вычислять значение при каждой выдаче метрик (например, глубину очереди)"""
+        self._children[values] = _FunctionValue(function)
+
+
+class _HistogramValue:
+    """Значения гистограммы: счетчики по корзинам, сумма и количество наблюдений"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Корзины хранятся не накопленными: одно увеличение на наблюдение
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Гистограмма распределения значений (задержек)"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+    def _snapshot_child(self, child: _HistogramValue) -> dict:
+        return {"counts": list(child.counts), "sum": child.sum}
+
+    def merge_sample(self, values: Sequence[str], sample: dict):
+        child = self.labels(*values)
+        for index, count in enumerate(sample["counts"]):
+            child.counts[index] += count
+        child.sum += sample["sum"]
+        child.count += sum(sample["counts"])
+
+    def _render_child(self, values: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        names = self.labelnames + ("le",)
+        counts = list(child.counts)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(names, values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = _new_lock(self)
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Регистрирует метрику; повторная регистрация с тем же именем возвращает существующую
+
+        Это позволяет нескольким экземплярам серверов (например, в тестах) использовать общие метрики
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована с другим типом или метками")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> dict:
+        """Снимок значений всех метрик (для объединения метрик нескольких процессов)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {"metrics": [metric.snapshot() for metric in metrics]}
+
+    def merge(self, snapshot: dict, include_gauges: bool = True):
+        """
+        Прибавляет значения из снимка другого процесса: счетчики, гистограммы и индикаторы суммируются
+
+        Args:
+            snapshot: Снимок, полученный Registry.snapshot()
+            include_gauges: Учитывать индикаторы (для завершившегося процесса они уже неактуальны,
+                            а счетчики сохраняются, чтобы суммы не уменьшались)
+        """
+        for data in snapshot["metrics"]:
+            metric_type = data["type"]
+            if metric_type == "gauge" and not include_gauges:
+                continue
+            if metric_type == "counter":
+                metric = self.counter(data["name"], data["help"], data["labelnames"])
+            elif metric_type == "gauge":
+                metric = self.gauge(data["name"], data["help"], data["labelnames"])
+            elif metric_type == "histogram":
+                buckets = tuple(data["buckets"])
+                metric = self.histogram(data["name"], data["help"], data["labelnames"], buckets)
+                if metric.buckets != buckets:
+                    continue
+            else:
+                continue
+            for values, sample in data["samples"]:
+                metric.merge_sample(tuple(values), sample)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MultiProcessRegistry(Registry):
+    """
+    Метрики нескольких процессов: метрики самого реестра, реестра процесса и снимки воркеров
+
+    Воркеры периодически записывают снимки своих реестров в общий каталог (write_snapshot);
+    при выдаче /metrics снимки суммируются. Индикаторы завершившихся воркеров не учитываются,
+    а их счетчики и гистограммы сохраняются, чтобы суммы не уменьшались после перезапуска.
+    """
+
+    def __init__(self, directory: str, local: Registry, is_alive: Callable[[int], bool]):
+        """
+        Args:
+            directory: Каталог снимков воркеров (файлы worker-<pid>.json)
+            local: Реестр текущего процесса
+            is_alive: Проверка, работает ли воркер с данным pid
+        """
+        super().__init__()
+        self.directory = directory
+        self.local = local
+        self.is_alive = is_alive
+
+    def render(self) -> str:
+        merged = Registry()
+        merged.merge(super().snapshot())
+        merged.merge(self.local.snapshot())
+        for path in sorted(glob.glob(os.path.join(self.directory, "worker-*.json"))):
+            try:
+                pid = int(os.path.basename(path)[len("worker-"):-len(".json")])
+                with open(path, encoding="utf-8") as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            merged.merge(snapshot, include_gauges=self.is_alive(pid))
+        return merged.render()
+
+
+def write_snapshot(registry: Registry, directory: str, pid: Optional[int] = None):
+    """
+    Атомарно записывает снимок реестра процесса-воркера
+
+    Args:
+        registry: Реестр воркера
+        directory: Каталог снимков
+        pid: Идентификатор процесса (по умолчанию - текущего)
+    """
+    pid = pid or os.getpid()
+    path = os.path.join(directory, f"worker-{pid}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(registry.snapshot(), file)
+    os.replace(tmp_path, path)
+
+
+# Реестр процесса: его выдает /metrics HTTP сервера
+REGISTRY = Registry()
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from websocket.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_global_budget_queues_in_order():
+    """Тест ожидания допуска при исчерпании общего бюджета и порядка очереди"""
+    admission = AdmissionController(max_bytes=100, max_jobs=2, max_wait=1)
+    await admission.acquire('a', 60)
+    order = []
+
+    async def job(key, size):
+        async with admission.admit(key, size):
+            order.append(key)
+
+    waiting = [asyncio.ensure_future(job('b', 50)), asyncio.ensure_future(job('c', 10))]
+    await asyncio.sleep(0.01)
+    # Задача 'c' укладывается в бюджет, но не обгоняет ожидающую 'b'
+    assert order == []
+    assert admission.stats()['waiting'] == 2
+    admission.release('a', 60)
+    await asyncio.gather(*waiting)
+    assert order == ['b', 'c']
+    assert admission.stats()['bytes_in_flight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_connection_limit_does_not_block_others():
+    """Тест лимита соединения: ожидающая задача соединения не задерживает другие соединения"""
+    admission = AdmissionController(per_connection_jobs=1, max_wait=1)
+    await admission.acquire('a', 1)
+    blocked = asyncio.ensure_future(admission.acquire('a', 1))
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(admission.acquire('b', 1), 0.1)
+    assert not blocked.done()
+    admission.release('a', 1)
+    await blocked
+    assert admission.stats()['jobs_in_flight'] == 2
+
+
+@pytest.mark.asyncio
+async def test_rejects_with_retry_hint():
+    """Тест отказа с подсказкой retry_after после ожидания и без него"""
+    admission = AdmissionController(max_jobs=1, max_wait=0.05)
+    await admission.acquire('a', 1)
+    with pytest.raises(AdmissionRejected) as error:
+        await admission.acquire('b', 1)
+    assert error.value.retry_after > 0
+    assert admission.stats()['waiting'] == 0
+
+    admission.max_wait = 0
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire('b', 1)
+    assert admission.rejected == 2
+
+
+@pytest.mark.asyncio
+async def test_oversized_job_runs_alone():
+    """Тест допуска задачи крупнее бюджета, когда других задач нет"""
+    admission = AdmissionController(max_bytes=10, max_wait=1)
+    async with admission.admit('a', 1000):
+        assert admission.stats()['bytes_in_flight'] == 1000
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_releases_queue():
+    """Тест отмены ожидающей задачи: очередь не блокируется"""
+    admission = AdmissionController(max_jobs=1, max_wait=1)
+    await admission.acquire('a', 1)
+    cancelled = asyncio.ensure_future(admission.acquire('b', 1))
+    waiting = asyncio.ensure_future(admission.acquire('c', 1))
+    await asyncio.sleep(0.01)
+    cancelled.cancel()
+    admission.release('a', 1)
+    await waiting
+    assert admission.stats()['jobs_in_flight'] == 1
+
+
+@pytest.mark.asyncio
+async def test_patient_acquire_waits_past_max_wait():
+    """Тест: задача, которую нельзя повторить отдельно, ждет дольше max_wait и не отклоняется"""
+    admission = AdmissionController(max_jobs=1, max_wait=0)
+    await admission.acquire('a', 1)
+    waiting = asyncio.ensure_future(admission.acquire('b', 1, patient=True))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    admission.release('a', 1)
+    await asyncio.wait_for(waiting, 1)
+    assert admission.stats()['rejected'] == 0
@@ -0,0 +1,473 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from websocket import analysis_service
+from websocket.analysis_service import AnalysisCancelled, FileAnalysisService, analyze_content, analyze_path
+from websocket.engine import METRICS, MetricsEngine, parse_encoding, parse_metrics
+from websocket.file_refs import MAPPED_BLOCK_SIZE, FileRoot
+from websocket.incremental import IncrementalAnalyzer
+from websocket.result_cache import ResultCache, content_key
+from websocket.shared_buffers import SharedBufferPool, read_shared_text
+
+FILES = [
+    {'filename': 'a.txt', 'content': 'Hello world\nsecond line'},
+    {'filename': 'b.txt', 'content': 'Привет, мир!\n\nещё  строка\n'},
+    {'filename': 'empty.txt', 'content': ''},
+]
+
+
+def test_analyze_content():
+    """Тест подсчета слов, символов и строк"""
+    analysis = analyze_content('a.txt', 'Hello world\nsecond line')
+    assert (analysis.word_count, analysis.char_count, analysis.line_count) == (4, 23, 2)
+    analysis = analyze_content('empty.txt', '')
+    assert (analysis.word_count, analysis.char_count, analysis.line_count) == (0, 0, 1)
+
+
+def test_unknown_backend():
+    """Тест создания сервиса с неизвестным исполнителем"""
+    with pytest.raises(ValueError):
+        FileAnalysisService(backend='unknown')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', FileAnalysisService.BACKENDS)
+async def test_backends_give_same_results(backend):
+    """Тест одинаковых результатов для пула потоков и пула процессов"""
+    service = FileAnalysisService(max_workers=2, backend=backend)
+    try:
+        analyses = await service.analyze_files(FILES)
+    finally:
+        service.shutdown()
+    expected = [analyze_content(f['filename'], f['content']) for f in FILES]
+    assert analyses == expected
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_transport():
+    """Тест передачи содержимого через переиспользуемые сегменты разделяемой памяти"""
+    service = FileAnalysisService(max_workers=2, backend='process', transport='shared_memory',
+                                  shared_memory_threshold=0, cache_entries=0)
+    files = FILES + [{'filename': 'big.txt', 'content': 'слово word\n' * 50000}]
+    try:
+        first = await service.analyze_files(files)
+        second = await service.analyze_files(files)
+    finally:
+        service.shutdown()
+    expected = [analyze_content(f['filename'], f['content']) for f in files]
+    assert first == expected
+    assert second == expected
+    # Во втором пакете сегменты берутся из пула
+    assert service.buffer_pool.reused >= len(files)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', FileAnalysisService.BACKENDS)
+async def test_stream_parts_scheduled(backend):
+    """Тест: части потокового анализа ждут места в планировщике при любом исполнителе"""
+    service = FileAnalysisService(max_workers=1, backend=backend)
+    release = threading.Event()
+    try:
+        # Единственное место планировщика занято задачей в пуле потоков сервиса
+        blocker = asyncio.ensure_future(service._execute(0, release.wait, local=True))
+        stream = service.open_stream('a.txt')
+        feed = asyncio.ensure_future(stream.feed('один два\n'.encode('utf-8')))
+        await asyncio.sleep(0.1)
+        assert not feed.done()
+        assert service.executor_queue_depth == 1
+        release.set()
+        await asyncio.gather(blocker, feed)
+        analysis = await stream.finish()
+    finally:
+        release.set()
+        service.shutdown()
+    assert analysis == analyze_content('a.txt', 'один два\n')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('options', [
+    {},
+    {'cache_entries': 0},
+    {'backend': 'process', 'transport': 'shared_memory', 'shared_memory_threshold': 0},
+], ids=['cache', 'coalesce', 'shared-memory'])
+async def test_lone_surrogate_analyzed(options):
+    """Тест: текст с одиночным суррогатом (допустим в JSON) анализируется, как без кэша"""
+    content = 'a \ud800 b'
+    service = FileAnalysisService(max_workers=1, **options)
+    try:
+        analysis = await service.analyze_file('s.txt', content)
+    finally:
+        service.shutdown()
+    assert analysis == analyze_content('s.txt', content)
+    # Ключ текста не совпадает с ключом тех же байт, которые строгий UTF-8 не декодирует
+    assert content_key(content) != content_key(content.encode('utf-8', 'surrogatepass'))
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_threshold_in_bytes():
+    """Тест: порог разделяемой памяти сравнивается с размером текста в UTF-8, а не в символах"""
+    service = FileAnalysisService(max_workers=1, backend='process', transport='shared_memory',
+                                  shared_memory_threshold=1000, cache_entries=0)
+    try:
+        small = await service.analyze_file('small.txt', 'я' * 400)
+        assert service.buffer_pool.created == 0
+        large = await service.analyze_file('large.txt', 'я' * 600)
+        assert service.buffer_pool.created == 1
+    finally:
+        service.shutdown()
+    assert (small.char_count, large.char_count) == (400, 600)
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='нужен /proc')
+def test_shared_segment_unmapped_after_read():
+    """Тест: воркер отключает сегмент после чтения, и уничтоженный сегмент не остается в памяти"""
+    pool = SharedBufferPool()
+    segment = pool.write('текст'.encode('utf-8'))
+    try:
+        assert read_shared_text(segment.name, len('текст'.encode('utf-8'))) == 'текст'
+        with open('/proc/self/maps') as maps:
+            mapped = maps.read().count(segment.name)
+    finally:
+        pool._destroy(segment)
+    # Отображение осталось только у самого пула
+    assert mapped == 1
+
+
+@pytest.mark.asyncio
+async def test_close_does_not_block_loop():
+    """Тест: остановка сервиса из event loop ждет выполняющуюся задачу, не блокируя loop"""
+    service = FileAnalysisService(max_workers=1)
+    release = threading.Event()
+    job = asyncio.ensure_future(service._execute(0, release.wait))
+    await asyncio.sleep(0.05)
+    closing = asyncio.ensure_future(service.close())
+    await asyncio.sleep(0.05)
+    assert not closing.done()
+    release.set()
+    await closing
+    assert await job is True
+
+
+def test_shared_memory_requires_process_backend():
+    """Тест запрета разделяемой памяти для пула потоков"""
+    with pytest.raises(ValueError):
+        FileAnalysisService(backend='thread', transport='shared_memory')
+
+
+@pytest.mark.asyncio
+async def test_result_cache_reuses_analysis():
+    """Тест повторного использования результата для того же содержимого"""
+    service = FileAnalysisService(max_workers=1)
+    try:
+        first = await service.analyze_file('a.txt', 'one two\nthree')
+        second = await service.analyze_file('copy.txt', 'one two\nthree')
+    finally:
+        service.shutdown()
+    assert second.filename == 'copy.txt'
+    assert (second.word_count, second.char_count, second.line_count) == \
+        (first.word_count, first.char_count, first.line_count)
+    stats = service.cache_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_result_cache_limits():
+    """Тест вытеснения по числу записей и по объему"""
+    cache = ResultCache(max_entries=2)
+    keys = [content_key(text) for text in ('a', 'b', 'c')]
+    for key in keys:
+        cache.put(key, analyze_content('f.txt', 'x'))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats()['evictions'] == 1
+
+    cache = ResultCache(max_entries=100, max_bytes=1)
+    cache.put(keys[0], analyze_content('f.txt', 'x'))
+    assert cache.stats()['entries'] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_analyses_coalesced():
+    """Тест объединения одновременных анализов одинакового содержимого"""
+    service = FileAnalysisService(max_workers=2, cache_entries=0)
+    release = threading.Event()
+    calls = []
+    original = service._run_analysis
+
+    async def slow_analysis(filename, content, *args):
+        calls.append(filename)
+        await asyncio.get_event_loop().run_in_executor(None, release.wait)
+        return await original(filename, content, *args)
+
+    service._run_analysis = slow_analysis
+    try:
+        batch = service.analyze_files([
+            {'filename': f'copy{i}.txt', 'content': 'same content'} for i in range(3)
+        ])
+        other_connection = service.analyze_file('other.txt', 'same content')
+        pending = asyncio.gather(batch, other_connection)
+        await asyncio.sleep(0.05)
+        release.set()
+        analyses, other = await pending
+    finally:
+        service.shutdown()
+
+    assert len(calls) == 1
+    assert [a.filename for a in analyses] == ['copy0.txt', 'copy1.txt', 'copy2.txt']
+    assert other.filename == 'other.txt'
+    assert all(a.word_count == 2 for a in analyses)
+    assert service.cache_stats()['coalesced'] == 3
+    assert service.cache_stats()['inflight'] == 0
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 100])
+def test_incremental_analyzer_matches_whole_content(chunk_size):
+    """Тест совпадения результатов анализа по частям и целиком"""
+    content = '  Hello  world\n\nпривет 😀мир \t конец'
+    # Клиент режет строку по единицам UTF-16, поэтому часть может закончиться половиной суррогатной пары
+    units = content.encode('utf-16-le')
+    analyzer = IncrementalAnalyzer('f.txt')
+    for start in range(0, len(units), chunk_size * 2):
+        analyzer.feed(units[start:start + chunk_size * 2].decode('utf-16-le', 'surrogatepass'))
+    assert analyzer.result() == analyze_content('f.txt', content)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+async def test_analyze_payload(backend):
+    """Тест анализа содержимого в байтах и общего с текстом кэша"""
+    service = FileAnalysisService(max_workers=1, backend=backend)
+    content = 'слово word\nещё'
+    try:
+        from_bytes = await service.analyze_payload('a.txt', memoryview(content.encode('utf-8')))
+        from_text = await service.analyze_file('a.txt', content)
+        other = await service.analyze_payload('a.txt', content.encode('utf-16'), 'utf-16')
+    finally:
+        service.shutdown()
+    assert from_bytes == from_text == other == analyze_content('a.txt', content)
+    assert service.cache_stats()['hits'] == 1
+    assert content_key(content.encode('utf-8'), 'latin-1') != content_key(content)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('encoding', ['zlib_codec', 'bz2_codec', 'base64', 'rot13', 'unknown'])
+async def test_non_text_encoding_rejected(encoding):
+    """Тест: кодеки bytes-to-bytes отклоняются до декодирования, а не распаковывают часть в память"""
+    service = FileAnalysisService(max_workers=1)
+    try:
+        with pytest.raises(LookupError):
+            parse_encoding(encoding)
+        with pytest.raises(LookupError):
+            IncrementalAnalyzer('a.txt', encoding)
+        with pytest.raises(LookupError):
+            service.open_stream('a.txt', encoding)
+        with pytest.raises(LookupError):
+            await service.analyze_payload('a.txt', b'x', encoding)
+        with pytest.raises(LookupError):
+            await service.analyze_path('a.txt', __file__, encoding)
+    finally:
+        service.shutdown()
+    assert parse_encoding('cp1251') == 'cp1251'
+
+
+def reference_metrics(content):
+    """Метрики, посчитанные построением списков строк и слов"""
+    lines = content.split('\n')
+    words = content.split()
+    return {
+        'lines': len(lines),
+        'words': len(words),
+        'chars': len(content),
+        'bytes': len(content.encode('utf-8')),
+        'longest_line': max(map(len, lines)),
+        'unique_words': len(set(words)),
+    }
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 8, 1000])
+@pytest.mark.parametrize('content', [
+    '',
+    '  one two  two\nthree\n\nочень-длинное-слово x\t',
+    'слово' * 50 + ' слово\nword',
+])
+def test_engine_matches_reference(chunk_size, content):
+    """Тест совпадения однопроходных метрик с подсчетом через списки при любой нарезке"""
+    engine = MetricsEngine(METRICS)
+    for start in range(0, len(content), chunk_size):
+        engine.feed(content[start:start + chunk_size])
+    assert engine.result() == reference_metrics(content)
+
+
+def test_engine_computes_only_requested_metrics():
+    """Тест выборочных метрик: незапрошенные не считаются и не передаются клиенту"""
+    analysis = analyze_content('a.txt', 'b a b\nccc', parse_metrics(['unique_words', 'lines']))
+    assert (analysis.line_count, analysis.unique_words) == (2, 3)
+    assert analysis.word_count is None and analysis.char_count is None
+    assert set(analysis.to_dict()) == {'type', 'filename', 'line_count', 'unique_words'}
+    with pytest.raises(ValueError):
+        parse_metrics(['lines', 'sentences'])
+    with pytest.raises(ValueError):
+        parse_metrics([])
+
+
+@pytest.mark.asyncio
+async def test_result_cache_keyed_by_metrics():
+    """Тест кэша: результат с другим набором метрик не выдается из кэша"""
+    service = FileAnalysisService(max_workers=1)
+    try:
+        basic = await service.analyze_file('a.txt', 'один два')
+        extended = await service.analyze_file('a.txt', 'один два', parse_metrics(['bytes', 'longest_line']))
+        payload = await service.analyze_payload('a.txt', 'один два'.encode('cp1251'), 'cp1251', ('bytes',))
+    finally:
+        service.shutdown()
+    assert basic.byte_count is None
+    assert (extended.byte_count, extended.longest_line) == (len('один два'.encode('utf-8')), 8)
+    assert payload.byte_count == 8
+    assert service.cache_stats()['hits'] == 0
+
+
+def test_file_root_resolve(tmp_path):
+    """Тест разрешения путей только внутри корневого каталога"""
+    root = tmp_path / 'root'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'sub' / 'a.txt').write_text('a')
+    (tmp_path / 'secret.txt').write_text('secret')
+    (root / 'link.txt').symlink_to(tmp_path / 'secret.txt')
+    files = FileRoot(str(root))
+
+    path, stat = files.resolve('sub/a.txt')
+    assert path == str((root / 'sub' / 'a.txt').resolve())
+    assert os.path.samestat(stat, os.stat(path))
+    for path in ['../secret.txt', 'link.txt', str(tmp_path / 'secret.txt'), '', 'sub/../../secret.txt']:
+        with pytest.raises(PermissionError):
+            files.resolve(path)
+    for path in ['missing.txt', 'sub']:
+        with pytest.raises(FileNotFoundError):
+            files.resolve(path)
+
+
+def test_file_replaced_after_resolve(tmp_path):
+    """Тест: файл, подмененный после проверки пути, не анализируется"""
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'a.txt').write_text('a')
+    (tmp_path / 'secret.txt').write_text('secret')
+    path, stat = FileRoot(str(root)).resolve('a.txt')
+    identity = (stat.st_dev, stat.st_ino)
+    # Проверенный файл остается на диске, иначе новый файл мог бы получить его inode
+    os.link(path, tmp_path / 'kept.txt')
+    assert analyze_path('a.txt', path, identity=identity).word_count == 1
+
+    # Символическая ссылка на месте файла не открывается
+    (root / 'link').symlink_to(tmp_path / 'secret.txt')
+    os.replace(root / 'link', path)
+    with pytest.raises(OSError):
+        analyze_path('a.txt', path, identity=identity)
+
+    # Другой обычный файл на месте проверенного отклоняется по inode
+    (root / 'other').write_text('secret')
+    os.replace(root / 'other', path)
+    with pytest.raises(PermissionError):
+        analyze_path('a.txt', path, identity=identity)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+async def test_analyze_path(tmp_path, backend):
+    """Тест анализа файла по ссылке блоками через отображение в память"""
+    # Многобайтовые символы попадают на границы блоков отображения
+    content = ('слово word\n' * (MAPPED_BLOCK_SIZE // 7))[:MAPPED_BLOCK_SIZE * 2 // 3 * 2 + 1]
+    path = tmp_path / 'big.txt'
+    path.write_text(content, encoding='utf-8')
+    (tmp_path / 'empty.txt').write_bytes(b'')
+    metrics = parse_metrics(['lines', 'words', 'chars', 'bytes'])
+
+    service = FileAnalysisService(max_workers=1, backend=backend)
+    try:
+        first = await service.analyze_path('big.txt', str(path), metrics=metrics)
+        second = await service.analyze_path('copy.txt', str(path), metrics=metrics)
+    finally:
+        service.shutdown()
+    expected = analyze_content('big.txt', content, metrics)
+    assert first == expected
+    assert second.filename == 'copy.txt' and second.word_count == expected.word_count
+    assert service.cache_stats()['hits'] == 1
+    assert analyze_path('empty.txt', str(tmp_path / 'empty.txt')) == analyze_content('empty.txt', '')
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_running_and_queued_jobs():
+    """Тест отмены: выполняющаяся задача останавливается флагом, ожидающая не запускается"""
+    started = threading.Event()
+    stopped = threading.Event()
+    ran = []
+
+    def wait_for_stop():
+        started.set()
+        stop = analysis_service._stop_event.get()
+        stop.wait(5)
+        stopped.set()
+        analysis_service._check_stopped()
+
+    service = FileAnalysisService(max_workers=1)
+    try:
+        running = asyncio.ensure_future(service._execute(10, wait_for_stop))
+        queued = asyncio.ensure_future(service._execute(10, ran.append, 'queued'))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        assert service.executor_queue_depth == 1
+        running.cancel()
+        queued.cancel()
+        await asyncio.wait({running, queued})
+        assert await asyncio.get_running_loop().run_in_executor(None, stopped.wait, 5)
+        await service._execute(10, ran.append, 'next')
+    finally:
+        service.shutdown()
+    assert ran == ['next']
+    assert service.executor_queue_depth == 0
+
+
+def test_analyze_content_checks_stop_flag():
+    """Тест остановки анализа крупного содержимого между частями"""
+    stop = threading.Event()
+    stop.set()
+    content = 'word ' * (analysis_service.STOP_CHECK_SIZE // 2)
+    with pytest.raises(AnalysisCancelled):
+        analysis_service._run_stoppable(stop, analyze_content, 'big.txt', content)
+    assert analysis_service._run_stoppable(threading.Event(), analyze_content, 'big.txt', content) == \
+        analyze_content('big.txt', content)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_cancels_coalesced_analysis():
+    """Тест: анализ отменяется, только когда отменены все ожидающие его запросы"""
+    service = FileAnalysisService(max_workers=1, cache_entries=0)
+    gate = asyncio.Event()
+    calls = []
+
+    async def run_analysis(filename, content, *args):
+        calls.append(filename)
+        await gate.wait()
+        return analyze_content(filename, content)
+
+    service._run_analysis = run_analysis
+    try:
+        first = asyncio.ensure_future(service.analyze_file('a.txt', 'same'))
+        second = asyncio.ensure_future(service.analyze_file('b.txt', 'same'))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert service.cache_stats()['inflight'] == 1
+        second.cancel()
+        await asyncio.wait({first, second})
+        assert service.cache_stats()['inflight'] == 0
+
+        gate.set()
+        third = await service.analyze_file('c.txt', 'same')
+    finally:
+        service.shutdown()
+    assert calls == ['a.txt', 'c.txt'] and third.filename == 'c.txt'
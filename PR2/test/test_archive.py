@@ -0,0 +1,193 @@
+import asyncio
+import io
+import os
+import sys
+import tarfile
+import threading
+import zipfile
+
+import pytest
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from websocket.admission import AdmissionController, AdmissionRejected
+from websocket.analysis_service import FileAnalysisService
+from websocket.archive import ArchiveAnalysis, ArchiveError, iter_archive_members
+
+FILES = {
+    'a.txt': b'',
+    'dir/b.txt': 'текст\n'.encode() * 100,
+    'big.bin': os.urandom(200_000),
+}
+
+
+class SlowReader:
+    """Источник, отдающий данные короткими порциями, как сеть"""
+
+    def __init__(self, data: bytes, size: int = 7):
+        self.data = io.BytesIO(data)
+        self.size = size
+
+    def read(self, size: int) -> bytes:
+        return self.data.read(min(size, self.size))
+
+
+class Unseekable(io.RawIOBase):
+    """Поток без перемотки: zipfile записывает размеры в дескрипторы после данных"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def build_zip(stream: bool) -> bytes:
+    if stream:
+        output = Unseekable()
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in FILES.items():
+                with archive.open(name, 'w', force_zip64=name == 'big.bin') as member:
+                    member.write(content)
+        return bytes(output.data)
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w') as archive:
+        archive.writestr('dir/', '')
+        for name, content in FILES.items():
+            method = zipfile.ZIP_STORED if name == 'big.bin' else zipfile.ZIP_DEFLATED
+            archive.writestr(name, content, compress_type=method)
+    return output.getvalue()
+
+
+def build_tar(mode: str) -> bytes:
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode=mode) as archive:
+        archive.addfile(_directory('dir'))
+        for name, content in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return output.getvalue()
+
+
+def _directory(name: str) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.DIRTYPE
+    return info
+
+
+@pytest.mark.parametrize('data', [
+    pytest.param(build_zip(stream=False), id='zip'),
+    pytest.param(build_zip(stream=True), id='zip-descriptors'),
+    pytest.param(build_tar('w'), id='tar'),
+    pytest.param(build_tar('w:gz'), id='tar.gz'),
+    pytest.param(build_tar('w:bz2'), id='tar.bz2'),
+    pytest.param(build_tar('w:xz'), id='tar.xz'),
+])
+def test_members_read_sequentially(data):
+    """Тест последовательного чтения файлов архива из источника с короткими чтениями; каталоги пропускаются"""
+    members = {name: b''.join(iter(lambda: reader.read(1000), b''))
+               for name, reader in iter_archive_members(SlowReader(data))}
+    assert members == FILES
+
+
+def test_unread_member_skipped():
+    """Тест: непрочитанное содержимое файла пропускается при переходе к следующему"""
+    names = [name for name, _ in iter_archive_members(SlowReader(build_zip(stream=True)))]
+    assert names == list(FILES)
+
+
+@pytest.mark.parametrize('data', [b'not an archive' * 100, build_zip(stream=True)[:3000]])
+def test_bad_archive(data):
+    """Тест ошибки для данных не в формате архива и для оборванного архива"""
+    with pytest.raises(ArchiveError):
+        for _, reader in iter_archive_members(io.BytesIO(data)):
+            while reader.read(1000):
+                pass
+
+
+class Zeros(io.RawIOBase):
+    """Источник нулевых байт заданной длины (содержимое архива-бомбы)"""
+
+    def __init__(self, size: int):
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        buffer[:size] = bytes(size)
+        self.remaining -= size
+        return size
+
+
+@pytest.mark.parametrize('mode', ['w:gz', 'w:bz2', 'w:xz', 'zip'])
+def test_archive_bomb_limited(mode):
+    """Тест архива-бомбы: объем распакованного ограничен, распаковка идет блоками"""
+    size = 64 << 20
+    output = io.BytesIO()
+    if mode == 'zip':
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            with archive.open('zeros', 'w', force_zip64=True) as member:
+                for _ in range(size >> 20):
+                    member.write(bytes(1 << 20))
+    else:
+        with tarfile.open(fileobj=output, mode=mode) as archive:
+            info = tarfile.TarInfo('zeros')
+            info.size = size
+            archive.addfile(info, io.BufferedReader(Zeros(size)))
+    data = output.getvalue()
+    assert len(data) < size // 100
+
+    read = 0
+    with pytest.raises(ArchiveError, match='больше'):
+        for _, reader in iter_archive_members(io.BytesIO(data), max_size=8 << 20):
+            while True:
+                block = reader.read(256 << 10)
+                assert len(block) <= 256 << 10
+                if not block:
+                    break
+                read += len(block)
+    assert read <= 8 << 20
+
+
+@pytest.mark.asyncio
+async def test_abort_stops_extraction():
+    """Тест: прерванная загрузка освобождает поток распаковки и не выдает результатов"""
+    service = FileAnalysisService(max_workers=1)
+    archive = ArchiveAnalysis(service, 'files.zip')
+    await archive.feed(build_zip(stream=True)[:1000])
+    archive.abort()
+    await asyncio.get_running_loop().run_in_executor(None, archive._thread.join, 2)
+    assert not archive._thread.is_alive()
+    assert [result async for result in archive.results()] == []
+    service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_members_admitted_within_connection_limits():
+    """Тест: файлы и блоки архива проходят контроль допуска с лимитами соединения"""
+    service = FileAnalysisService(max_workers=2)
+    admission = AdmissionController(per_connection_jobs=1, max_wait=0)
+    threads = threading.BoundedSemaphore(1)
+    try:
+        archive = ArchiveAnalysis(service, 'files.tar', admission=admission, key='client', threads=threads)
+        with pytest.raises(AdmissionRejected):
+            ArchiveAnalysis(service, 'other.tar', admission=admission, key='client', threads=threads)
+        await archive.feed(build_tar('w'))
+        results = [result async for result in archive.results()]
+    finally:
+        service.shutdown()
+    assert sorted(name for _, name, _ in results) == sorted(FILES)
+    # Каждый файл допущен отдельной задачей (по одной за раз), без отказов
+    stats = admission.stats()
+    assert (stats['admitted'], stats['rejected']) == (len(FILES), 0)
+    assert (stats['jobs_in_flight'], stats['bytes_in_flight']) == (0, 0)
+    # Поток распаковки завершился и освободил место для следующего архива
+    archive._thread.join(2)
+    assert threads.acquire(blocking=False)
@@ -0,0 +1,401 @@
+import asyncio
+import gzip
+import http.client
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_server.asset_cache import AssetCache
+from http_server.body import BodyError, ChunkedReader, LimitedReader, MultipartReader
+from http_server.handler import TEMPLATES_DIR, UNSATISFIABLE, parse_byte_range
+from http_server.server import HttpServer
+# Метрики регистрируются при импорте модулей WebSocket сервера
+import websocket.handler  # noqa: F401
+from websocket.admission import AdmissionController
+from websocket.analysis_service import FileAnalysisService, analyze_content
+
+
+class TestAssetCache(unittest.TestCase):
+    """Модульные тесты кэша статических файлов"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "index.html")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("<html>" + "текст " * 200 + "</html>")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_and_get(self):
+        cache = AssetCache(self.directory.name)
+        cache.load()
+        asset = cache.get("/")
+        self.assertIsNotNone(asset)
+        self.assertEqual(asset.content_type, "text/html; charset=utf-8")
+        self.assertEqual(gzip.decompress(asset.gzip_body), asset.body)
+        self.assertNotEqual(asset.etag, asset.gzip_etag)
+        self.assertIs(cache.get("/index.html?v=1"), asset)
+        self.assertIsNone(cache.get("/missing.html"))
+        self.assertIsNone(cache.get("/../" + os.path.basename(self.directory.name)))
+
+    def test_refresh_on_change(self):
+        cache = AssetCache(self.directory.name, check_interval=0)
+        etag = cache.get("/index.html").etag
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("<html>новый текст</html>")
+        asset = cache.get("/index.html")
+        self.assertNotEqual(asset.etag, etag)
+        self.assertIn("новый".encode("utf-8"), asset.body)
+
+
+class TestHttpHandlerAssets(unittest.TestCase):
+    """Тесты отдачи статических файлов из кэша HTTP сервером"""
+
+    max_asset_size = 1 << 20
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = cls._find_free_port()
+        cls.server = HttpServer(host="127.0.0.1", port=cls.port)
+        cls.server.assets = AssetCache(TEMPLATES_DIR, max_asset_size=cls.max_asset_size)
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(
+            target=cls.loop.run_until_complete,
+            args=(cls.server.start(),),
+            daemon=True
+        )
+        cls.thread.start()
+        time.sleep(0.5)
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run(cls.server.stop())
+        cls.thread.join(timeout=2)
+
+    @staticmethod
+    def _find_free_port():
+        """Находит свободный порт для запуска сервера"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(('', 0))
+            return s.getsockname()[1]
+
+    def _request(self, method="GET", path="/", headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response, body
+
+    def test_get_with_validators(self):
+        response, body = self._request()
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"<html", body)
+        self.assertIsNotNone(response.getheader("ETag"))
+        self.assertIsNotNone(response.getheader("Last-Modified"))
+
+    def test_range(self):
+        _, full = self._request()
+        response, body = self._request(headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes 10-19/{len(full)}")
+        self.assertEqual(body, full[10:20])
+
+        response, body = self._request(headers={"Range": "bytes=-5"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(body, full[-5:])
+
+        response, _ = self._request(headers={"Range": f"bytes={len(full)}-"})
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader("Content-Range"), f"bytes */{len(full)}")
+
+        # Устаревший валидатор в If-Range возвращает файл целиком
+        response, body = self._request(headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, full)
+
+    def test_gzip(self):
+        if self.max_asset_size == 0:
+            self.skipTest("Сжатые варианты есть только у файлов из кэша")
+        response, body = self._request(headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertIn(b"<html", gzip.decompress(body))
+
+        response, _ = self._request(headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+
+    def test_not_modified(self):
+        response, _ = self._request()
+        etag = response.getheader("ETag")
+        last_modified = response.getheader("Last-Modified")
+
+        response, body = self._request(headers={"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+
+        response, _ = self._request(headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status, 304)
+
+        response, _ = self._request(headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+        self.assertEqual(response.status, 200)
+
+    def test_not_modified_echoes_matched_etag(self):
+        if self.max_asset_size == 0:
+            self.skipTest("Сжатые варианты есть только у файлов из кэша")
+        response, _ = self._request(headers={"Accept-Encoding": "gzip"})
+        gzip_etag = response.getheader("ETag")
+        response, _ = self._request()
+        etag = response.getheader("ETag")
+        self.assertNotEqual(etag, gzip_etag)
+
+        for accept in ("gzip", "identity"):
+            response, _ = self._request(headers={"If-None-Match": gzip_etag, "Accept-Encoding": accept})
+            self.assertEqual((response.status, response.getheader("ETag")), (304, gzip_etag))
+            response, _ = self._request(headers={"If-None-Match": etag, "Accept-Encoding": accept})
+            self.assertEqual((response.status, response.getheader("ETag")), (304, etag))
+        response, _ = self._request(headers={"If-None-Match": f"{etag}, {gzip_etag}", "Accept-Encoding": "gzip"})
+        self.assertEqual(response.getheader("ETag"), gzip_etag)
+
+    def test_invalid_range_ignored(self):
+        response, body = self._request(headers={"Range": "bytes=5-1"})
+        self.assertEqual(response.status, 200)
+        self.assertIsNone(response.getheader("Content-Range"))
+        self.assertIn(b"<html", body)
+
+    def test_metrics_endpoint(self):
+        response, body = self._request(path="/metrics")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain; version=0.0.4"))
+        text = body.decode("utf-8")
+        for name in ("ws_connections_active", "analysis_duration_seconds", "analysis_executor_queue_depth"):
+            self.assertIn(f"# TYPE {name} ", text)
+
+    def test_metrics_head(self):
+        response, body = self._request("HEAD", path="/metrics")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain; version=0.0.4"))
+        self.assertGreater(int(response.getheader("Content-Length")), 0)
+        self.assertEqual(body, b"")
+
+    def test_head_and_not_found(self):
+        response, body = self._request("HEAD")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b"")
+        response, _ = self._request(path="/not_exists.html")
+        self.assertEqual(response.status, 404)
+
+
+class TestHttpHandlerSendfile(TestHttpHandlerAssets):
+    """Те же сценарии для файлов, отдаваемых через sendfile в обход кэша"""
+
+    max_asset_size = 0
+
+
+def multipart_body(boundary: str, parts) -> bytes:
+    """Собирает тело multipart/form-data из пар (заголовки части, содержимое)"""
+    body = b"preamble\r\n"
+    for headers, content in parts:
+        body += f"--{boundary}\r\n{headers}\r\n\r\n".encode("utf-8") + content + b"\r\n"
+    return body + f"--{boundary}--\r\nepilogue".encode("ascii")
+
+
+class TestRequestBody(unittest.TestCase):
+    """Модульные тесты потокового чтения тела запроса"""
+
+    def test_multipart_small_reads(self):
+        boundary = "b0und4ry"
+        first = "привет мир\r\n--b0und4r не разделитель".encode("utf-8")
+        body = multipart_body(boundary, [
+            ('Content-Disposition: form-data; name="field"', b"value"),
+            ('Content-Disposition: form-data; name="file"; filename="файл.txt"\r\n'
+             'Content-Type: text/plain; charset=cp1251', first),
+            ('Content-Disposition: form-data; name="file"; filename="empty.txt"', b""),
+        ])
+        # Блоки короче разделителя проверяют поиск разделителя на границах блоков
+        for read_size in (1, 7, 64, 1 << 16):
+            reader = MultipartReader(LimitedReader(io.BufferedReader(io.BytesIO(body)), len(body)),
+                                     boundary, read_size=read_size)
+            parts = []
+            for part in reader:
+                content = b""
+                while chunk := part.read(5):
+                    content += chunk
+                parts.append((part.name, part.filename, part.charset, content))
+            self.assertEqual(parts, [
+                ("field", None, None, b"value"),
+                ("file", "файл.txt", "cp1251", first),
+                ("file", "empty.txt", None, b""),
+            ])
+
+    def test_multipart_unread_part_skipped(self):
+        body = multipart_body("x", [('Content-Disposition: form-data; name="a"', b"a" * 1000),
+                                    ('Content-Disposition: form-data; name="b"', b"b")])
+        reader = MultipartReader(LimitedReader(io.BufferedReader(io.BytesIO(body)), len(body)), "x", read_size=16)
+        self.assertEqual([part.name for part in reader], ["a", "b"])
+
+    def test_truncated_multipart(self):
+        body = multipart_body("x", [('Content-Disposition: form-data; name="a"', b"data")])[:-20]
+        reader = MultipartReader(LimitedReader(io.BufferedReader(io.BytesIO(body)), len(body)), "x")
+        with self.assertRaises(BodyError):
+            for part in reader:
+                part.drain()
+
+    def test_chunked(self):
+        stream = io.BufferedReader(io.BytesIO(b"4;ext=1\r\nWiki\r\n5\r\npedia\r\n0\r\nTrailer: x\r\n\r\nnext"))
+        reader = ChunkedReader(stream)
+        data = b""
+        while chunk := reader.read(3):
+            data += chunk
+        self.assertEqual(data, b"Wikipedia")
+        # Следующий запрос соединения не затронут
+        self.assertEqual(stream.read(), b"next")
+
+        with self.assertRaises(BodyError):
+            ChunkedReader(io.BufferedReader(io.BytesIO(b"zz\r\n"))).read()
+        reader = LimitedReader(io.BufferedReader(io.BytesIO(b"abc")), 10)
+        self.assertEqual(reader.read(100), b"abc")
+        with self.assertRaises(BodyError):
+            reader.read(100)
+
+
+class TestAnalyzeEndpoint(unittest.TestCase):
+    """Тесты анализа файлов из тела запроса POST /analyze"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = TestHttpHandlerAssets._find_free_port()
+        cls.service = FileAnalysisService(max_workers=2)
+        # Блоки одного запроса анализируются по одному, поэтому запросам тестов хватает одной задачи
+        cls.admission = AdmissionController(max_jobs=1, max_wait=0)
+        cls.server = HttpServer(host="127.0.0.1", port=cls.port, analysis_service=cls.service,
+                                admission=cls.admission)
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(
+            target=cls.loop.run_until_complete,
+            args=(cls.server.start(),),
+            daemon=True
+        )
+        cls.thread.start()
+        time.sleep(0.5)
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run(cls.server.stop())
+        cls.thread.join(timeout=2)
+        cls.service.shutdown()
+
+    def _post(self, path, body, headers=None, encode_chunked=False):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        connection.request("POST", path, body=body, headers=headers or {}, encode_chunked=encode_chunked)
+        response = connection.getresponse()
+        payload = json.loads(response.read())
+        connection.close()
+        return response, payload
+
+    def test_single_file(self):
+        content = "один два три\nчетыре пять\n" * 50000
+        response, payload = self._post("/analyze?filename=a.txt&metrics=words,lines", content.encode("utf-8"))
+        self.assertEqual(response.status, 200)
+        self.assertEqual((payload["count"], payload["failed"]), (1, 0))
+        result = payload["results"][0]
+        self.assertEqual(result["filename"], "a.txt")
+        # Результат совпадает с анализом содержимого целиком
+        expected = analyze_content("a.txt", content, ("words", "lines")).to_dict()
+        self.assertEqual(result, dict(expected, index=0))
+        self.assertNotIn("char_count", result)
+        # Результат сохранен в общем кэше сервиса по содержимому
+        self.assertGreaterEqual(self.service.result_cache.stats()["entries"], 1)
+
+    def test_chunked_upload(self):
+        chunks = (("слово " * 10000).encode("cp1251") for _ in range(20))
+        response, payload = self._post("/analyze?filename=b.txt&metrics=words",
+                                       chunks, {"Content-Type": "text/plain; charset=cp1251"},
+                                       encode_chunked=True)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(payload["results"][0]["word_count"], 200000)
+
+    def test_multipart_batch(self):
+        boundary = "----form"
+        body = multipart_body(boundary, [
+            ('Content-Disposition: form-data; name="files"; filename="x.txt"', "а б в".encode("utf-8")),
+            ('Content-Disposition: form-data; name="note"', b"not a file"),
+            ('Content-Disposition: form-data; name="files"; filename="bad.txt"', b"\xff\xfe"),
+            ('Content-Disposition: form-data; name="files"; filename="y.txt"', b"one\ntwo"),
+        ])
+        response, payload = self._post("/analyze", body,
+                                       {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual((payload["count"], payload["failed"]), (3, 1))
+        x, bad, y = payload["results"]
+        self.assertEqual((x["filename"], x["word_count"]), ("x.txt", 3))
+        self.assertEqual((bad["type"], bad["filename"], bad["index"]), ("error", "bad.txt", 1))
+        self.assertEqual((y["filename"], y["line_count"]), ("y.txt", 2))
+
+    def test_busy_when_not_admitted(self):
+        """Тест: блоки загрузки проходят контроль допуска; без допуска файл получает ошибку busy"""
+        admitted = self.admission.stats()["admitted"]
+        asyncio.run_coroutine_threadsafe(self.admission.acquire("other", 1), self.loop).result()
+        try:
+            boundary = "----form"
+            body = multipart_body(boundary, [
+                ('Content-Disposition: form-data; name="files"; filename="x.txt"', b"one two"),
+                ('Content-Disposition: form-data; name="files"; filename="y.txt"', b"three"),
+            ])
+            response, payload = self._post("/analyze", body,
+                                           {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        finally:
+            self.loop.call_soon_threadsafe(self.admission.release, "other", 1)
+        self.assertEqual(response.status, 200)
+        self.assertEqual((payload["count"], payload["failed"]), (2, 2))
+        for result, filename in zip(payload["results"], ["x.txt", "y.txt"]):
+            self.assertEqual((result["type"], result["code"], result["filename"]), ("error", "busy", filename))
+            self.assertGreater(result["retry_after"], 0)
+
+        response, payload = self._post("/analyze?filename=z.txt", b"one two")
+        self.assertEqual(payload["results"][0]["word_count"], 2)
+        self.assertGreater(self.admission.stats()["admitted"], admitted + 1)
+
+    def test_bad_requests(self):
+        response, _ = self._post("/analyze?metrics=unknown", b"text")
+        self.assertEqual(response.status, 400)
+        response, _ = self._post("/analyze?encoding=zlib_codec", zlib.compress(b"a" * 10_000_000))
+        self.assertEqual(response.status, 400)
+        response, _ = self._post("/analyze", b"--x\r\nbroken",
+                                 {"Content-Type": "multipart/form-data; boundary=x"})
+        self.assertEqual(response.status, 400)
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        connection.request("POST", "/other", body=b"")
+        self.assertEqual(connection.getresponse().status, 405)
+        connection.close()
+
+
+class TestParseByteRange(unittest.TestCase):
+    """Модульные тесты разбора заголовка Range"""
+
+    def test_parse(self):
+        self.assertEqual(parse_byte_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_byte_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_byte_range("bytes=990-2000", 1000), (990, 999))
+        self.assertEqual(parse_byte_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_byte_range("bytes=-2000", 1000), (0, 999))
+        self.assertEqual(parse_byte_range("bytes=1000-", 1000), UNSATISFIABLE)
+        self.assertEqual(parse_byte_range("bytes=2000-3000", 1000), UNSATISFIABLE)
+        # Синтаксически неверный диапазон игнорируется: отдается весь файл (RFC 9110)
+        self.assertIsNone(parse_byte_range("bytes=5-1", 1000))
+        self.assertIsNone(parse_byte_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_byte_range("items=0-1", 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
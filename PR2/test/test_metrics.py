@@ -0,0 +1,130 @@
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from monitoring.metrics import MultiProcessRegistry, Registry, _Metric, write_snapshot
+
+
+def test_render_counter_and_gauge():
+    """Тест текстового формата счетчиков и индикаторов с метками"""
+    registry = Registry()
+    messages = registry.counter("ws_messages_total", "Сообщения", ["type"])
+    messages.labels("files").inc()
+    messages.labels("files").inc(2)
+    messages.labels('a"b\\c').inc()
+    registry.gauge("queue", "Очередь").set_function(lambda: 3)
+
+    text = registry.render()
+    assert "# TYPE ws_messages_total counter" in text
+    assert 'ws_messages_total{type="files"} 3' in text
+    assert 'ws_messages_total{type="a\\"b\\\\c"} 1' in text
+    assert "# TYPE queue gauge\n" in text
+    assert "\nqueue 3\n" in text
+
+
+def test_render_histogram():
+    """Тест накопленных корзин, суммы и количества гистограммы"""
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Задержка", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 2.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_register_same_metric_twice():
+    """Тест повторной регистрации: та же метрика или ошибка при другом типе"""
+    registry = Registry()
+    counter = registry.counter("files_total", "Файлы", ["source"])
+    assert registry.counter("files_total", "Файлы", ["source"]) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("files_total", "Файлы")
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+
+
+def test_metric_base_is_abstract():
+    """Тест: общий класс метрик нельзя создать без реализации значения метрики"""
+    with pytest.raises(TypeError):
+        _Metric("files_total", "Файлы")
+
+
+def _worker_registry(files: int, connections: int, latency: float) -> Registry:
+    registry = Registry()
+    registry.counter("files_total", "Файлы", ["source"]).labels("content").inc(files)
+    registry.gauge("connections", "Соединения").set(connections)
+    registry.histogram("latency_seconds", "Задержка", buckets=(0.1, 1.0)).observe(latency)
+    return registry
+
+
+def test_multiprocess_registry_sums_worker_snapshots(tmp_path):
+    """Тест суммирования снимков воркеров; индикаторы завершившихся воркеров не учитываются"""
+    write_snapshot(_worker_registry(2, 3, 0.05), str(tmp_path), pid=101)
+    write_snapshot(_worker_registry(5, 4, 0.5), str(tmp_path), pid=102)
+    (tmp_path / "worker-103.json").write_text("{oops")
+
+    supervisor = MultiProcessRegistry(str(tmp_path), Registry(), lambda pid: pid == 101)
+    supervisor.gauge("workers_alive", "Воркеры").set(1)
+
+    text = supervisor.render()
+    assert 'files_total{source="content"} 7' in text
+    assert "\nconnections 3\n" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert "\nworkers_alive 1\n" in text
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен fork")
+def test_locks_reinitialized_after_fork():
+    """Тест: блокировки, занятые в момент fork (потоком HTTP сервера), в дочернем процессе свободны"""
+    registry = Registry()
+    counter = registry.counter("files_total", "Файлы", ["source"])
+    with registry._lock, counter._lock:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                registry.gauge("connections", "Соединения").set(1)
+                counter.labels("content").inc()
+                code = 0
+            finally:
+                os._exit(code)
+    # Без пересоздания блокировок дочерний процесс зависает: ждем ограниченное время
+    deadline = time.monotonic() + 10
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() > deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            pytest.fail("дочерний процесс завис на унаследованной блокировке")
+        time.sleep(0.01)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_supervisor_renders_service_metrics(tmp_path):
+    """Тест: /metrics супервизора включает счетчики, которые обновляют модули сервиса"""
+    # main.py импортирует пакеты через PR2., а метрики - как остальные модули пакета
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from PR2.main import Application
+    from websocket.analysis_service import FILES_ANALYZED
+
+    app = Application(workers=2)
+    app.metrics_dir = str(tmp_path)
+    FILES_ANALYZED.labels("supervisor-test").inc(3)
+    text = app.supervisor_registry().render()
+    assert 'analysis_files_total{source="supervisor-test"} 3' in text
+    assert "\nsupervisor_workers_alive 0\n" in text
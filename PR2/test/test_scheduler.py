@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from websocket.scheduler import JobScheduler, job_owner
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+async def run_blocked(scheduler: JobScheduler, submit):
+    """Занимает единственного воркера, ставит задачи в очередь и возвращает порядок их выполнения"""
+    order = []
+    gate = threading.Event()
+    blocker = scheduler.submit(0, gate.wait)
+    futures = submit(lambda name: scheduler.submit(*name[1:], order.append, name[0]))
+    assert scheduler.pending == len(futures)
+    gate.set()
+    await asyncio.wrap_future(blocker)
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futures if not f.cancelled()))
+    return order
+
+
+@pytest.mark.asyncio
+async def test_small_jobs_of_other_connection_go_first(executor):
+    """Тест: мелкая задача другого соединения не ждет крупную"""
+    scheduler = JobScheduler(executor, slots=1)
+
+    def submit(job):
+        job_owner.set('a')
+        futures = [job(('big', 500 << 20)), job(('a-small', 100))]
+        job_owner.set('b')
+        futures.append(job(('b-small', 100)))
+        return futures
+
+    assert await run_blocked(scheduler, submit) == ['a-small', 'b-small', 'big']
+
+
+@pytest.mark.asyncio
+async def test_connections_interleave(executor):
+    """Тест справедливого чередования задач соединений"""
+    scheduler = JobScheduler(executor, slots=1)
+
+    def submit(job):
+        job_owner.set('a')
+        futures = [job((f'a{i}', 1000)) for i in range(4)]
+        job_owner.set('b')
+        futures += [job((f'b{i}', 1000)) for i in range(2)]
+        return futures
+
+    assert await run_blocked(scheduler, submit) == ['a0', 'b0', 'a1', 'b1', 'a2', 'a3']
+
+
+@pytest.mark.asyncio
+async def test_big_job_ages(executor):
+    """Тест старения: крупная задача не пропускает вперед задачи, поступившие много позже"""
+    scheduler = JobScheduler(executor, slots=1, aging_rate=100_000)
+
+    def submit(job):
+        job_owner.set('a')
+        futures = [job(('big', 1000)), job(('early-small', 10))]
+        # Ключ крупной задачи - момент поступления плюс 10 мс
+        time.sleep(0.02)
+        futures.append(job(('late-small', 10)))
+        return futures
+
+    assert await run_blocked(scheduler, submit) == ['early-small', 'big', 'late-small']
+
+
+@pytest.mark.asyncio
+async def test_cancelled_job_not_run(executor):
+    """Тест: задача, отмененная в очереди, не запускается"""
+    scheduler = JobScheduler(executor, slots=1)
+
+    def submit(job):
+        futures = [job(('cancelled', 10)), job(('kept', 10))]
+        futures[0].cancel()
+        assert scheduler.pending == 1
+        return futures[1:]
+
+    assert await run_blocked(scheduler, submit) == ['kept']
+    assert (scheduler.pending, scheduler.running) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_job_cancelled_by_executor_shutdown():
+    """Тест: задача, отмененная остановкой пула, завершается CancelledError asyncio"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    scheduler = JobScheduler(executor, slots=2)
+    gate = threading.Event()
+    blocker = scheduler.submit(0, gate.wait)
+    queued = scheduler.submit(0, time.sleep, 0)
+    executor.shutdown(wait=False, cancel_futures=True)
+    gate.set()
+    await asyncio.wrap_future(blocker)
+    assert isinstance(queued.exception(), asyncio.CancelledError)
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wrap_future(queued)
+    await asyncio.sleep(0)
+    assert scheduler.running == 0
@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import json
+import os
+import socket
+import sys
+
+import aiohttp
+import pytest
+import pytest_asyncio
+import websockets
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_server.unified import UnifiedServer
+from websocket.analysis_service import analyze_content
+
+
+def find_free_port():
+    """Находит свободный порт для запуска сервера"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+@pytest_asyncio.fixture
+async def server():
+    """Фикстура для запуска единого сервера на свободном порту"""
+    server = UnifiedServer(host='localhost', port=find_free_port())
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.2)
+    yield server
+    await server.stop()
+    await server_task
+
+
+@pytest_asyncio.fixture
+async def client():
+    # Ответы в gzip проверяются без автоматической распаковки
+    async with aiohttp.ClientSession(auto_decompress=False) as session:
+        yield session
+
+
+def url(server, path='/'):
+    return f'http://localhost:{server.port}{path}'
+
+
+@pytest.mark.asyncio
+async def test_static_files(server, client):
+    """Тест статических файлов: кэш, условные запросы, Range и gzip"""
+    async with client.get(url(server), headers={'Accept-Encoding': 'identity'}) as response:
+        assert response.status == 200
+        assert 'Content-Encoding' not in response.headers
+        body = await response.read()
+        etag = response.headers['ETag']
+    assert b'<html' in body
+
+    async with client.get(url(server), headers={'If-None-Match': etag}) as response:
+        assert response.status == 304
+    async with client.get(url(server), headers={'Accept-Encoding': 'gzip'}) as response:
+        gzip_etag = response.headers['ETag']
+    async with client.get(url(server), headers={'If-None-Match': gzip_etag, 'Accept-Encoding': 'identity'}) as response:
+        # 304 повторяет совпавший ETag сжатого представления
+        assert (response.status, response.headers['ETag']) == (304, gzip_etag)
+    async with client.get(url(server), headers={'Range': 'bytes=5-1'}) as response:
+        assert response.status == 200
+    async with client.get(url(server), headers={'Range': 'bytes=10-19'}) as response:
+        assert response.status == 206
+        assert await response.read() == body[10:20]
+    async with client.get(url(server), headers={'Accept-Encoding': 'gzip'}) as response:
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(await response.read()) == body
+    async with client.head(url(server)) as response:
+        assert response.status == 200
+        assert await response.read() == b''
+    async with client.get(url(server, '/missing.html')) as response:
+        assert response.status == 404
+    async with client.get(url(server, '/%2e%2e/handler.py')) as response:
+        assert response.status == 404
+
+
+@pytest.mark.asyncio
+async def test_websocket_and_http_share_port_and_metrics(server, client):
+    """Тест: WebSocket и HTTP на одном порту, /metrics видит запросы обоих"""
+    async with websockets.connect(f'ws://localhost:{server.port}') as websocket:
+        await websocket.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a b'}]}))
+        result = json.loads(await websocket.recv())
+    assert result['word_count'] == 2
+    await asyncio.sleep(0.1)
+
+    async with client.get(url(server, '/metrics')) as response:
+        assert response.status == 200
+        text = await response.text()
+    assert 'http_requests_total{route="websocket",status="101"}' in text
+    assert 'ws_connections_active' in text
+
+
+@pytest.mark.asyncio
+async def test_analyze(server, client):
+    """Тест POST /analyze: один файл по частям и пакет multipart"""
+    content = 'один два\nтри\n' * 40000
+
+    async def chunks():
+        data = content.encode('utf-8')
+        for start in range(0, len(data), 100000):
+            yield data[start:start + 100000]
+
+    async with client.post(url(server, '/analyze?filename=a.txt&metrics=words,lines'), data=chunks()) as response:
+        assert response.status == 200
+        payload = await response.json()
+    expected = analyze_content('a.txt', content, ('words', 'lines')).to_dict()
+    assert payload['results'] == [dict(expected, index=0)]
+
+    form = aiohttp.FormData(quote_fields=False)
+    form.add_field('files', 'а б'.encode('utf-8'), filename='файл.txt')
+    form.add_field('note', 'поле формы')
+    form.add_field('files', b'\xff', filename='bad.txt')
+    async with client.post(url(server, '/analyze?metrics=words'), data=form) as response:
+        payload = await response.json()
+    assert (payload['count'], payload['failed']) == (2, 1)
+    assert payload['results'][0]['filename'] == 'файл.txt' and payload['results'][0]['word_count'] == 2
+    assert payload['results'][1]['type'] == 'error'
+
+    async with client.post(url(server, '/analyze?metrics=unknown'), data=b'x') as response:
+        assert response.status == 400
+
+
+@pytest.mark.asyncio
+async def test_analyze_admitted(server, client):
+    """Тест: блоки POST /analyze проходят общий контроль допуска; без допуска - ошибка busy"""
+    server.admission.max_jobs = 1
+    server.admission.max_wait = 0
+    await server.admission.acquire('other', 1)
+    try:
+        async with client.post(url(server, '/analyze?filename=a.txt'), data=b'one two') as response:
+            payload = await response.json()
+    finally:
+        server.admission.release('other', 1)
+    result = payload['results'][0]
+    assert (result['type'], result['code'], result['filename']) == ('error', 'busy', 'a.txt')
+
+    async with client.post(url(server, '/analyze?filename=a.txt'), data=b'one two') as response:
+        payload = await response.json()
+    assert payload['results'][0]['word_count'] == 2
+    assert server.admission.stats()['admitted'] == 2
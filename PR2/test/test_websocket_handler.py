@@ -0,0 +1,545 @@
+import asyncio
+import gc
+import io
+import json
+import os
+import socket
+import sys
+import tarfile
+import threading
+import warnings
+import zipfile
+import zlib
+
+import pytest
+import pytest_asyncio
+import websockets
+
+# Пакеты PR2 импортируются относительно каталога PR2
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_server.unified import UnifiedServer
+from monitoring.metrics import REGISTRY
+from websocket.frames import FRAME_CHUNK, FRAME_FILE, build_frame
+from websocket.models import FileAnalysis
+from websocket.server import WebSocketServer
+from websocket.session import ClientSession, SessionStore
+
+
+def find_free_port():
+    """Находит свободный порт для запуска сервера"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+@pytest_asyncio.fixture(params=[WebSocketServer, UnifiedServer], ids=['websockets', 'unified'])
+async def server(request):
+    """Фикстура для запуска WebSocket сервера на свободном порту (отдельного и единого с HTTP)"""
+    server = request.param(host='localhost', port=find_free_port())
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.2)
+    yield server
+    await server.stop()
+    server_task.cancel()
+    try:
+        await server_task
+    except asyncio.CancelledError:
+        pass
+
+
+def url(server):
+    return f'ws://localhost:{server.port}'
+
+
+@pytest.mark.asyncio
+async def test_stream_results_as_completed(server):
+    """Тест потоковой отправки результатов по мере готовности"""
+    service = server.analysis_service
+    original = service.analyze_file
+
+    async def analyze_file(filename, content, *args):
+        if filename == 'big.txt':
+            await asyncio.sleep(0.3)
+        return await original(filename, content, *args)
+
+    service.analyze_file = analyze_file
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({
+            'type': 'files',
+            'stream': True,
+            'batch_id': 'batch-1',
+            'files': [
+                {'filename': 'big.txt', 'content': 'big file'},
+                {'filename': 'small.txt', 'content': 'small'},
+            ]
+        }))
+        messages = [json.loads(await websocket.recv()) for _ in range(3)]
+
+    assert [m['type'] for m in messages] == ['analysis', 'analysis', 'batch_complete']
+    assert [m.get('filename') for m in messages[:2]] == ['small.txt', 'big.txt']
+    assert [m['index'] for m in messages[:2]] == [1, 0]
+    assert all(m['batch_id'] == 'batch-1' for m in messages)
+    assert (messages[2]['count'], messages[2]['failed']) == (2, 0)
+
+
+@pytest.mark.asyncio
+async def test_stream_assigns_batch_id_and_reports_failures(server):
+    """Тест идентификатора пакета от сервера и ошибок отдельных файлов"""
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({
+            'type': 'files',
+            'stream': True,
+            'files': [{'filename': 'ok.txt', 'content': 'a b'}, {'content': 'no name'}]
+        }))
+        messages = [json.loads(await websocket.recv()) for _ in range(3)]
+
+    types = sorted(m['type'] for m in messages)
+    assert types == ['analysis', 'batch_complete', 'error']
+    assert len({m['batch_id'] for m in messages}) == 1
+    assert messages[-1]['failed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_chunked_upload(server):
+    """Тест загрузки файла по частям со словами и строками на границах частей"""
+    content = 'первая строка\nвторая строка 😀 конец\n'
+    chunks = [content[i:i + 5] for i in range(0, len(content), 5)]
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'big.txt'}))
+        started = json.loads(await websocket.recv())
+        assert started['type'] == 'upload_started'
+        upload_id = started['upload_id']
+
+        for chunk in chunks:
+            await websocket.send(json.dumps({'type': 'file_chunk', 'upload_id': upload_id, 'data': chunk}))
+        await websocket.send(json.dumps({'type': 'file_end', 'upload_id': upload_id}))
+        result = json.loads(await websocket.recv())
+
+        await websocket.send(json.dumps({'type': 'get_stats'}))
+        stats = json.loads(await websocket.recv())['stats']
+
+    assert result['type'] == 'analysis'
+    assert result['upload_id'] == upload_id
+    assert (result['word_count'], result['char_count'], result['line_count']) == (6, len(content), 3)
+    assert stats['total_files'] == 1
+
+
+@pytest.mark.asyncio
+async def test_chunk_for_unknown_upload(server):
+    """Тест части файла без начала загрузки"""
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'file_chunk', 'upload_id': 'missing', 'data': 'x'}))
+        data = json.loads(await websocket.recv())
+    assert data['type'] == 'error'
+
+
+@pytest.mark.asyncio
+async def test_non_text_encoding_rejected(server):
+    """Тест: загрузка, бинарный файл и архив с кодеком bytes-to-bytes отклоняются"""
+    async with websockets.connect(url(server)) as websocket:
+        for archive in (False, True):
+            await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'a.txt', 'upload_id': 5,
+                                             'encoding': 'zlib_codec', 'archive': archive}))
+            data = json.loads(await websocket.recv())
+            assert data['type'] == 'error' and 'zlib_codec' in data['message']
+        await websocket.send(build_frame(FRAME_FILE, 6, 'a.txt', zlib.compress(b'a' * 1000), 'zlib_codec'))
+        data = json.loads(await websocket.recv())
+    assert (data['type'], data['request_id']) == ('error', 6)
+
+
+@pytest.mark.asyncio
+async def test_binary_file_frame(server):
+    """Тест анализа файла из бинарного сообщения"""
+    content = 'привет мир\nвторая строка'
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(build_frame(FRAME_FILE, 7, 'привет.txt', content.encode('utf-8')))
+        result = json.loads(await websocket.recv())
+        await websocket.send(build_frame(FRAME_FILE, 8, 'cp.txt', content.encode('cp1251'), 'cp1251'))
+        legacy = json.loads(await websocket.recv())
+        await websocket.send(build_frame(FRAME_FILE, 9, 'bad.txt', b'\xff\xfe'))
+        error = json.loads(await websocket.recv())
+        await websocket.send(b'not a frame')
+        malformed = json.loads(await websocket.recv())
+
+    assert result['type'] == 'analysis'
+    assert result['request_id'] == 7
+    assert result['filename'] == 'привет.txt'
+    assert (result['word_count'], result['char_count'], result['line_count']) == (4, len(content), 2)
+    assert (legacy['word_count'], legacy['char_count']) == (4, len(content))
+    assert error['type'] == 'error' and error['request_id'] == 9
+    assert malformed['type'] == 'error'
+
+
+@pytest.mark.asyncio
+async def test_binary_chunked_upload(server):
+    """Тест загрузки по частям в бинарных сообщениях с символами на границах частей"""
+    content = 'первая строка\nвторая 😀 конец'
+    payload = content.encode('utf-8')
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'big.txt', 'upload_id': 42}))
+        await websocket.recv()
+        for start in range(0, len(payload), 3):
+            await websocket.send(build_frame(FRAME_CHUNK, 42, '', payload[start:start + 3]))
+        await websocket.send(json.dumps({'type': 'file_end', 'upload_id': 42}))
+        result = json.loads(await websocket.recv())
+
+    assert result['upload_id'] == '42'
+    assert (result['word_count'], result['char_count'], result['line_count']) == (5, len(content), 2)
+
+
+async def upload_archive(websocket, upload_id: int, data: bytes, chunk_size: int = 64 << 10) -> list:
+    """Загружает архив бинарными частями и возвращает сообщения до archive_complete включительно"""
+    await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'files.tar.gz', 'upload_id': upload_id,
+                                     'archive': True}))
+    assert json.loads(await websocket.recv())['type'] == 'upload_started'
+    messages = []
+
+    async def receive():
+        while not messages or messages[-1]['type'] != 'archive_complete':
+            messages.append(json.loads(await websocket.recv()))
+
+    receiver = asyncio.ensure_future(receive())
+    for start in range(0, len(data), chunk_size):
+        await websocket.send(build_frame(FRAME_CHUNK, upload_id, '', data[start:start + chunk_size]))
+    await websocket.send(json.dumps({'type': 'file_end', 'upload_id': upload_id}))
+    await asyncio.wait_for(receiver, 10)
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_archive_upload(server):
+    """Тест загрузки архива tar.gz: результат каждого файла, включая крупный и недекодируемый"""
+    files = {f'docs/{i}.txt': f'строка {i}\n'.encode() * i for i in range(30)}
+    # Крупный файл анализируется по блокам; многобайтные символы попадают на границы блоков
+    files['big.txt'] = 'слово 😀 word\n'.encode() * 40000
+    files['bad.txt'] = b'\xff\xfe broken'
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+    async with websockets.connect(url(server)) as websocket:
+        messages = await upload_archive(websocket, 7, buffer.getvalue())
+
+    complete = messages.pop()
+    assert complete == {'type': 'archive_complete', 'upload_id': '7', 'filename': 'files.tar.gz',
+                        'count': len(files), 'failed': 1}
+    by_name = {message['filename']: message for message in messages}
+    assert len(by_name) == len(files) and {m['upload_id'] for m in messages} == {'7'}
+    assert sorted(m['index'] for m in messages) == list(range(len(files)))
+    assert by_name['bad.txt']['type'] == 'error'
+    for name, content in files.items():
+        if name == 'bad.txt':
+            continue
+        text = content.decode('utf-8')
+        result = by_name[name]
+        assert (result['word_count'], result['char_count']) == (len(text.split()), len(text)), name
+
+
+@pytest.mark.asyncio
+async def test_zip_archive_upload(server):
+    """Тест загрузки zip с дескрипторами данных (архив записан в поток без перемотки) и оборванного архива"""
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self.data = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, data):
+            self.data += data
+            return len(data)
+
+    output = Unseekable()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(5):
+            with archive.open(f'{i}.txt', 'w') as member:
+                member.write(b'a b c\n' * (i + 1))
+    data = bytes(output.data)
+
+    async with websockets.connect(url(server)) as websocket:
+        messages = await upload_archive(websocket, 8, data, chunk_size=100)
+        assert messages[-1]['count'] == 5 and messages[-1]['failed'] == 0
+        assert sorted(m['word_count'] for m in messages[:-1]) == [3, 6, 9, 12, 15]
+
+        truncated = await upload_archive(websocket, 9, data[:len(data) // 2])
+        assert truncated[-2]['type'] == 'error' and 'архива' in truncated[-2]['message']
+        assert truncated[-1]['type'] == 'archive_complete'
+
+
+@pytest.mark.asyncio
+async def test_archive_busy_when_extraction_threads_taken(server):
+    """Тест: архив сверх лимита потоков распаковки сервера отклоняется с подсказкой retry_after"""
+    server.handler.archive_threads = threading.BoundedSemaphore(1)
+    async with websockets.connect(url(server)) as websocket:
+        for upload_id in (1, 2):
+            await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'a.zip', 'upload_id': upload_id,
+                                             'archive': True}))
+        started = json.loads(await websocket.recv())
+        busy = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'cancel', 'upload_id': 1}))
+        assert json.loads(await websocket.recv())['found']
+    assert started['type'] == 'upload_started'
+    assert (busy['code'], busy['upload_id']) == ('busy', '2') and busy['retry_after'] > 0
+
+
+@pytest.mark.asyncio
+async def test_busy_error_when_over_budget(server):
+    """Тест отказа с кодом busy и подсказкой retry_after при перегрузке"""
+    server.admission.max_jobs = 1
+    server.admission.max_wait = 0
+    release = asyncio.Event()
+    original = server.analysis_service.analyze_file
+
+    async def analyze_file(filename, content, *args):
+        await release.wait()
+        return await original(filename, content, *args)
+
+    server.analysis_service.analyze_file = analyze_file
+    async with websockets.connect(url(server)) as first, websockets.connect(url(server)) as second:
+        await first.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a b'}]}))
+        await asyncio.sleep(0.05)
+        await second.send(json.dumps({'type': 'files', 'stream': True,
+                                      'files': [{'filename': 'b.txt', 'content': 'b'}]}))
+        busy = json.loads(await second.recv())
+        release.set()
+        result = json.loads(await first.recv())
+
+    assert busy['type'] == 'error' and busy['code'] == 'busy'
+    assert busy['retry_after'] > 0 and busy['filename'] == 'b.txt'
+    assert result['type'] == 'analysis'
+    assert server.admission.stats()['jobs_in_flight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_keeps_results_of_admitted_files(server):
+    """Тест: в обычном пакете отказ busy получают только недопущенные файлы, остальные - результаты"""
+    server.admission.per_connection_jobs = 1
+    server.admission.max_wait = 0
+    files = [{'filename': 'a.txt', 'content': 'a b'}, {'filename': 'b.txt', 'content': 'b'}]
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'files', 'files': files}))
+        first, second = [json.loads(await websocket.recv()) for _ in files]
+        await websocket.send(json.dumps({'type': 'get_stats'}))
+        stats = json.loads(await websocket.recv())['stats']
+
+    assert (first['type'], first['filename'], first['word_count']) == ('analysis', 'a.txt', 2)
+    assert (second['code'], second['filename']) == ('busy', 'b.txt') and second['retry_after'] > 0
+    assert stats['total_files'] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_with_malformed_file_rejected(server):
+    """Тест: пакет с элементом без content отклоняется целиком, не создавая задач анализа"""
+    files = [{'filename': 'a.txt', 'content': 'a b'}, {'filename': 'b.txt'}]
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        async with websockets.connect(url(server)) as websocket:
+            await websocket.send(json.dumps({'type': 'files', 'files': files}))
+            error = json.loads(await websocket.recv())
+            await websocket.send(json.dumps({'type': 'get_stats'}))
+            stats = json.loads(await websocket.recv())['stats']
+        gc.collect()
+
+    assert error['type'] == 'error' and 'content' in error['message']
+    assert stats['total_files'] == 0
+    assert not [w for w in caught if 'never awaited' in str(w.message)]
+
+
+def test_session_running_totals():
+    """Тест накопленных итогов сессии при замене результата файла с тем же именем"""
+    session = ClientSession()
+    session.record(FileAnalysis('a.txt', 2, 10, 1))
+    session.record(FileAnalysis('b.txt', 3, 20, 2))
+    session.record(FileAnalysis('a.txt', 5, 30, 4))
+    stats = session.stats()
+    assert (stats.total_files, stats.total_words, stats.total_chars, stats.total_lines) == (2, 8, 50, 6)
+
+
+def test_session_store_ttl_and_eviction():
+    """Тест срока хранения сессий и вытеснения по числу сессий"""
+    store = SessionStore(ttl=10, max_sessions=2)
+    sessions = [ClientSession() for _ in range(3)]
+    for index, session in enumerate(sessions):
+        session.record(FileAnalysis('a.txt', 1, 1, 1))
+        store.park(session, now=index)
+
+    assert store.take(sessions[0].token, now=3) is None
+    assert store.take(sessions[1].token, now=3) is sessions[1]
+    assert store.take(sessions[1].token, now=3) is None
+    assert store.take(sessions[2].token, now=12.5) is None
+    stats = store.stats()
+    assert (stats['sessions'], stats['bytes']) == (0, 0)
+    assert (stats['resumed'], stats['expired'], stats['evictions']) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_session_resumed_after_reconnect(server):
+    """Тест продолжения сессии по токену после переподключения без повторной загрузки"""
+    async with websockets.connect(url(server) + '/?session=') as websocket:
+        session = json.loads(await websocket.recv())
+        assert session['type'] == 'session' and not session['resumed']
+        await websocket.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a b\nc'}]}))
+        await websocket.recv()
+
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'files', 'files': [{'filename': 'b.txt', 'content': 'd'}]}))
+        await websocket.recv()
+        await websocket.send(json.dumps({'type': 'session', 'session': session['session']}))
+        resumed = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'get_stats'}))
+        stats = json.loads(await websocket.recv())['stats']
+
+    assert resumed['resumed'] and resumed['session'] == session['session']
+    assert sorted(r['filename'] for r in resumed['results']) == ['a.txt', 'b.txt']
+    assert (stats['total_files'], stats['total_words'], stats['total_lines']) == (2, 4, 3)
+
+    async with websockets.connect(url(server) + '/?session=unknown') as websocket:
+        data = json.loads(await websocket.recv())
+    assert not data['resumed'] and data['session'] != 'unknown' and data['results'] == []
+
+
+@pytest.mark.asyncio
+async def test_session_taken_from_live_connection(server):
+    """Тест переподключения, когда сервер еще не заметил разрыв прежнего соединения"""
+    old = await websockets.connect(url(server) + '/?session=')
+    token = json.loads(await old.recv())['session']
+    await old.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a'}]}))
+    await old.recv()
+
+    async with websockets.connect(url(server) + f'/?session={token}') as websocket:
+        data = json.loads(await websocket.recv())
+    assert data['resumed'] and [r['filename'] for r in data['results']] == ['a.txt']
+    with pytest.raises(websockets.ConnectionClosed):
+        await asyncio.wait_for(old.recv(), 1)
+    assert old.close_code == 4000
+
+
+@pytest.mark.asyncio
+async def test_cancel_batch(server):
+    """Тест отмены потокового пакета сообщением cancel во время анализа"""
+    service = server.analysis_service
+    original = service.analyze_file
+    cancelled = asyncio.Event()
+
+    async def analyze_file(filename, content, *args):
+        if filename == 'slow.txt':
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return await original(filename, content, *args)
+
+    service.analyze_file = analyze_file
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({
+            'type': 'files', 'stream': True, 'batch_id': 'b1',
+            'files': [{'filename': 'slow.txt', 'content': 'a'}, {'filename': 'fast.txt', 'content': 'b c'}]
+        }))
+        first = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'cancel', 'batch_id': 'other'}))
+        missed = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'cancel', 'batch_id': 'b1'}))
+        reply = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'get_stats'}))
+        stats = json.loads(await websocket.recv())
+
+    assert first['filename'] == 'fast.txt'
+    assert missed == {'type': 'cancelled', 'batch_id': 'other', 'found': False}
+    assert reply == {'type': 'cancelled', 'batch_id': 'b1', 'found': True}
+    assert cancelled.is_set()
+    assert stats['type'] == 'stats' and stats['stats']['total_files'] == 1
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_analysis(server):
+    """Тест отмены анализа при отключении клиента"""
+    cancelled = asyncio.Event()
+
+    async def analyze_file(filename, content, *args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    server.analysis_service.analyze_file = analyze_file
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a'}]}))
+        await asyncio.sleep(0.05)
+    await asyncio.wait_for(cancelled.wait(), 2)
+    assert server.admission.stats()['jobs_in_flight'] == 0
+
+
+@pytest.mark.asyncio
+async def test_requested_metrics(server):
+    """Тест выбора метрик в запросе и при загрузке по частям"""
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({
+            'type': 'files',
+            'metrics': ['words', 'unique_words', 'longest_line'],
+            'files': [{'filename': 'a.txt', 'content': 'a b a\nlonger line'}]
+        }))
+        result = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'file_begin', 'filename': 'b.txt', 'metrics': ['bytes']}))
+        upload_id = json.loads(await websocket.recv())['upload_id']
+        await websocket.send(json.dumps({'type': 'file_chunk', 'upload_id': upload_id, 'data': 'привет'}))
+        await websocket.send(json.dumps({'type': 'file_end', 'upload_id': upload_id}))
+        upload = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({'type': 'files', 'metrics': ['pages'],
+                                         'files': [{'filename': 'a.txt', 'content': 'x'}]}))
+        error = json.loads(await websocket.recv())
+
+    assert result == {'type': 'analysis', 'filename': 'a.txt', 'word_count': 5,
+                      'unique_words': 4, 'longest_line': 11}
+    assert upload['byte_count'] == 12 and 'word_count' not in upload
+    assert error['type'] == 'error'
+
+
+@pytest.mark.asyncio
+async def test_paths_request(tmp_path):
+    """Тест анализа файлов сервера по ссылке"""
+    (tmp_path / 'a.txt').write_text('один два\nтри', encoding='utf-8')
+    server = WebSocketServer(host='localhost', port=find_free_port(), files_root=str(tmp_path))
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(0.2)
+    try:
+        async with websockets.connect(url(server)) as websocket:
+            await websocket.send(json.dumps({'type': 'paths', 'paths': ['a.txt', '../etc/passwd']}))
+            messages = [json.loads(await websocket.recv()) for _ in range(3)]
+    finally:
+        await server.stop()
+        server_task.cancel()
+
+    by_index = {m.get('index'): m for m in messages}
+    assert by_index[0]['type'] == 'analysis'
+    assert (by_index[0]['word_count'], by_index[0]['line_count']) == (3, 2)
+    assert by_index[1]['type'] == 'error'
+    assert messages[-1]['type'] == 'batch_complete' and messages[-1]['failed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_paths_disabled(server):
+    """Тест запроса paths без настроенного каталога"""
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'paths', 'paths': ['a.txt']}))
+        data = json.loads(await websocket.recv())
+    assert data['type'] == 'error'
+
+
+@pytest.mark.asyncio
+async def test_metrics_updated(server):
+    """Тест обновления метрик соединений, сообщений, файлов и задержек"""
+    messages = REGISTRY.get('ws_messages_total').labels('files')
+    files = REGISTRY.get('analysis_files_total').labels('content')
+    latency = REGISTRY.get('analysis_duration_seconds').labels('content')
+    before = (messages.get(), files.get(), latency.count)
+    async with websockets.connect(url(server)) as websocket:
+        await websocket.send(json.dumps({'type': 'files', 'files': [{'filename': 'a.txt', 'content': 'a b'}]}))
+        await websocket.recv()
+        assert REGISTRY.get('ws_connections_active').labels().get() >= 1
+    assert (messages.get(), files.get(), latency.count) == (before[0] + 1, before[1] + 1, before[2] + 1)
+    assert 'ws_send_duration_seconds_count' in REGISTRY.render()
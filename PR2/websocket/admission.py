@@ -0,0 +1,218 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable, List
+
+# Начальная оценка длительности одной задачи анализа для подсказки retry_after
+_INITIAL_JOB_SECONDS = 0.05
+# Вес новой длительности в скользящем среднем
+_DURATION_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к анализу: бюджет исчерпан"""
+
+    def __init__(self, message: str, retry_after: float):
+        """
+        Args:
+            message: Описание причины отказа
+            retry_after: Рекомендуемая пауза перед повтором в секундах
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """Запрос, ожидающий освобождения бюджета"""
+
+    __slots__ = ("key", "size", "future")
+
+    def __init__(self, key: Hashable, size: int, future: asyncio.Future):
+        self.key = key
+        self.size = size
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Контроль допуска задач анализа: общий бюджет байт и задач в работе и лимиты на соединение
+
+    Запрос, не укладывающийся в бюджет, ждет в очереди (FIFO) не дольше max_wait секунд,
+    затем отклоняется с подсказкой retry_after. Пока обработчик ждет допуска, он не читает
+    следующие сообщения соединения, поэтому клиент упирается в TCP-окно (backpressure).
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, max_jobs: int = 64,
+                 per_connection_bytes: int = 16 << 20, per_connection_jobs: int = 8,
+                 max_wait: float = 5.0):
+        """
+        Инициализирует контроль допуска
+
+        Args:
+            max_bytes: Общий объем содержимого в работе (байт или символов текста)
+            max_jobs: Общее число задач в работе
+            per_connection_bytes: Объем содержимого в работе для одного соединения
+            per_connection_jobs: Число задач в работе для одного соединения
+            max_wait: Максимальное ожидание допуска в секундах (0 - отклонять сразу)
+        """
+        self.max_bytes = max_bytes
+        self.max_jobs = max_jobs
+        self.per_connection_bytes = per_connection_bytes
+        self.per_connection_jobs = per_connection_jobs
+        self.max_wait = max_wait
+        self.bytes_in_flight = 0
+        self.jobs_in_flight = 0
+        self._connections: Dict[Hashable, List[int]] = {}
+        self._waiters: Deque[_Waiter] = deque()
+        self._job_seconds = _INITIAL_JOB_SECONDS
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self, key: Hashable, size: int):
+        """
+        Допускает задачу к анализу на время блока with
+
+        Args:
+            key: Соединение, от которого пришла задача
+            size: Объем содержимого задачи
+
+        Raises:
+            AdmissionRejected: Если бюджет не освободился за max_wait секунд
+        """
+        await self.acquire(key, size)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started
+            self._job_seconds += (duration - self._job_seconds) * _DURATION_SMOOTHING
+            self.release(key, size)
+
+    async def acquire(self, key: Hashable, size: int, patient: bool = False):
+        """
+        Занимает бюджет под задачу, ожидая его освобождения при необходимости
+
+        Args:
+            key: Соединение, от которого пришла задача
+            size: Объем содержимого задачи
+            patient: Ждать без ограничения max_wait - для задач, которые нельзя повторить
+                     отдельно (файлы архива): их источник сам ждет, упираясь в TCP-окно
+
+        Raises:
+            AdmissionRejected: Если бюджет не освободился за max_wait секунд
+        """
+        if not self._waiters and self._fits(key, size):
+            self._take(key, size)
+            return
+        if self.max_wait <= 0 and not patient:
+            self._reject()
+
+        future = asyncio.get_event_loop().create_future()
+        waiter = _Waiter(key, size, future)
+        self._waiters.append(waiter)
+        self.queued += 1
+        # Очередь может состоять из задач, ждущих лимита своего соединения
+        self._wake_waiters()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), None if patient else self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._remove_waiter(waiter)
+                self._reject()
+        except asyncio.CancelledError:
+            if future.done():
+                # Бюджет уже был занят под эту задачу - возвращаем его
+                self.release(key, size)
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+    def release(self, key: Hashable, size: int):
+        """Освобождает бюджет задачи и допускает ожидающие задачи"""
+        self.bytes_in_flight -= size
+        self.jobs_in_flight -= 1
+        usage = self._connections[key]
+        usage[0] -= size
+        usage[1] -= 1
+        if usage[1] == 0:
+            del self._connections[key]
+        self._wake_waiters()
+
+    def retry_after(self) -> float:
+        """Оценка времени до освобождения бюджета в секундах"""
+        backlog = len(self._waiters) + self.jobs_in_flight
+        return round(max(0.1, self._job_seconds * backlog / max(1, self.max_jobs)), 2)
+
+    def stats(self) -> Dict[str, float]:
+        """Текущая загрузка и счетчики допуска"""
+        return {
+            'bytes_in_flight': self.bytes_in_flight,
+            'jobs_in_flight': self.jobs_in_flight,
+            'waiting': len(self._waiters),
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected': self.rejected
+        }
+
+    def _fits(self, key: Hashable, size: int) -> bool:
+        """
+        Проверяет, укладывается ли задача в бюджет
+
+        Задача крупнее бюджета допускается, только когда в работе нет других задач
+        (в целом или соединения), иначе она никогда не была бы выполнена
+        """
+        if self.jobs_in_flight >= self.max_jobs:
+            return False
+        if self.jobs_in_flight and self.bytes_in_flight + size > self.max_bytes:
+            return False
+        return self._fits_connection(key, size)
+
+    def _fits_connection(self, key: Hashable, size: int) -> bool:
+        """Проверяет лимиты соединения"""
+        usage = self._connections.get(key)
+        if usage is None:
+            return True
+        return usage[1] < self.per_connection_jobs and usage[0] + size <= self.per_connection_bytes
+
+    def _take(self, key: Hashable, size: int):
+        self.bytes_in_flight += size
+        self.jobs_in_flight += 1
+        usage = self._connections.setdefault(key, [0, 0])
+        usage[0] += size
+        usage[1] += 1
+        self.admitted += 1
+
+    def _wake_waiters(self):
+        """
+        Допускает ожидающие задачи в порядке очереди
+
+        Задача, упершаяся в лимит своего соединения, не задерживает задачи других соединений;
+        упершаяся в общий бюджет - останавливает допуск, чтобы крупные задачи не голодали
+        """
+        blocked = set()
+        for waiter in list(self._waiters):
+            if waiter.key in blocked:
+                continue
+            if not self._fits_connection(waiter.key, waiter.size):
+                blocked.add(waiter.key)
+                continue
+            if not self._fits(waiter.key, waiter.size):
+                break
+            self._waiters.remove(waiter)
+            self._take(waiter.key, waiter.size)
+            waiter.future.set_result(None)
+
+    def _remove_waiter(self, waiter: _Waiter):
+        """Убирает задачу из очереди; задачи за ней могут теперь пройти"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        self._wake_waiters()
+
+    def _reject(self):
+        self.rejected += 1
+        raise AdmissionRejected("Сервер перегружен, повторите запрос позже", self.retry_after())
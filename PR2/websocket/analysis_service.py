@@ -1,60 +1,594 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import List
+import contextvars
+import dataclasses
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
+from monitoring.metrics import REGISTRY
+from websocket.engine import DEFAULT_METRICS, MetricsEngine, parse_encoding
+from websocket.file_refs import iter_mapped_text, path_key
+from websocket.incremental import IncrementalAnalyzer
 from websocket.interfaces import AnalysisInterface
 from websocket.models import FileAnalysis
+from websocket.result_cache import AnalysisKey, ContentKey, ResultCache, content_hasher, content_key
+from websocket.scheduler import JobScheduler
+from websocket.shared_buffers import SharedBufferPool, read_shared_text
+
+
+# Задача в потоке пула проверяет флаг остановки между частями такого размера
+STOP_CHECK_SIZE = 1 << 20
+# Флаг остановки задачи в текущем потоке пула (задается _run_stoppable; в процессах - None)
+_stop_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("stop_event", default=None)
+
+
+class AnalysisCancelled(Exception):
+    """Анализ остановлен: его результат больше никому не нужен"""
+
+
+def _check_stopped():
+    stop = _stop_event.get()
+    if stop is not None and stop.is_set():
+        raise AnalysisCancelled("Анализ отменен")
+
+
+def _run_stoppable(stop: threading.Event, function: Callable, *args):
+    """Выполняет задачу в потоке пула с флагом остановки, который проверяют функции анализа"""
+    token = _stop_event.set(stop)
+    try:
+        _check_stopped()
+        return function(*args)
+    finally:
+        _stop_event.reset(token)
+
+
+def analyze_content(filename: str, content: str, metrics: Tuple[str, ...] = DEFAULT_METRICS,
+                    byte_count: Optional[int] = None) -> FileAnalysis:
+    """
+    Подсчитывает запрошенные метрики содержимого файла за один проход
+
+    Функция объявлена на уровне модуля, чтобы ее можно было передать в процесс-воркер
+
+    Args:
+        filename: Имя файла
+        content: Содержимое файла
+        metrics: Метрики в каноническом порядке (см. engine.parse_metrics)
+        byte_count: Известный размер исходных байт; иначе размер считается в UTF-8
+
+    Returns:
+        Объект с результатами анализа
+    """
+    engine = MetricsEngine(metrics)
+    if _stop_event.get() is None or len(content) <= STOP_CHECK_SIZE:
+        engine.feed(content)
+    else:
+        for start in range(0, len(content), STOP_CHECK_SIZE):
+            _check_stopped()
+            engine.feed(content[start:start + STOP_CHECK_SIZE])
+    values = engine.result()
+    if byte_count is not None and "bytes" in values:
+        values["bytes"] = byte_count
+    return FileAnalysis.from_metrics(filename, values)
+
+
+def analyze_bytes(filename: str, payload: Union[bytes, memoryview], encoding: str = "utf-8",
+                  metrics: Tuple[str, ...] = DEFAULT_METRICS) -> FileAnalysis:
+    """
+    Декодирует и анализирует содержимое файла, полученное в байтах
+
+    Args:
+        filename: Имя файла
+        payload: Содержимое файла в байтах
+        encoding: Кодировка содержимого
+        metrics: Метрики в каноническом порядке
+
+    Returns:
+        Объект с результатами анализа
+    """
+    return analyze_content(filename, str(payload, encoding), metrics, len(payload))
+
+
+def analyze_shared(filename: str, name: str, length: int, encoding: str = "utf-8",
+                   metrics: Tuple[str, ...] = DEFAULT_METRICS, errors: str = "strict") -> FileAnalysis:
+    """
+    Анализирует содержимое, переданное через сегмент разделяемой памяти
+
+    Args:
+        filename: Имя файла
+        name: Имя сегмента разделяемой памяти
+        length: Длина данных в байтах
+        encoding: Кодировка данных
+        metrics: Метрики в каноническом порядке
+        errors: Обработка ошибок декодирования
+
+    Returns:
+        Объект с результатами анализа
+    """
+    return analyze_content(filename, read_shared_text(name, length, encoding, errors), metrics, length)
+
+
+def analyze_path(filename: str, path: str, encoding: str = "utf-8",
+                 metrics: Tuple[str, ...] = DEFAULT_METRICS,
+                 identity: Optional[Tuple[int, int]] = None) -> FileAnalysis:
+    """
+    Анализирует файл на диске, отображенный в память, не загружая его целиком
+
+    Args:
+        filename: Имя файла в результате
+        path: Абсолютный путь файла
+        encoding: Кодировка содержимого
+        metrics: Метрики в каноническом порядке
+        identity: Устройство и inode проверенного файла (см. iter_mapped_text)
+
+    Returns:
+        Объект с результатами анализа
+    """
+    engine = MetricsEngine(metrics)
+    for text in iter_mapped_text(path, encoding, identity):
+        _check_stopped()
+        engine.feed(text)
+    values = engine.result()
+    if "bytes" in values:
+        values["bytes"] = os.path.getsize(path)
+    return FileAnalysis.from_metrics(filename, values)
+
+
+def _warm_up() -> int:
+    """Пустая задача для запуска процесса-воркера заранее"""
+    return os.getpid()
+
+
+# Метрики сервиса; source - откуда получено содержимое: content (JSON), payload (бинарное
+# сообщение), path (файл сервера), stream (тело HTTP запроса), upload (загрузка по частям,
+# учитывается обработчиком)
+FILES_ANALYZED = REGISTRY.counter("analysis_files_total", "Проанализированные файлы", ["source"])
+BYTES_ANALYZED = REGISTRY.counter(
+    "analysis_bytes_total", "Объем проанализированного содержимого: байт, для текста - символов", ["source"]
+)
+ANALYSIS_LATENCY = REGISTRY.histogram(
+    "analysis_duration_seconds", "Время анализа файла, включая ожидание в очереди исполнителя", ["source"]
+)
+# Живые сервисы процесса: индикаторы исполнителя суммируются по ним при выдаче метрик
+_services: "weakref.WeakSet[FileAnalysisService]" = weakref.WeakSet()
+REGISTRY.gauge("analysis_executor_jobs", "Задачи анализа, принятые планировщиком и еще не завершенные") \
+    .set_function(lambda: sum(service.executor_jobs for service in list(_services)))
+REGISTRY.gauge("analysis_executor_queue_depth", "Задачи, ожидающие свободного воркера в планировщике") \
+    .set_function(lambda: sum(service.executor_queue_depth for service in list(_services)))
+
+
+class StreamAnalysis:
+    """
+    Анализ содержимого, поступающего по частям из другого потока (например, тела HTTP запроса)
+
+    Каждая часть декодируется и учитывается задачей пула исполнителя, поставленной через
+    планировщик сервиса, поэтому потоковые загрузки чередуются с задачами остальных клиентов.
+    Вызывающий передает следующую часть после обработки предыдущей, и в памяти находятся
+    только части, еще не переданные анализатору. Методы - корутины event loop сервиса.
+    """
+
+    def __init__(self, service: "FileAnalysisService", filename: str, encoding: str = "utf-8",
+                 metrics: Tuple[str, ...] = DEFAULT_METRICS):
+        """
+        Инициализирует потоковый анализ
+
+        Args:
+            service: Сервис анализа, в пуле которого обрабатываются части
+            filename: Имя файла
+            encoding: Кодировка содержимого
+            metrics: Метрики в каноническом порядке
+        """
+        self.service = service
+        self.metrics = metrics
+        self.analyzer = IncrementalAnalyzer(filename, encoding, metrics)
+        # Ключ кэша считается по ходу анализа: содержимое целиком нигде не хранится
+        self.hasher = content_hasher(encoding)
+        self.size = 0
+        self.started = time.perf_counter()
+
+    def _feed(self, chunk: bytes):
+        """Учитывает часть (выполняется в потоке пула)"""
+        self.analyzer.feed_bytes(chunk)
+        self.hasher.update(chunk)
+
+    async def feed(self, chunk: bytes):
+        """
+        Анализирует очередную часть содержимого
+
+        Args:
+            chunk: Часть содержимого в байтах
+
+        Raises:
+            UnicodeDecodeError: Если часть не декодируется в кодировке содержимого
+        """
+        self.size += len(chunk)
+        # Состояние анализатора не передается в процесс-воркер: для пула процессов части
+        # обрабатываются в пуле потоков сервиса, но тоже через планировщик
+        await self.service._execute(len(chunk), self._feed, chunk, local=True)
+
+    async def finish(self) -> FileAnalysis:
+        """
+        Завершает анализ и сохраняет результат в кэше по содержимому
+
+        Returns:
+            Объект с результатами анализа
+
+        Raises:
+            UnicodeDecodeError: Если содержимое оборвано посреди символа
+        """
+        analysis = self.analyzer.result()
+        if self.service.result_cache is not None:
+            self.service.result_cache.put((self.size, self.hasher.digest(), self.metrics), analysis)
+        ANALYSIS_LATENCY.labels("stream").observe(time.perf_counter() - self.started)
+        FILES_ANALYZED.labels("stream").inc()
+        BYTES_ANALYZED.labels("stream").inc(self.size)
+        return analysis
 
 
 class FileAnalysisService(AnalysisInterface):
     """Сервис для анализа файлов"""
+
+    BACKENDS = ("thread", "process")
+    TRANSPORTS = ("pickle", "shared_memory")
+    # Хэш крупного содержимого считается вне event loop (hashlib отпускает GIL)
+    HASH_OFFLOAD_THRESHOLD = 1 << 20
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, backend: str = "thread",
+                 transport: str = "pickle", shared_memory_threshold: int = 1 << 16,
+                 cache_entries: int = 4096, cache_bytes: int = 16 << 20, coalesce: bool = True,
+                 aging_rate: float = 16 << 20):
         """
         Инициализирует сервис анализа файлов
         
         Args:
-            max_workers: Максимальное количество рабочих потоков
+            max_workers: Максимальное количество рабочих потоков или процессов
+            backend: Исполнитель анализа: "thread" - пул потоков, "process" - пул процессов
+                     (обходит GIL, воркеры запускаются сразу при создании сервиса)
+            transport: Передача содержимого в процессы: "pickle" или "shared_memory"
+                       (только для backend="process")
+            shared_memory_threshold: Минимальный размер содержимого в байтах для передачи
+                                     через разделяемую память; меньшее содержимое передается через pickle
+            cache_entries: Максимальное число результатов в кэше по содержимому (0 - кэш отключен)
+            cache_bytes: Максимальный объем кэша результатов в байтах
+            coalesce: Объединять одновременные запросы анализа одинакового содержимого в одну задачу
+            aging_rate: Скорость старения крупных задач в планировщике в байтах в секунду
+                        (см. JobScheduler)
         """
-        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Неизвестный тип исполнителя: {backend}")
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f"Неизвестный способ передачи данных: {transport}")
+        if transport == "shared_memory" and backend != "process":
+            raise ValueError("Передача через разделяемую память доступна только для пула процессов")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.transport = transport
+        self.shared_memory_threshold = shared_memory_threshold
+        self.buffer_pool = SharedBufferPool() if transport == "shared_memory" else None
+        self.result_cache = ResultCache(cache_entries, cache_bytes) if cache_entries > 0 else None
+        self.coalesce = coalesce
+        # Выполняющиеся задачи анализа по ключу содержимого (общие для всех соединений)
+        self._inflight: Dict[AnalysisKey, list] = {}
+        self.coalesced = 0
+        # Принятые и незавершенные задачи; уменьшается из потоков пула, поэтому под блокировкой
+        self.executor_jobs = 0
+        self._jobs_lock = threading.Lock()
+        self.executor: Executor = self._create_executor()
+        # Порядок запуска задач определяет планировщик: в пуле не больше max_workers задач
+        self.scheduler = JobScheduler(self.executor, max_workers, aging_rate)
+        # Задачи с состоянием в памяти сервиса (части потокового анализа) не передаются в процесс:
+        # для пула процессов они выполняются в своем пуле потоков, но через тот же планировщик
+        self.local_executor: Executor = self.executor if backend == "thread" else ThreadPoolExecutor(max_workers)
+        if backend == "process":
+            self._warm_up()
+        _services.add(self)
+
+    @property
+    def executor_queue_depth(self) -> int:
+        """Число задач, ожидающих свободного воркера"""
+        return self.scheduler.pending
+
+    def _create_executor(self) -> Executor:
+        """Создает пул для выбранного типа исполнителя"""
+        if self.backend == "process":
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _warm_up(self):
+        """Запускает все процессы пула до поступления первых запросов"""
+        futures = [self.executor.submit(_warm_up) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
     
-    async def analyze_file(self, filename: str, content: str) -> FileAnalysis:
+    async def analyze_file(self, filename: str, content: str,
+                           metrics: Tuple[str, ...] = DEFAULT_METRICS) -> FileAnalysis:
         """
-        Анализирует содержимое файла в отдельном потоке
+        Анализирует содержимое файла в пуле исполнителя
         
         Args:
             filename: Имя файла
             content: Содержимое файла
+            metrics: Метрики в каноническом порядке (см. engine.parse_metrics)
             
         Returns:
             Объект с результатами анализа
         """
-        def _analyze():
-            lines = content.split('\n')
-            words = content.split()
-            return FileAnalysis(
-                filename=filename,
-                word_count=len(words),
-                char_count=len(content),
-                line_count=len(lines)
-            )
-        
-        return await asyncio.get_event_loop().run_in_executor(
-            self.thread_pool, _analyze
-        )
+        return await self._measured("content", len(content), self._analyze(filename, content, "utf-8", metrics))
+
+    async def analyze_payload(self, filename: str, payload: Union[bytes, memoryview],
+                              encoding: str = "utf-8", metrics: Tuple[str, ...] = DEFAULT_METRICS) -> FileAnalysis:
+        """
+        Анализирует содержимое файла, полученное в байтах (например, из бинарного сообщения)
+
+        Содержимое декодируется в пуле исполнителя, а не в event loop
+
+        Args:
+            filename: Имя файла
+            payload: Содержимое файла в байтах
+            encoding: Кодировка содержимого
+            metrics: Метрики в каноническом порядке
+
+        Returns:
+            Объект с результатами анализа
+
+        Raises:
+            LookupError: Если кодировка неизвестна или не является текстовой
+        """
+        parse_encoding(encoding)
+        return await self._measured("payload", len(payload), self._analyze(filename, payload, encoding, metrics))
+
+    async def analyze_path(self, filename: str, path: str, encoding: str = "utf-8",
+                           metrics: Tuple[str, ...] = DEFAULT_METRICS,
+                           stat: Optional[os.stat_result] = None) -> FileAnalysis:
+        """
+        Анализирует файл на диске сервера без передачи содержимого
+
+        Воркер отображает файл в память и читает его блоками; в процесс-воркер передается только путь.
+        Результат кэшируется по пути, inode и времени изменения файла.
+
+        Args:
+            filename: Имя файла в результате
+            path: Абсолютный путь файла (проверенный вызывающим кодом)
+            encoding: Кодировка содержимого
+            metrics: Метрики в каноническом порядке
+            stat: stat файла на момент проверки пути (см. FileRoot.resolve); воркер
+                  анализирует файл, только если открыл тот же файл
+
+        Returns:
+            Объект с результатами анализа
+
+        Raises:
+            LookupError: Если кодировка неизвестна или не является текстовой
+        """
+        parse_encoding(encoding)
+        if stat is None:
+            stat = os.stat(path)
+
+        def run() -> Awaitable[FileAnalysis]:
+            return self._execute(size, analyze_path, filename, path, encoding, metrics, (stat.st_dev, stat.st_ino))
+
+        key = path_key(path, encoding, stat) + (metrics,)
+        size = key[0]
+        if self.result_cache is None and not self.coalesce:
+            return await self._measured("path", size, run())
+        return await self._measured("path", key[0], self._cached(key, filename, run))
+
+    def open_stream(self, filename: str, encoding: str = "utf-8",
+                    metrics: Tuple[str, ...] = DEFAULT_METRICS) -> StreamAnalysis:
+        """
+        Начинает анализ содержимого, поступающего по частям (см. StreamAnalysis)
+
+        Args:
+            filename: Имя файла
+            encoding: Кодировка содержимого
+            metrics: Метрики в каноническом порядке
+
+        Returns:
+            Потоковый анализ; части передаются в feed, результат возвращает finish
+
+        Raises:
+            LookupError: Если кодировка неизвестна или не является текстовой
+        """
+        return StreamAnalysis(self, filename, encoding, metrics)
+
+    async def _measured(self, source: str, size: int, analysis: Awaitable[FileAnalysis]) -> FileAnalysis:
+        """Выполняет анализ и обновляет метрики файлов, объема и задержки"""
+        started = time.perf_counter()
+        result = await analysis
+        ANALYSIS_LATENCY.labels(source).observe(time.perf_counter() - started)
+        FILES_ANALYZED.labels(source).inc()
+        BYTES_ANALYZED.labels(source).inc(size)
+        return result
+
+    async def _execute(self, size: int, function: Callable, *args, local: bool = False):
+        """
+        Выполняет задачу в пуле исполнителя и ждет результата
+
+        Отмена ожидания убирает задачу из очереди планировщика, а задачу, уже выполняющуюся
+        в пуле потоков, останавливает флагом остановки (процесс-воркер задачу дорабатывает)
+
+        Args:
+            size: Объем содержимого задачи
+            function: Функция задачи
+            *args: Аргументы функции
+            local: Задача использует состояние процесса сервиса и выполняется в пуле потоков
+                   local_executor при любом исполнителе
+        """
+        if self.backend != "thread" and not local:
+            return await asyncio.wrap_future(self._submit(size, function, *args))
+        stop = threading.Event()
+        try:
+            return await asyncio.wrap_future(self._submit(size, _run_stoppable, stop, function, *args,
+                                                          executor=self.local_executor))
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+
+    def _submit(self, size: int, function: Callable, *args, executor: Optional[Executor] = None) -> Future:
+        """Передает задачу планировщику пула исполнителя и учитывает ее до завершения"""
+        future = self.scheduler.submit(size, function, *args, executor=executor)
+        with self._jobs_lock:
+            self.executor_jobs += 1
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, _: Future):
+        with self._jobs_lock:
+            self.executor_jobs -= 1
+
+    async def _analyze(self, filename: str, content: Union[str, bytes, memoryview], encoding: str,
+                       metrics: Tuple[str, ...]) -> FileAnalysis:
+        """Анализирует содержимое с учетом кэша результатов и одинаковых одновременных запросов"""
+        if self.result_cache is None and not self.coalesce:
+            return await self._run_analysis(filename, content, encoding, metrics)
+
+        key = await self._content_key(content, encoding) + (metrics,)
+        return await self._cached(key, filename, lambda: self._run_analysis(filename, content, encoding, metrics))
+
+    async def _cached(self, key: AnalysisKey, filename: str,
+                      run: Callable[[], Awaitable[FileAnalysis]]) -> FileAnalysis:
+        """
+        Возвращает результат из кэша, ждет такой же выполняющийся анализ или запускает новый
+
+        Args:
+            key: Ключ результата
+            filename: Имя файла в результате
+            run: Запускает анализ, если результата еще нет
+
+        Returns:
+            Объект с результатами анализа
+        """
+        if self.result_cache is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                # Повторно загруженный файл получает готовый результат под новым именем
+                return dataclasses.replace(cached, filename=filename)
+
+        if not self.coalesce:
+            return await self._run_and_cache(key, run)
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            # [задача анализа, число ожидающих ее запросов]
+            entry = [asyncio.ensure_future(self._run_and_cache(key, run)), 0]
+            self._inflight[key] = entry
+            entry[0].add_done_callback(lambda _: self._forget_inflight(key, entry))
+        else:
+            # Такое же содержимое уже анализируется: ждем общий результат
+            self.coalesced += 1
+
+        # shield: отмена одного ожидающего не прерывает задачу, нужную остальным;
+        # когда отменен последний ожидающий, анализ отменяется
+        entry[1] += 1
+        try:
+            analysis = await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if entry[1] == 1:
+                entry[0].cancel()
+                # Новый запрос того же содержимого не должен присоединиться к отмененной задаче
+                self._forget_inflight(key, entry)
+            raise
+        finally:
+            entry[1] -= 1
+        if analysis.filename != filename:
+            analysis = dataclasses.replace(analysis, filename=filename)
+        return analysis
+
+    def _forget_inflight(self, key: AnalysisKey, entry: list):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _content_key(self, content: Union[str, bytes, memoryview], encoding: str) -> ContentKey:
+        """Вычисляет ключ содержимого, для крупного содержимого - вне event loop"""
+        if len(content) >= self.HASH_OFFLOAD_THRESHOLD:
+            return await asyncio.get_event_loop().run_in_executor(None, content_key, content, encoding)
+        return content_key(content, encoding)
+
+    async def _run_and_cache(self, key: AnalysisKey, run: Callable[[], Awaitable[FileAnalysis]]) -> FileAnalysis:
+        """Выполняет анализ и сохраняет результат в кэше"""
+        analysis = await run()
+        if self.result_cache is not None:
+            self.result_cache.put(key, analysis)
+        return analysis
+
+    async def _run_analysis(self, filename: str, content: Union[str, bytes, memoryview],
+                            encoding: str = "utf-8", metrics: Tuple[str, ...] = DEFAULT_METRICS) -> FileAnalysis:
+        """Выполняет анализ в пуле исполнителя"""
+        is_text = isinstance(content, str)
+        size = len(content)
+        payload = content
+        if self.buffer_pool is not None and is_text and size * 4 >= self.shared_memory_threshold:
+            # Порог задан в байтах: текст, который в UTF-8 может до него дотянуть, кодируется заранее;
+            # одиночные суррогаты текста (допустимы в JSON) передаются как есть
+            payload = content.encode("utf-8", "surrogatepass")
+        if self.buffer_pool is None or len(payload) < self.shared_memory_threshold:
+            if is_text:
+                return await self._execute(size, analyze_content, filename, content, metrics)
+            if self.backend == "process" and isinstance(content, memoryview):
+                # memoryview не передается через pickle
+                content = content.tobytes()
+            return await self._execute(size, analyze_bytes, filename, content, encoding, metrics)
+
+        # Воркер получает только имя сегмента и длину и декодирует текст прямо из него
+        errors = "strict"
+        if is_text:
+            encoding, errors = "utf-8", "surrogatepass"
+        length = len(payload)
+        segment = self.buffer_pool.write(payload)
+        del content, payload
+        future = self._submit(length, analyze_shared, filename, segment.name, length, encoding, metrics, errors)
+        # Сегмент возвращается в пул только после того, как воркер перестал его читать,
+        # даже если ожидающая корутина была отменена раньше
+        future.add_done_callback(lambda _: self.buffer_pool.release(segment))
+        return await asyncio.wrap_future(future)
     
-    async def analyze_files(self, files: List[dict]) -> List[FileAnalysis]:
+    async def analyze_files(self, files: List[dict],
+                            metrics: Tuple[str, ...] = DEFAULT_METRICS) -> List[FileAnalysis]:
         """
         Параллельно анализирует несколько файлов
         
         Args:
             files: Список словарей с данными файлов {'filename': '...', 'content': '...'}
+            metrics: Метрики в каноническом порядке
             
         Returns:
             Список объектов с результатами анализа
         """
         tasks = []
         for file_data in files:
-            task = self.analyze_file(file_data['filename'], file_data['content'])
+            task = self.analyze_file(file_data['filename'], file_data['content'], metrics)
             tasks.append(task)
-        return await asyncio.gather(*tasks) 
\ No newline at end of file
+        return await asyncio.gather(*tasks)
+
+    def cache_stats(self) -> dict:
+        """Счетчики попаданий и промахов кэша результатов и объединенных запросов"""
+        stats = self.result_cache.stats() if self.result_cache is not None else {}
+        stats['coalesced'] = self.coalesced
+        stats['inflight'] = len(self._inflight)
+        return stats
+
+    async def close(self):
+        """
+        Останавливает сервис из event loop
+
+        Задачи в очереди отменяются в event loop, где работает планировщик, а ожидание
+        выполняющихся задач пула идет в отдельном потоке и не блокирует event loop
+        """
+        self.scheduler.cancel_pending()
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+    def shutdown(self):
+        """
+        Останавливает пул исполнителя, отменяя еще не начатые задачи пула
+
+        Очередь планировщика принадлежит event loop, поэтому здесь не трогается: из
+        работающего event loop сервис останавливается через close(), а прямой
+        синхронный вызов допустим только после остановки event loop
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.local_executor is not self.executor:
+            self.local_executor.shutdown(wait=True, cancel_futures=True)
+        if self.buffer_pool is not None:
+            self.buffer_pool.close()
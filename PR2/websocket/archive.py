@@ -0,0 +1,706 @@
+import asyncio
+import bz2
+import functools
+import itertools
+import lzma
+import struct
+import tarfile
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from typing import Awaitable, Callable, Hashable, Iterator, List, Optional, Tuple, Union
+
+from websocket.admission import AdmissionController, AdmissionRejected
+from websocket.analysis_service import AnalysisCancelled, FileAnalysisService
+from websocket.engine import DEFAULT_METRICS, parse_encoding
+from websocket.models import FileAnalysis
+from websocket.scheduler import job_owner
+
+# Файл архива не больше блока анализируется одной задачей, крупный - по блокам такого размера
+MEMBER_BLOCK_SIZE = 256 << 10
+# Размер блока сжатых данных, читаемого за один раз
+ZIP_READ_SIZE = 64 << 10
+
+# Сигнатуры сжатия tar (как их проверяет tarfile): распаковщик выбирается по первым байтам
+GZIP_SIGNATURE = b"\x1f\x8b\x08"
+BZIP2_SIGNATURE = b"BZh"
+BZIP2_BLOCK_SIGNATURE = b"1AY&SY"
+XZ_SIGNATURE = b"\xfd7zXZ\x00"
+
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+ZIP_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# Центральный каталог и конец архива: файлов дальше нет
+ZIP_END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06", b"PK\x06\x07")
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_FLAG_DESCRIPTOR = 0x08
+ZIP_FLAG_UTF8 = 0x800
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_EXTRA = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+
+
+class ArchiveError(ValueError):
+    """Архив поврежден или использует неподдерживаемые возможности формата"""
+
+
+class ArchiveAborted(Exception):
+    """Загрузка архива прервана: результаты больше не нужны"""
+
+
+class ChunkPipe:
+    """
+    Байтовый канал между event loop (запись частей) и потоком распаковки (чтение)
+
+    Объем непрочитанных частей ограничен: запись ждет, пока поток распаковки не освободит
+    место, поэтому быстрый клиент упирается в TCP-окно, а не в память сервера.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, capacity: int):
+        """
+        Инициализирует канал
+
+        Args:
+            loop: Event loop, из которого выполняется запись
+            capacity: Объем непрочитанных частей, после которого запись ждет
+        """
+        self.loop = loop
+        self.capacity = capacity
+        self._chunks: deque = deque()
+        self._size = 0
+        self._closed = False
+        self._aborted = False
+        self._reader_done = False
+        self._condition = threading.Condition()
+        self._space = asyncio.Event()
+
+    async def put(self, data: Union[bytes, memoryview]):
+        """Добавляет часть, дождавшись свободного места; после остановки чтения часть отбрасывается"""
+        while True:
+            with self._condition:
+                if self._aborted or self._reader_done:
+                    return
+                if self._size < self.capacity:
+                    self._chunks.append(data)
+                    self._size += len(data)
+                    self._condition.notify()
+                    return
+                self._space.clear()
+            await self._space.wait()
+
+    def close(self):
+        """Завершает запись: чтение после оставшихся частей вернет конец данных"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def abort(self):
+        """Прерывает канал: чтение завершается исключением ArchiveAborted"""
+        with self._condition:
+            self._aborted = True
+            self._chunks.clear()
+            self._condition.notify()
+        self._space.set()
+
+    def finish_reading(self):
+        """Сообщает, что поток распаковки больше не читает (архив закончился или поврежден)"""
+        with self._condition:
+            self._reader_done = True
+            self._chunks.clear()
+        self._wake_writer()
+
+    def read(self, size: int) -> bytes:
+        """
+        Читает до size байт (вызывается из потока распаковки)
+
+        Returns:
+            Данные; пустые - запись завершена и все части прочитаны
+
+        Raises:
+            ArchiveAborted: Если канал прерван
+        """
+        with self._condition:
+            while not self._chunks:
+                if self._aborted:
+                    raise ArchiveAborted()
+                if self._closed:
+                    return b''
+                self._condition.wait()
+            if self._aborted:
+                raise ArchiveAborted()
+            was_full = self._size >= self.capacity
+            chunk = self._chunks[0]
+            if len(chunk) <= size:
+                self._chunks.popleft()
+            else:
+                self._chunks[0] = chunk[size:]
+                chunk = chunk[:size]
+            data = bytes(chunk)
+            self._size -= len(data)
+        if was_full:
+            self._wake_writer()
+        return data
+
+    def _wake_writer(self):
+        try:
+            self.loop.call_soon_threadsafe(self._space.set)
+        except RuntimeError:
+            # Event loop уже закрыт: писать некому
+            pass
+
+
+class _SizeLimit:
+    """Общий для архива учет распакованных байт"""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.total = 0
+
+    def add(self, size: int):
+        self.total += size
+        if self.limit is not None and self.total > self.limit:
+            raise ArchiveError(f"Распакованное содержимое архива больше {self.limit} байт")
+
+
+class _Source:
+    """Чтение из канала с возвратом лишних байт (нужно для zip с дескрипторами данных)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._pushback = b''
+
+    def read(self, size: int) -> bytes:
+        if self._pushback:
+            data, self._pushback = self._pushback[:size], self._pushback[size:]
+            return data
+        return self.stream.read(size)
+
+    def unread(self, data: bytes):
+        self._pushback = data + self._pushback
+
+    def read_exact(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                raise ArchiveError("Архив оборван")
+            data += chunk
+        return data
+
+    def peek(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        self.unread(data)
+        return data
+
+
+class _StoredReader:
+    """Несжатый файл zip известного размера"""
+
+    def __init__(self, source: _Source, size: int, limit: _SizeLimit):
+        self.source = source
+        self.remaining = size
+        self.limit = limit
+
+    def read(self, size: int) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        data = self.source.read(min(size, self.remaining))
+        if not data:
+            raise ArchiveError("Архив оборван")
+        self.remaining -= len(data)
+        self.limit.add(len(data))
+        return data
+
+
+class _DeflateReader:
+    """
+    Файл zip, сжатый deflate; конец данных определяет сам поток deflate,
+    поэтому размер может быть неизвестен (дескриптор данных после файла)
+    """
+
+    def __init__(self, source: _Source, compressed_size: Optional[int], limit: _SizeLimit):
+        self.source = source
+        self.remaining = compressed_size
+        self.limit = limit
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def read(self, size: int) -> bytes:
+        decompressor = self._decompressor
+        while not decompressor.eof:
+            data = decompressor.unconsumed_tail
+            if not data:
+                limit = ZIP_READ_SIZE if self.remaining is None else min(ZIP_READ_SIZE, self.remaining)
+                data = self.source.read(limit) if limit > 0 else b''
+                if not data:
+                    raise ArchiveError("Архив оборван")
+                if self.remaining is not None:
+                    self.remaining -= len(data)
+            # Объем распакованных данных за один вызов ограничен: zip-бомба не займет память
+            output = decompressor.decompress(data, size)
+            if decompressor.eof and decompressor.unused_data:
+                self.source.unread(decompressor.unused_data)
+            if output:
+                self.limit.add(len(output))
+                return output
+        return b''
+
+
+class _TarStream:
+    """
+    Поток tar, в том числе сжатый gzip, bzip2 или xz
+
+    tarfile в потоковом режиме распаковывает без ограничения объема и накапливает результат,
+    поэтому сжатие снимается здесь: каждый вызов распаковщика возвращает не больше
+    запрошенного, а общий объем распакованного ограничен.
+    """
+
+    def __init__(self, source: _Source, compression: str, limit: _SizeLimit):
+        """
+        Инициализирует распаковку
+
+        Args:
+            source: Источник сжатых данных
+            compression: 'gz', 'bz2', 'xz' или None - без сжатия
+            limit: Учет распакованных байт архива
+        """
+        self.source = source
+        self.limit = limit
+        self._zlib = compression == "gz"
+        if compression is None:
+            self._decompressor = None
+        elif self._zlib:
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif compression == "bz2":
+            self._decompressor = bz2.BZ2Decompressor()
+        else:
+            self._decompressor = lzma.LZMADecompressor()
+
+    def read(self, size: int) -> bytes:
+        decompressor = self._decompressor
+        if decompressor is None:
+            data = self.source.read(size)
+            self.limit.add(len(data))
+            return data
+        while not decompressor.eof:
+            if self._zlib:
+                data = decompressor.unconsumed_tail or self._read_input()
+            else:
+                # Распаковщики bz2 и xz сами хранят вход, не обработанный из-за ограничения выхода
+                data = self._read_input() if decompressor.needs_input else b''
+            output = decompressor.decompress(data, size)
+            if output:
+                self.limit.add(len(output))
+                return output
+        # Данные после конца сжатого потока (например, склеенные потоки gzip) не читаются
+        return b''
+
+    def _read_input(self) -> bytes:
+        data = self.source.read(ZIP_READ_SIZE)
+        if not data:
+            raise ArchiveError("Архив оборван")
+        return data
+
+
+def _drain(reader, size: int = MEMBER_BLOCK_SIZE):
+    while reader.read(size):
+        pass
+
+
+def _zip64_sizes(extra: bytes, compressed_size: int, size: int) -> Tuple[int, int]:
+    """Размеры файла из поля ZIP64 дополнительных данных"""
+    offset = 0
+    while offset + 4 <= len(extra):
+        tag, length = struct.unpack_from("<HH", extra, offset)
+        if tag == ZIP64_EXTRA:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, offset + 4))
+            if size == ZIP64_LIMIT:
+                size = next(values)
+            if compressed_size == ZIP64_LIMIT:
+                compressed_size = next(values)
+            return compressed_size, size
+        offset += 4 + length
+    return compressed_size, size
+
+
+def iter_zip_members(stream, max_size: Optional[int] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Последовательно читает файлы zip по локальным заголовкам, без центрального каталога
+
+    Args:
+        stream: Источник с методом read(size)
+        max_size: Предельный объем распакованного содержимого; None - без ограничения
+
+    Yields:
+        Пары (имя файла, источник содержимого с методом read(size)); содержимое нужно
+        прочитать до перехода к следующему файлу (непрочитанное пропускается)
+
+    Raises:
+        ArchiveError: Если архив поврежден или файл зашифрован или сжат не deflate
+    """
+    source = stream if isinstance(stream, _Source) else _Source(stream)
+    limit = _SizeLimit(max_size)
+    while True:
+        signature = source.peek(4)
+        if signature in ZIP_END_SIGNATURES or not signature:
+            _drain(source)
+            return
+        if signature != ZIP_LOCAL_SIGNATURE:
+            raise ArchiveError("Неверный заголовок файла zip")
+        (_, _, flags, method, _, _, _, compressed_size, size,
+         name_length, extra_length) = ZIP_LOCAL_HEADER.unpack(source.read_exact(ZIP_LOCAL_HEADER.size))
+        raw_name = source.read_exact(name_length)
+        name = raw_name.decode("utf-8" if flags & ZIP_FLAG_UTF8 else "cp437", "replace")
+        extra = source.read_exact(extra_length)
+        zip64 = ZIP64_LIMIT in (compressed_size, size)
+        if zip64:
+            compressed_size, size = _zip64_sizes(extra, compressed_size, size)
+        if flags & ZIP_FLAG_ENCRYPTED:
+            raise ArchiveError(f"Зашифрованный файл в zip: {name}")
+        has_descriptor = bool(flags & ZIP_FLAG_DESCRIPTOR)
+        if method == ZIP_STORED:
+            if has_descriptor and compressed_size == 0:
+                # Без размера конец несжатых данных найти нельзя
+                raise ArchiveError(f"Несжатый файл zip без размера: {name}")
+            reader = _StoredReader(source, compressed_size, limit)
+        elif method == ZIP_DEFLATED:
+            reader = _DeflateReader(source, None if has_descriptor else compressed_size, limit)
+        else:
+            raise ArchiveError(f"Неподдерживаемый метод сжатия zip ({method}): {name}")
+
+        if not name.endswith("/"):
+            yield name, reader
+        _drain(reader)
+        if has_descriptor:
+            # Необязательная сигнатура, CRC-32 и размеры (по 8 байт в ZIP64)
+            descriptor_size = 20 if zip64 else 12
+            if source.peek(4) == ZIP_DESCRIPTOR_SIGNATURE:
+                descriptor_size += 4
+            source.read_exact(descriptor_size)
+
+
+def iter_tar_members(stream, max_size: Optional[int] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Последовательно читает обычные файлы tar, в том числе сжатого gzip, bzip2 или xz
+
+    Сжатие определяется по первым байтам и снимается _TarStream: tarfile получает уже
+    распакованный поток (режим "r|")
+
+    Args:
+        stream: Источник с методом read(size)
+        max_size: Предельный объем распакованного потока tar; None - без ограничения
+
+    Yields:
+        Пары (имя файла, источник содержимого с методом read(size))
+    """
+    source = stream if isinstance(stream, _Source) else _Source(stream)
+    head = source.peek(10)
+    compression = None
+    if head.startswith(GZIP_SIGNATURE):
+        compression = "gz"
+    elif head.startswith(BZIP2_SIGNATURE) and head[4:10] == BZIP2_BLOCK_SIGNATURE:
+        compression = "bz2"
+    elif head.startswith(XZ_SIGNATURE):
+        compression = "xz"
+    tar_stream = _TarStream(source, compression, _SizeLimit(max_size))
+    with tarfile.open(fileobj=tar_stream, mode="r|") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+
+def iter_archive_members(stream, max_size: Optional[int] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Последовательно читает файлы архива zip или tar(.gz, .bz2, .xz) по мере поступления данных
+
+    Формат определяется по первым байтам. Архив не буферизуется: в памяти только текущие
+    блоки сжатых и распакованных данных, а распаковщики возвращают не больше запрошенного,
+    поэтому архив-бомба не занимает память.
+
+    Args:
+        stream: Источник с методом read(size); пустой результат - конец данных
+        max_size: Предельный объем распакованного содержимого; None - без ограничения
+
+    Yields:
+        Пары (имя файла, источник содержимого); каталоги и ссылки пропускаются
+
+    Raises:
+        ArchiveError: Если архив поврежден или формат не поддерживается
+    """
+    source = _Source(stream)
+    if source.peek(4) in (ZIP_LOCAL_SIGNATURE, b"PK\x05\x06"):
+        yield from iter_zip_members(source, max_size)
+        return
+    try:
+        yield from iter_tar_members(source, max_size)
+    except tarfile.ReadError as e:
+        raise ArchiveError(f"Неизвестный формат архива: {e}") from None
+
+
+def _iter_blocks(reader, size: int) -> Iterator[bytes]:
+    """Выдает содержимое файла блоками по size байт (последний короче)"""
+    while True:
+        block = bytearray()
+        while len(block) < size:
+            data = reader.read(size - len(block))
+            if not data:
+                break
+            block += data
+        if block:
+            yield bytes(block)
+        if len(block) < size:
+            return
+
+
+async def _failed(error: Exception):
+    raise error
+
+
+class ArchiveAnalysis:
+    """
+    Анализ файлов архива, загружаемого по частям
+
+    Части архива передаются через ChunkPipe потоку распаковки, который читает файлы
+    архива по мере поступления данных. Файл не больше блока сразу передается сервису
+    анализа отдельной задачей, и такие задачи выполняются в пуле параллельно с распаковкой
+    следующих файлов. Крупный файл анализируется по блокам через StreamAnalysis по мере
+    распаковки. Каждая задача (файл или блок) допускается AdmissionController с лимитами
+    соединения, загружающего архив: пока задача ждет допуска, распаковка стоит, а прием
+    частей упирается в заполненный буфер. Ни архив, ни его файлы целиком в памяти не
+    хранятся. Готовые результаты забираются из event loop через ready и results.
+    """
+
+    def __init__(self, service: FileAnalysisService, filename: str, encoding: str = "utf-8",
+                 metrics: Tuple[str, ...] = DEFAULT_METRICS, admission: Optional[AdmissionController] = None,
+                 key: Hashable = None, threads: Optional[threading.Semaphore] = None,
+                 max_members: int = 10000, max_size: int = 1 << 30, buffer_size: int = 2 << 20):
+        """
+        Инициализирует анализ архива и запускает поток распаковки (вызывается из event loop)
+
+        Args:
+            service: Сервис анализа
+            filename: Имя архива
+            encoding: Кодировка файлов архива
+            metrics: Метрики в каноническом порядке
+            admission: Контроль допуска задач анализа; по умолчанию - собственный с лимитами по умолчанию
+            key: Соединение, к лимитам которого относятся задачи архива
+            threads: Общий для сервера лимит потоков распаковки; None - без ограничения
+            max_members: Максимальное число файлов в архиве
+            max_size: Предельный объем распакованного содержимого архива
+            buffer_size: Объем непрочитанных частей архива, после которого прием частей ждет
+
+        Raises:
+            LookupError: Если кодировка неизвестна или не является текстовой
+            AdmissionRejected: Если все потоки распаковки сервера заняты
+        """
+        parse_encoding(encoding)
+        self.admission = admission or AdmissionController()
+        if threads is not None and not threads.acquire(blocking=False):
+            raise AdmissionRejected("Сервер распаковывает слишком много архивов, повторите загрузку позже",
+                                    self.admission.retry_after())
+        self.threads = threads
+        self.key = key
+        self.service = service
+        self.filename = filename
+        self.encoding = encoding
+        self.metrics = metrics
+        self.max_members = max_members
+        self.max_size = max_size
+        self.loop = asyncio.get_running_loop()
+        # Задачи файлов планируются в очереди соединения, загружающего архив
+        self.owner = job_owner.get()
+        self.pipe = ChunkPipe(self.loop, buffer_size)
+        self.members = 0
+        self.failed = 0
+        # Ошибка чтения архива; файлы до нее проанализированы
+        self.error: Optional[Exception] = None
+        self._results: List[Tuple[int, str, Union[FileAnalysis, Exception]]] = []
+        self._changed = asyncio.Event()
+        self._tasks = set()
+        self._extracted = False
+        # Загрузка отменена: результаты больше не выдаются
+        self.aborted = False
+        # Future, которого ждет поток распаковки (допуск или анализ блока)
+        self._waiting: Optional[Future] = None
+        self._thread = threading.Thread(target=self._extract, name="archive-extract", daemon=True)
+        self._thread.start()
+
+    @property
+    def done(self) -> bool:
+        """Архив прочитан, и все его файлы проанализированы"""
+        return self._extracted and not self._tasks
+
+    async def feed(self, chunk: Union[bytes, memoryview]):
+        """Передает очередную часть архива, дождавшись места в буфере"""
+        await self.pipe.put(chunk)
+
+    def ready(self) -> List[Tuple[int, str, Union[FileAnalysis, Exception]]]:
+        """Забирает готовые результаты: (номер файла в архиве, имя, результат или исключение)"""
+        results, self._results = self._results, []
+        return [] if self.aborted else results
+
+    async def results(self):
+        """
+        Завершает прием частей и выдает результаты оставшихся файлов по мере готовности
+
+        Yields:
+            Тройки (номер файла в архиве, имя, результат анализа или исключение)
+        """
+        self.pipe.close()
+        while True:
+            self._changed.clear()
+            for result in self.ready():
+                yield result
+            if self.done or self.aborted:
+                return
+            await self._changed.wait()
+
+    def abort(self):
+        """Прерывает распаковку и анализ (отмена загрузки или отключение клиента)"""
+        self.aborted = True
+        self.pipe.abort()
+        waiting = self._waiting
+        if waiting is not None:
+            waiting.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        self._extracted = True
+        self._changed.set()
+
+    def _extract(self):
+        """Читает файлы архива (выполняется в потоке распаковки)"""
+        job_owner.set(self.owner)
+        try:
+            for name, reader in iter_archive_members(self.pipe, self.max_size):
+                if self.members >= self.max_members:
+                    raise ArchiveError(f"В архиве больше {self.max_members} файлов")
+                index = self.members
+                self.members += 1
+                self._extract_member(index, name, reader)
+        except ArchiveAborted:
+            pass
+        except Exception as e:
+            # Любая ошибка распаковки (zlib, gzip, tarfile) - ошибка архива
+            self.error = e
+        finally:
+            self.pipe.finish_reading()
+            if self.threads is not None:
+                self.threads.release()
+            try:
+                self.loop.call_soon_threadsafe(self._extraction_done)
+            except RuntimeError:
+                pass
+
+    def _extract_member(self, index: int, name: str, reader):
+        """Передает файл архива на анализ: целиком отдельной задачей или по блокам"""
+        blocks = _iter_blocks(reader, MEMBER_BLOCK_SIZE)
+        first = next(blocks, b'')
+        second = next(blocks, None)
+        if second is None:
+            # Файл помещается в один блок: анализ идет параллельно с распаковкой следующих файлов
+            self._run_job(len(first), lambda: self._analyze_member(
+                index, name, lambda: self.service.analyze_payload(name, first, self.encoding, self.metrics)))
+            return
+
+        stream = self.service.open_stream(name, self.encoding, self.metrics)
+        error = None
+        pending = None
+        for block in itertools.chain((first, second), blocks):
+            if error is not None:
+                continue
+            if pending is not None:
+                error = self._wait(pending)
+                if error is not None:
+                    continue
+            # Следующий блок распаковывается, пока анализируется предыдущий
+            pending = self._run_job(len(block), lambda block=block: stream.feed(block))
+        if pending is not None and error is None:
+            error = self._wait(pending)
+        finish: Callable[[], Awaitable[FileAnalysis]] = stream.finish if error is None else lambda: _failed(error)
+        self._run_job(0, lambda: self._analyze_member(index, name, finish))
+
+    def _run_job(self, size: int, job: Callable[[], Awaitable]) -> Future:
+        """
+        Дожидается допуска задачи и запускает ее в event loop (вызывается из потока распаковки)
+
+        Архив не отклоняется по тайм-ауту допуска: распаковка ждет, сколько потребуется
+
+        Returns:
+            Future результата задачи
+        """
+        try:
+            admitted = asyncio.run_coroutine_threadsafe(
+                self.admission.acquire(self.key, size, patient=True), self.loop)
+        except RuntimeError:
+            raise ArchiveAborted() from None
+        self._wait(admitted)
+        future = Future()
+        self._call(self._start_job, size, job, future)
+        return future
+
+    def _wait(self, future: Future) -> Optional[Exception]:
+        """Ждет future; возвращает ошибку декодирования блока вместо исключения"""
+        self._waiting = future
+        try:
+            if self.aborted:
+                future.cancel()
+            future.result()
+        except (CancelledError, AnalysisCancelled):
+            raise ArchiveAborted() from None
+        except ValueError as e:
+            return e
+        finally:
+            self._waiting = None
+        return None
+
+    def _call(self, callback: Callable, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            raise ArchiveAborted() from None
+
+    def _start_job(self, size: int, job: Callable[[], Awaitable], future: Future):
+        """Запускает допущенную задачу (в event loop; контекст с владельцем задач - из потока распаковки)"""
+        if self.aborted:
+            self.admission.release(self.key, size)
+            future.cancel()
+            return
+        task = asyncio.ensure_future(job())
+        self._tasks.add(task)
+        # Обратный вызов выполняется и для задачи, отмененной до запуска: бюджет всегда возвращается
+        task.add_done_callback(functools.partial(self._job_done, size, future))
+
+    def _job_done(self, size: int, future: Future, task: asyncio.Task):
+        self.admission.release(self.key, size)
+        self._tasks.discard(task)
+        self._changed.set()
+        if future.done():
+            return
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    async def _analyze_member(self, index: int, name: str, analyze: Callable[[], Awaitable[FileAnalysis]]):
+        """Анализирует файл архива и сохраняет результат или ошибку"""
+        try:
+            result = await analyze()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = e
+        if isinstance(result, Exception):
+            self.failed += 1
+        self._results.append((index, name, result))
+
+    def _extraction_done(self):
+        self._extracted = True
+        self._changed.set()
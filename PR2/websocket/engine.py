@@ -0,0 +1,187 @@
+import codecs
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Метрики, которые может запросить клиент, в каноническом порядке
+METRICS = ("lines", "words", "chars", "bytes", "longest_line", "unique_words")
+# Метрики по умолчанию - прежний набор результатов анализа
+DEFAULT_METRICS = ("lines", "words", "chars")
+
+# Содержимое обрабатывается блоками: блок остается в кэше процессора на время всех проходов
+# по нему, а временные строки (split) ограничены размером блока, а не файла
+BLOCK_SIZE = 1 << 16
+
+
+def parse_metrics(names: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """
+    Проверяет запрошенные метрики и приводит их к каноническому порядку
+
+    Args:
+        names: Названия метрик; None - метрики по умолчанию
+
+    Returns:
+        Кортеж метрик в порядке METRICS (используется и как часть ключа кэша)
+
+    Raises:
+        ValueError: Если метрика неизвестна или список пуст
+    """
+    if names is None:
+        return DEFAULT_METRICS
+    if isinstance(names, str):
+        names = [names]
+    requested = set(names)
+    unknown = requested.difference(METRICS)
+    if unknown:
+        raise ValueError(f"Неизвестные метрики: {', '.join(sorted(map(str, unknown)))}")
+    if not requested:
+        raise ValueError("Не указано ни одной метрики")
+    return tuple(metric for metric in METRICS if metric in requested)
+
+
+def parse_encoding(encoding: str) -> str:
+    """
+    Проверяет кодировку, указанную клиентом
+
+    Допускаются только текстовые кодировки: кодеки bytes-to-bytes (zlib_codec, bz2_codec и т. п.)
+    распаковали бы небольшую часть в данные произвольного объема.
+
+    Args:
+        encoding: Название кодировки
+
+    Returns:
+        Та же кодировка
+
+    Raises:
+        LookupError: Если кодировка неизвестна или не является текстовой
+    """
+    info = codecs.lookup(encoding)
+    if not getattr(info, "_is_text_encoding", True):
+        raise LookupError(f"{encoding} не является текстовой кодировкой")
+    return encoding
+
+
+class MetricsEngine:
+    """
+    Однопроходный подсчет метрик текста по частям без построения списков строк и слов файла
+
+    Каждая метрика включается только по запросу; части могут резать слова и строки
+    (но не суррогатные пары - их склеивает вызывающий код)
+    """
+
+    def __init__(self, metrics: Tuple[str, ...] = DEFAULT_METRICS):
+        """
+        Инициализирует подсчет метрик
+
+        Args:
+            metrics: Метрики в каноническом порядке (см. parse_metrics)
+        """
+        self.metrics = metrics
+        self._lines = "lines" in metrics
+        self._words = "words" in metrics
+        self._chars = "chars" in metrics
+        self._bytes = "bytes" in metrics
+        self._longest = "longest_line" in metrics
+        self._unique = "unique_words" in metrics
+        self._split = self._words or self._unique
+
+        self.word_count = 0
+        self.char_count = 0
+        self.newline_count = 0
+        self.byte_count = 0
+        self.longest_line = 0
+        self.unique: Set[str] = set()
+        # Последний символ предыдущей части - не пробельный, т.е. слово может продолжиться
+        self._in_word = False
+        # Длина незавершенной строки в конце предыдущей части
+        self._line_length = 0
+        # Куски слова, которое может продолжиться в следующей части
+        self._open_word: List[str] = []
+
+    def feed(self, text: str):
+        """
+        Учитывает очередную часть текста
+
+        Args:
+            text: Часть содержимого
+        """
+        for start in range(0, len(text), BLOCK_SIZE):
+            self._feed_block(text[start:start + BLOCK_SIZE] if len(text) > BLOCK_SIZE else text)
+
+    def result(self) -> Dict[str, int]:
+        """
+        Завершает подсчет и возвращает значения запрошенных метрик
+
+        Returns:
+            Словарь {метрика: значение} только для запрошенных метрик
+        """
+        if self._open_word:
+            self.unique.add(''.join(self._open_word))
+            self._open_word = []
+        values = {
+            "lines": self.newline_count + 1,
+            "words": self.word_count,
+            "chars": self.char_count,
+            "bytes": self.byte_count,
+            "longest_line": max(self.longest_line, self._line_length),
+            "unique_words": len(self.unique),
+        }
+        return {metric: values[metric] for metric in self.metrics}
+
+    def _feed_block(self, block: str):
+        if not block:
+            return
+        length = len(block)
+        if self._chars:
+            self.char_count += length
+        if self._lines:
+            self.newline_count += block.count('\n')
+        if self._bytes:
+            self.byte_count += length if block.isascii() else len(block.encode('utf-8', 'surrogatepass'))
+        if self._longest:
+            self._measure_lines(block)
+        if self._split:
+            self._count_words(block)
+
+    def _measure_lines(self, block: str):
+        """Обновляет длину самой длинной строки, не разбивая блок на строки"""
+        find = block.find
+        start = 0
+        longest = self.longest_line
+        line_length = self._line_length
+        while True:
+            end = find('\n', start)
+            if end < 0:
+                line_length += len(block) - start
+                break
+            line_length += end - start
+            if line_length > longest:
+                longest = line_length
+            line_length = 0
+            start = end + 1
+        self.longest_line = longest
+        self._line_length = line_length
+
+    def _count_words(self, block: str):
+        """Считает слова блока; слово на границе частей учитывается один раз"""
+        words = block.split()
+        continues = self._in_word and not block[0].isspace()
+        ends_open = not block[-1].isspace()
+        self._in_word = ends_open
+        if self._words:
+            self.word_count += len(words) - continues
+        if not self._unique:
+            return
+
+        # Слово в конце блока может продолжиться в следующем - оно добавляется в множество позже
+        last = len(words) - 1 if ends_open else len(words)
+        first = 0
+        if continues:
+            self._open_word.append(words[0])
+            if last == 0:
+                return
+            first = 1
+        if self._open_word:
+            self.unique.add(''.join(self._open_word))
+            self._open_word = []
+        self.unique.update(words[first:last])
+        if ends_open:
+            self._open_word.append(words[last])
@@ -0,0 +1,117 @@
+import codecs
+import hashlib
+import mmap
+import os
+from stat import S_ISREG
+from typing import Iterator, Optional, Tuple
+
+from websocket.result_cache import ContentKey
+
+# Размер блока файла, декодируемого за один раз: память на анализ не зависит от размера файла
+MAPPED_BLOCK_SIZE = 1 << 20
+
+
+class FileRoot:
+    """Разрешенный корневой каталог для анализа файлов по ссылке"""
+
+    def __init__(self, directory: str):
+        """
+        Инициализирует корневой каталог
+
+        Args:
+            directory: Каталог, внутри которого клиенты могут называть файлы
+        """
+        self.directory = os.path.realpath(directory)
+
+    def resolve(self, path: str) -> Tuple[str, os.stat_result]:
+        """
+        Преобразует путь клиента в путь файла внутри корневого каталога
+
+        Символические ссылки раскрываются до проверки, поэтому ссылка наружу не проходит.
+        Вместе с путем возвращается stat проверенного файла: воркер сверяет с ним открытый
+        файл (см. iter_mapped_text), и подмена файла после проверки не проходит
+
+        Args:
+            path: Путь относительно корневого каталога
+
+        Returns:
+            Абсолютный путь файла и его stat на момент проверки
+
+        Raises:
+            PermissionError: Если путь выходит за пределы корневого каталога
+            FileNotFoundError: Если файл не существует или не является обычным файлом
+        """
+        if not isinstance(path, str) or not path or '\0' in path or os.path.isabs(path):
+            raise PermissionError(f"Недопустимый путь: {path!r}")
+        full_path = os.path.realpath(os.path.join(self.directory, path))
+        if os.path.commonpath([self.directory, full_path]) != self.directory:
+            raise PermissionError(f"Путь вне разрешенного каталога: {path}")
+        try:
+            stat = os.stat(full_path, follow_symlinks=False)
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            raise FileNotFoundError(f"Файл не найден: {path}")
+        return full_path, stat
+
+
+def path_key(path: str, encoding: str, stat: Optional[os.stat_result] = None) -> ContentKey:
+    """
+    Ключ кэша для файла по ссылке: по метаданным, без чтения содержимого
+
+    Изменение файла меняет размер или время изменения, и результат считается заново
+
+    Args:
+        path: Абсолютный путь файла
+        encoding: Кодировка содержимого
+        stat: Уже полученный stat файла (по умолчанию читается по пути)
+
+    Returns:
+        Пара (размер файла, хэш пути, устройства, inode, времени изменения и кодировки)
+    """
+    if stat is None:
+        stat = os.stat(path)
+    signature = f"path\0{path}\0{stat.st_dev}\0{stat.st_ino}\0{stat.st_mtime_ns}\0{codecs.lookup(encoding).name}"
+    return stat.st_size, hashlib.blake2b(signature.encode('utf-8', 'surrogateescape'), digest_size=16).digest()
+
+
+def iter_mapped_text(path: str, encoding: str = "utf-8",
+                     identity: Optional[Tuple[int, int]] = None) -> Iterator[str]:
+    """
+    Декодирует файл блоками прямо из отображения в память (вызывается в воркере)
+
+    Страницы файла читаются ядром по мере обращения, а копия файла в памяти Python
+    не создается: одновременно существует только один декодированный блок
+
+    Файл открывается без перехода по символической ссылке, а открытый файл сверяется
+    с проверенным по устройству и inode: путь мог быть подменен после проверки
+
+    Args:
+        path: Путь файла
+        encoding: Кодировка содержимого
+        identity: Устройство и inode файла на момент проверки пути (None - без сверки)
+
+    Yields:
+        Части текста; многобайтовые символы на границах блоков не разрезаются
+
+    Raises:
+        PermissionError: Если по пути открылся не проверенный файл
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0)), 'rb') as file:
+        stat = os.fstat(file.fileno())
+        if identity is not None and (stat.st_dev, stat.st_ino) != tuple(identity):
+            raise PermissionError(f"Файл изменен после проверки пути: {path}")
+        size = stat.st_size
+        if size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for start in range(0, size, MAPPED_BLOCK_SIZE):
+                    yield decoder.decode(view[start:start + MAPPED_BLOCK_SIZE])
+            finally:
+                view.release()
+    yield decoder.decode(b'', final=True)
@@ -0,0 +1,86 @@
+import struct
+from dataclasses import dataclass
+
+# Заголовок бинарного сообщения (сетевой порядок байт):
+#   magic "FA" | версия (1 байт) | тип (1 байт) | request_id (4 байта) |
+#   длина имени файла (2 байта) | длина названия кодировки (1 байт)
+# затем имя файла в UTF-8, название кодировки в ASCII и содержимое файла
+HEADER = struct.Struct("!2sBBIHB")
+MAGIC = b"FA"
+VERSION = 1
+
+# Содержимое файла целиком
+FRAME_FILE = 1
+# Очередная часть загрузки по частям; request_id - числовой upload_id из file_begin,
+# содержимое декодируется в кодировке, указанной в file_begin
+FRAME_CHUNK = 2
+FRAME_TYPES = (FRAME_FILE, FRAME_CHUNK)
+
+
+class FrameError(ValueError):
+    """Ошибка разбора бинарного сообщения"""
+
+
+@dataclass
+class BinaryFrame:
+    """Бинарное сообщение с содержимым файла"""
+    frame_type: int
+    request_id: int
+    filename: str
+    encoding: str
+    payload: memoryview
+
+
+def parse_frame(data: bytes) -> BinaryFrame:
+    """
+    Разбирает бинарное сообщение без копирования содержимого
+
+    Args:
+        data: Бинарное сообщение WebSocket
+
+    Returns:
+        Разобранное сообщение; payload ссылается на исходный буфер
+
+    Raises:
+        FrameError: Если сообщение повреждено или имеет неизвестный формат
+    """
+    if len(data) < HEADER.size:
+        raise FrameError("Слишком короткое бинарное сообщение")
+    magic, version, frame_type, request_id, filename_length, encoding_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise FrameError("Неизвестный формат бинарного сообщения")
+    if frame_type not in FRAME_TYPES:
+        raise FrameError(f"Неизвестный тип бинарного сообщения: {frame_type}")
+
+    view = memoryview(data)
+    offset = HEADER.size
+    payload_offset = offset + filename_length + encoding_length
+    if len(data) < payload_offset:
+        raise FrameError("Заголовок бинарного сообщения длиннее сообщения")
+    try:
+        filename = str(view[offset:offset + filename_length], "utf-8")
+        encoding = str(view[offset + filename_length:payload_offset], "ascii") or "utf-8"
+    except UnicodeDecodeError:
+        raise FrameError("Неверная кодировка заголовка бинарного сообщения")
+    return BinaryFrame(frame_type, request_id, filename, encoding, view[payload_offset:])
+
+
+def build_frame(frame_type: int, request_id: int, filename: str, payload: bytes,
+                encoding: str = "utf-8") -> bytes:
+    """
+    Собирает бинарное сообщение (используется клиентами и тестами)
+
+    Args:
+        frame_type: Тип сообщения
+        request_id: Идентификатор запроса или загрузки
+        filename: Имя файла
+        payload: Содержимое файла в байтах
+        encoding: Кодировка содержимого
+
+    Returns:
+        Бинарное сообщение
+    """
+    filename_bytes = filename.encode("utf-8")
+    encoding_bytes = encoding.encode("ascii")
+    header = HEADER.pack(MAGIC, VERSION, frame_type, request_id, len(filename_bytes), len(encoding_bytes))
+    return header + filename_bytes + encoding_bytes + payload
@@ -1,28 +1,74 @@
+import asyncio
+import itertools
 import json
 import threading
-from typing import Dict
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
 
 import websockets
 
+from monitoring.metrics import REGISTRY
+from websocket.admission import AdmissionController, AdmissionRejected
 from websocket.analysis_service import FileAnalysisService
+from websocket.archive import ArchiveAnalysis
+from websocket.engine import DEFAULT_METRICS, parse_encoding, parse_metrics
+from websocket.file_refs import FileRoot
+from websocket.frames import FRAME_CHUNK, FRAME_FILE, BinaryFrame, FrameError, parse_frame
+from websocket.incremental import IncrementalAnalyzer
 from websocket.interfaces import WebSocketHandlerInterface
-from websocket.models import FileAnalysis, Stats
+from websocket.models import FileAnalysis
+from websocket.scheduler import job_owner
+from websocket.session import ClientSession, SessionStore
+
+# Типы сообщений для метрик; прочие значения от клиента учитываются как unknown,
+# чтобы клиент не мог раздуть число меток
+MESSAGE_TYPES = ('files', 'paths', 'get_stats', 'session', 'cancel', 'file_begin', 'file_chunk', 'file_end')
+
+CONNECTIONS = REGISTRY.gauge("ws_connections_active", "Открытые WebSocket соединения")
+MESSAGES = REGISTRY.counter("ws_messages_total", "Полученные WebSocket сообщения по типам", ["type"])
+SEND_LATENCY = REGISTRY.histogram("ws_send_duration_seconds",
+                                  "Время отправки сообщения клиенту, включая ожидание буфера сокета")
+UPLOADS = REGISTRY.counter("analysis_files_total", "Проанализированные файлы", ["source"]).labels("upload")
+UPLOAD_BYTES = REGISTRY.counter(
+    "analysis_bytes_total", "Объем проанализированного содержимого: байт, для текста - символов", ["source"]
+).labels("upload")
 
 
 class WebSocketHandler(WebSocketHandlerInterface):
     """Обработчик WebSocket соединений"""
 
-    def __init__(self, analysis_service: FileAnalysisService):
+    def __init__(self, analysis_service: FileAnalysisService, max_uploads_per_client: int = 16,
+                 admission: Optional[AdmissionController] = None, files_root: Optional[str] = None,
+                 session_store: Optional[SessionStore] = None, max_archives: int = 8):
         """
         Инициализирует обработчик WebSocket
 
         Args:
             analysis_service: Сервис для анализа файлов
+            max_uploads_per_client: Максимальное число одновременных загрузок по частям на клиента
+            admission: Контроль допуска задач анализа; по умолчанию - с лимитами по умолчанию
+            files_root: Каталог, файлы которого можно анализировать по ссылке (запрос paths);
+                        None - запрос paths отключен
+            session_store: Хранилище сессий отключившихся клиентов; по умолчанию - с лимитами по умолчанию
+            max_archives: Число архивов, одновременно распаковываемых сервером (по потоку на архив)
         """
         self.analysis_service = analysis_service
-        # Хранилище результатов для каждого клиента
-        self.client_results: Dict[websockets.WebSocketServerProtocol, Dict[str, FileAnalysis]] = {}
-        self.results_lock = threading.Lock()
+        self.admission = admission or AdmissionController()
+        self.files_root = FileRoot(files_root) if files_root is not None else None
+        self.max_uploads_per_client = max_uploads_per_client
+        # Потоки распаковки архивов всех соединений; освобождаются по завершении потока
+        self.archive_threads = threading.BoundedSemaphore(max_archives)
+        # Сессия (результаты, итоги и загрузки) каждого клиента; используется только из event loop
+        self.sessions: Dict[websockets.WebSocketServerProtocol, ClientSession] = {}
+        self.session_store = session_store or SessionStore()
+        # Токен сессии, сообщенный клиенту -> соединение, которому сессия принадлежит сейчас
+        self._session_owners: Dict[str, websockets.WebSocketServerProtocol] = {}
+        # Выполняющийся запрос соединения и его идентификатор (для отмены сообщением cancel)
+        self._requests: Dict[websockets.WebSocketServerProtocol, asyncio.Task] = {}
+        self._request_keys: Dict[websockets.WebSocketServerProtocol, tuple] = {}
+        self._upload_ids = itertools.count(1)
+        self._batch_ids = itertools.count(1)
 
     async def handle_client(self, websocket, path):
         """
@@ -32,47 +78,171 @@ class WebSocketHandler(WebSocketHandlerInterface):
             websocket: WebSocket соединение
             path: Путь соединения
         """
-        # Инициализируем хранилище результатов для нового клиента
-        with self.results_lock:
-            self.client_results[websocket] = {}
+        # Создаем сессию нового клиента
+        self.sessions[websocket] = ClientSession()
+        CONNECTIONS.inc()
+        # Задачи анализа соединения планируются в его собственной очереди (см. JobScheduler)
+        job_owner.set(websocket)
 
         try:
+            # Клиент может сразу запросить сессию: ws://host:port/?session=<токен> (пустой - новая)
+            token = parse_qs(urlsplit(path or '').query, keep_blank_values=True).get('session')
+            if token is not None:
+                await self._attach_session(websocket, token[0])
             await self._process_client_messages(websocket)
         except Exception:
             pass
         finally:
-            # Очищаем результаты при отключении клиента
-            with self.results_lock:
-                if websocket in self.client_results:
-                    del self.client_results[websocket]
+            # Сессию, токен которой известен клиенту, сохраняем до переподключения
+            session = self.sessions.pop(websocket, None)
+            if session is not None:
+                session.discard_uploads()
+            if session is not None and session.resumable:
+                if self._session_owners.get(session.token) is websocket:
+                    del self._session_owners[session.token]
+                self.session_store.park(session)
+            CONNECTIONS.dec()
 
     async def _process_client_messages(self, websocket):
         """
         Обрабатывает сообщения от клиента
 
+        Сообщения обрабатываются по одному, но следующее сообщение читается заранее: если это
+        cancel, он выполняется сразу, не дожидаясь завершения текущего запроса. Разрыв
+        соединения отменяет текущий запрос, и его задачи анализа освобождают воркеры.
+
         Args:
             websocket: WebSocket соединение
         """
-        while True:
-            try:
-                message = await websocket.recv()
-                data = json.loads(message)
+        incoming = asyncio.ensure_future(websocket.recv())
+        closed = asyncio.ensure_future(websocket.wait_closed())
+        try:
+            while True:
+                try:
+                    message = await incoming
+                except websockets.exceptions.ConnectionClosed:
+                    break
+                incoming = asyncio.ensure_future(websocket.recv())
+                request = asyncio.ensure_future(self._handle_message(websocket, message))
+                self._requests[websocket] = request
+                watched = {request, incoming, closed}
+                while not request.done():
+                    await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+                    if closed.done() or (incoming.done() and incoming.exception() is not None):
+                        request.cancel()
+                        break
+                    if incoming in watched and incoming.done():
+                        watched.discard(incoming)
+                        data = self._cancel_message(incoming.result())
+                        if data is not None:
+                            MESSAGES.labels('cancel').inc()
+                            incoming = asyncio.ensure_future(websocket.recv())
+                            watched.add(incoming)
+                            await self._handle_cancel(websocket, data)
+                        # Иначе следующее сообщение ждет завершения текущего запроса
+                await asyncio.wait({request})
+                self._requests.pop(websocket, None)
+                self._request_keys.pop(websocket, None)
+        finally:
+            incoming.cancel()
+            closed.cancel()
 
-                if data['type'] == 'files':
-                    await self._handle_files_analysis(websocket, data)
-                elif data['type'] == 'get_stats':
-                    await self._send_stats(websocket)
-                else:
-                    await self.send_error(websocket, "Неизвестный тип сообщения")
+    async def _handle_message(self, websocket, message: Union[str, bytes]):
+        """
+        Обрабатывает одно сообщение клиента
+
+        Args:
+            websocket: WebSocket соединение
+            message: Текстовое (JSON) или бинарное сообщение
+        """
+        try:
+            if isinstance(message, bytes):
+                # Бинарные сообщения несут содержимое файлов без JSON-обработки
+                MESSAGES.labels('binary').inc()
+                await self._handle_binary_frame(websocket, message)
+                return
+            data = json.loads(message)
+            message_type = data.get('type') if isinstance(data, dict) else None
+            MESSAGES.labels(message_type if message_type in MESSAGE_TYPES else 'unknown').inc()
 
-            except json.JSONDecodeError:
-                await self.send_error(websocket, "Неверный формат данных")
+            if data['type'] == 'files':
+                self._request_keys[websocket] = ('batch', data.get('batch_id'))
+                await self._handle_files_analysis(websocket, data)
+            elif data['type'] == 'paths':
+                self._request_keys[websocket] = ('batch', data.get('batch_id'))
+                await self._handle_paths_analysis(websocket, data)
+            elif data['type'] == 'get_stats':
+                await self._send_stats(websocket)
+            elif data['type'] == 'session':
+                await self._attach_session(websocket, data.get('session'))
+            elif data['type'] == 'cancel':
+                await self._handle_cancel(websocket, data)
+            elif data['type'] == 'file_begin':
+                await self._handle_file_begin(websocket, data)
+            elif data['type'] == 'file_chunk':
+                await self._handle_file_chunk(websocket, data)
+            elif data['type'] == 'file_end':
+                await self._handle_file_end(websocket, data)
+            else:
+                await self.send_error(websocket, "Неизвестный тип сообщения")
 
-            except websockets.exceptions.ConnectionClosed:
-                break
+        except (json.JSONDecodeError, FrameError):
+            await self.send_error(websocket, "Неверный формат данных")
 
-            except Exception as e:
-                await self.send_error(websocket, "Внутренняя ошибка сервера")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+        except Exception as e:
+            await self.send_error(websocket, "Внутренняя ошибка сервера")
+
+    @staticmethod
+    def _cancel_message(message: Union[str, bytes]) -> Optional[dict]:
+        """Возвращает данные сообщения cancel; для остальных сообщений - None (без полного разбора)"""
+        if not isinstance(message, str) or len(message) > 4096 or '"cancel"' not in message:
+            return None
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(data, dict) and data.get('type') == 'cancel':
+            return data
+        return None
+
+    async def _handle_cancel(self, websocket, data: dict):
+        """
+        Отменяет запрос клиента: ожидающие задачи анализа убираются из очереди,
+        выполняющиеся в пуле потоков - останавливаются
+
+        Args:
+            websocket: WebSocket соединение
+            data: Данные запроса {'type': 'cancel', 'batch_id': '...'}; вместо batch_id можно указать
+                  request_id (бинарное сообщение) или upload_id (загрузка по частям);
+                  без идентификатора отменяется текущий запрос
+        """
+        reply = {'type': 'cancelled'}
+        found = False
+        if 'upload_id' in data:
+            upload_id = str(data['upload_id'])
+            reply['upload_id'] = upload_id
+            upload = self.sessions[websocket].uploads.pop(upload_id, None)
+            found = upload is not None
+            if isinstance(upload, ArchiveAnalysis):
+                upload.abort()
+        else:
+            key = None
+            for field, kind in (('batch_id', 'batch'), ('request_id', 'request')):
+                if field in data:
+                    key = (kind, data[field])
+                    reply[field] = data[field]
+            request = self._requests.get(websocket)
+            if (request is not None and request is not asyncio.current_task() and not request.done()
+                    and (key is None or self._request_keys.get(websocket) == key)):
+                request.cancel()
+                # Ответ отправляется после того, как запрос перестал отправлять результаты
+                await asyncio.wait({request})
+                found = True
+        reply['found'] = found
+        await self._send(websocket, reply)
 
     async def _handle_files_analysis(self, websocket, data: dict):
         """
@@ -87,22 +257,450 @@ class WebSocketHandler(WebSocketHandlerInterface):
             if not files:
                 await self.send_error(websocket, "Нет файлов для анализа")
                 return
+            # Клиент может запросить только нужные метрики: остальные не считаются
+            metrics = parse_metrics(data.get('metrics'))
 
-            # Параллельно анализируем все файлы
-            analyses = await self.analysis_service.analyze_files(files)
+            if data.get('stream'):
+                await self._stream_files_analysis(websocket, files, data.get('batch_id'), metrics)
+                return
 
-            # Сохраняем результаты для конкретного клиента
-            with self.results_lock:
-                for analysis in analyses:
-                    self.client_results[websocket][analysis.filename] = analysis
+            # Элементы пакета проверяются до создания корутин: ошибка в середине пакета
+            # оставила бы уже созданные корутины анализа без await
+            for file_data in files:
+                if not isinstance(file_data, dict) or 'filename' not in file_data or 'content' not in file_data:
+                    await self.send_error(websocket, "Для каждого файла нужны поля filename и content")
+                    return
 
-            # Отправляем результаты клиенту
-            for analysis in analyses:
-                await websocket.send(json.dumps(analysis.to_dict()))
+            # Параллельно анализируем все файлы; каждый файл проходит контроль допуска
+            results = await asyncio.gather(*(
+                self._admitted_analysis(websocket, file_data['filename'], file_data['content'], metrics=metrics)
+                for file_data in files
+            ), return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException) and not isinstance(result, AdmissionRejected):
+                    raise result
+
+            # Сохраняем результаты в сессии клиента
+            session = self.sessions[websocket]
+            for result in results:
+                if not isinstance(result, AdmissionRejected):
+                    session.record(result)
+
+            # Отправляем результаты клиенту в порядке файлов; недопущенные файлы получают отказ busy
+            for file_data, result in zip(files, results):
+                if isinstance(result, AdmissionRejected):
+                    message = self._busy_message(result)
+                    message['filename'] = file_data['filename']
+                else:
+                    message = result.to_dict()
+                await self._send(websocket, message)
 
         except Exception as e:
             await self.send_error(websocket, f"Ошибка при анализе файлов: {str(e)}")
 
+    async def _stream_files_analysis(self, websocket, files: list, batch_id=None,
+                                     metrics: Tuple[str, ...] = DEFAULT_METRICS,
+                                     analyze_file: Optional[Callable[[dict], Awaitable[FileAnalysis]]] = None):
+        """
+        Отправляет результат каждого файла сразу после завершения его анализа
+
+        Args:
+            websocket: WebSocket соединение
+            files: Файлы пакета
+            batch_id: Идентификатор пакета от клиента; если не задан, назначается сервером
+            metrics: Запрошенные метрики
+            analyze_file: Анализ одного элемента пакета; по умолчанию - содержимое из поля content
+        """
+        if batch_id is None:
+            batch_id = f"b{next(self._batch_ids)}"
+        if analyze_file is None:
+            def analyze_file(file_data: dict) -> Awaitable[FileAnalysis]:
+                return self._admitted_analysis(websocket, file_data['filename'], file_data['content'], metrics=metrics)
+
+        async def analyze(index: int, file_data: dict):
+            try:
+                return index, await analyze_file(file_data)
+            except Exception as e:
+                return index, e
+
+        tasks = [asyncio.ensure_future(analyze(index, file_data)) for index, file_data in enumerate(files)]
+        failed = 0
+        try:
+            for completed in asyncio.as_completed(tasks):
+                index, result = await completed
+                if isinstance(result, AdmissionRejected):
+                    failed += 1
+                    message = self._busy_message(result)
+                    message['filename'] = files[index].get('filename')
+                elif isinstance(result, Exception):
+                    failed += 1
+                    message = {
+                        'type': 'error',
+                        'message': f"Ошибка при анализе файла: {result}",
+                        'filename': files[index].get('filename'),
+                    }
+                else:
+                    self.sessions[websocket].record(result)
+                    message = result.to_dict()
+                message['batch_id'] = batch_id
+                message['index'] = index
+                await self._send(websocket, message)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Маркер завершения пакета: все результаты пакета уже отправлены
+        await self._send(websocket, {
+            'type': 'batch_complete',
+            'batch_id': batch_id,
+            'count': len(files),
+            'failed': failed
+        })
+
+    async def _handle_paths_analysis(self, websocket, data: dict):
+        """
+        Анализирует файлы из разрешенного каталога сервера по их путям
+
+        Содержимое не передается по сети: файлы отображаются в память и анализируются на месте.
+        Результаты отправляются по мере готовности, как при потоковой выдаче.
+
+        Args:
+            websocket: WebSocket соединение
+            data: Данные запроса {'type': 'paths', 'paths': ['...'], 'encoding': '...',
+                  'metrics': [...], 'batch_id': '...'}
+        """
+        if self.files_root is None:
+            await self.send_error(websocket, "Анализ файлов по ссылке не настроен на сервере")
+            return
+        paths = data.get('paths')
+        if not paths or not isinstance(paths, list):
+            await self.send_error(websocket, "Нет файлов для анализа")
+            return
+        try:
+            metrics = parse_metrics(data.get('metrics'))
+            encoding = parse_encoding(data.get('encoding') or 'utf-8')
+        except (ValueError, LookupError) as e:
+            await self.send_error(websocket, str(e))
+            return
+
+        async def analyze_path(file_data: dict) -> FileAnalysis:
+            full_path, stat = self.files_root.resolve(file_data['filename'])
+            # Отображение в память не занимает память процесса - в бюджет входит только задача
+            async with self.admission.admit(websocket, 0):
+                return await self.analysis_service.analyze_path(file_data['filename'], full_path, encoding, metrics,
+                                                                stat)
+
+        await self._stream_files_analysis(
+            websocket, [{'filename': path} for path in paths], data.get('batch_id'), metrics, analyze_path
+        )
+
+    async def _admitted_analysis(self, websocket, filename: str, content: Union[str, bytes, memoryview],
+                                 encoding: Optional[str] = None,
+                                 metrics: Tuple[str, ...] = DEFAULT_METRICS) -> FileAnalysis:
+        """
+        Анализирует файл после допуска контролем нагрузки
+
+        Args:
+            websocket: WebSocket соединение, к лимитам которого относится задача
+            filename: Имя файла
+            content: Содержимое файла: текст или байты в кодировке encoding
+            encoding: Кодировка байтового содержимого; None - содержимое текстовое
+            metrics: Запрошенные метрики
+
+        Returns:
+            Объект с результатами анализа
+
+        Raises:
+            AdmissionRejected: Если бюджет сервера не освободился вовремя
+        """
+        async with self.admission.admit(websocket, len(content)):
+            if encoding is None:
+                return await self.analysis_service.analyze_file(filename, content, metrics)
+            return await self.analysis_service.analyze_payload(filename, content, encoding, metrics)
+
+    @staticmethod
+    def _busy_message(error: AdmissionRejected) -> dict:
+        """Сообщение об отказе из-за перегрузки с подсказкой, когда повторить запрос"""
+        return {
+            'type': 'error',
+            'code': 'busy',
+            'message': str(error),
+            'retry_after': error.retry_after
+        }
+
+    async def _handle_binary_frame(self, websocket, message: bytes):
+        """
+        Обрабатывает бинарное сообщение с содержимым файла
+
+        Args:
+            websocket: WebSocket соединение
+            message: Бинарное сообщение (формат описан в websocket/frames.py)
+
+        Raises:
+            FrameError: Если сообщение повреждено
+        """
+        frame = parse_frame(message)
+        if frame.frame_type == FRAME_FILE:
+            self._request_keys[websocket] = ('request', frame.request_id)
+            await self._handle_file_frame(websocket, frame)
+        elif frame.frame_type == FRAME_CHUNK:
+            await self._handle_chunk_frame(websocket, frame)
+
+    async def _handle_file_frame(self, websocket, frame: BinaryFrame):
+        """
+        Анализирует файл из бинарного сообщения и отправляет результат
+
+        Args:
+            websocket: WebSocket соединение
+            frame: Разобранное бинарное сообщение
+        """
+        try:
+            analysis = await self._admitted_analysis(websocket, frame.filename, frame.payload, frame.encoding)
+        except AdmissionRejected as e:
+            message = self._busy_message(e)
+            message.update(filename=frame.filename, request_id=frame.request_id)
+            await self._send(websocket, message)
+            return
+        except (UnicodeDecodeError, LookupError) as e:
+            await self._send_frame_error(websocket, frame, f"Ошибка декодирования файла: {e}")
+            return
+        except Exception as e:
+            await self._send_frame_error(websocket, frame, f"Ошибка при анализе файла: {e}")
+            return
+
+        self.sessions[websocket].record(analysis)
+        message = analysis.to_dict()
+        message['request_id'] = frame.request_id
+        await self._send(websocket, message)
+
+    async def _handle_chunk_frame(self, websocket, frame: BinaryFrame):
+        """
+        Учитывает часть загружаемого файла из бинарного сообщения
+
+        Загрузка начинается сообщением file_begin с числовым upload_id, равным request_id частей.
+        Часть архива передается потоку распаковки; прием следующего сообщения ждет, пока
+        в буфере архива не освободится место. Результаты файлов архива, готовые к этому
+        моменту, отправляются сразу.
+
+        Args:
+            websocket: WebSocket соединение
+            frame: Разобранное бинарное сообщение
+        """
+        analyzer = self.sessions[websocket].uploads.get(str(frame.request_id))
+        if analyzer is None:
+            await self.send_error(websocket, "Неизвестная загрузка")
+            return
+        if isinstance(analyzer, ArchiveAnalysis):
+            await analyzer.feed(frame.payload)
+            for result in analyzer.ready():
+                await self._send_member_result(websocket, str(frame.request_id), analyzer, *result)
+            return
+        UPLOAD_BYTES.inc(len(frame.payload))
+        try:
+            analyzer.feed_bytes(frame.payload)
+        except (UnicodeDecodeError, LookupError) as e:
+            # Счетчики загрузки уже не согласованы с содержимым - загрузка отменяется
+            self.sessions[websocket].uploads.pop(str(frame.request_id), None)
+            await self._send_frame_error(websocket, frame, f"Ошибка декодирования файла: {e}")
+
+    async def _send_frame_error(self, websocket, frame: BinaryFrame, message: str):
+        """Отправляет ошибку обработки бинарного сообщения с его идентификатором"""
+        await self._send(websocket, {
+            'type': 'error',
+            'message': message,
+            'filename': frame.filename,
+            'request_id': frame.request_id
+        })
+
+    async def _handle_file_begin(self, websocket, data: dict):
+        """
+        Начинает загрузку файла по частям
+
+        Args:
+            websocket: WebSocket соединение
+            data: Данные запроса {'type': 'file_begin', 'filename': '...', 'upload_id': '...',
+                  'encoding': '...', 'metrics': [...], 'archive': false}; кодировка используется
+                  для частей в бинарных сообщениях и для файлов архива. С 'archive': true загружается
+                  архив zip или tar(.gz): его части передаются только бинарными сообщениями, а
+                  файлы анализируются по мере распаковки (см. ArchiveAnalysis)
+        """
+        uploads = self.sessions[websocket].uploads
+        filename = data.get('filename')
+        if not filename:
+            await self.send_error(websocket, "Не указано имя файла")
+            return
+        try:
+            metrics = parse_metrics(data.get('metrics'))
+        except ValueError as e:
+            await self.send_error(websocket, str(e))
+            return
+        if len(uploads) >= self.max_uploads_per_client:
+            await self.send_error(websocket, "Слишком много одновременных загрузок")
+            return
+
+        upload_id = str(data.get('upload_id') or f"u{next(self._upload_ids)}")
+        if upload_id in uploads:
+            await self.send_error(websocket, f"Загрузка {upload_id} уже выполняется")
+            return
+        encoding = data.get('encoding') or 'utf-8'
+        try:
+            if data.get('archive'):
+                uploads[upload_id] = ArchiveAnalysis(self.analysis_service, filename, encoding, metrics,
+                                                     self.admission, websocket, self.archive_threads)
+            else:
+                uploads[upload_id] = IncrementalAnalyzer(filename, encoding, metrics)
+        except LookupError as e:
+            await self.send_error(websocket, f"Ошибка декодирования файла: {e}")
+            return
+        except AdmissionRejected as e:
+            message = self._busy_message(e)
+            message.update(filename=filename, upload_id=upload_id)
+            await self._send(websocket, message)
+            return
+        await self._send(websocket, {'type': 'upload_started', 'upload_id': upload_id, 'filename': filename})
+
+    async def _handle_file_chunk(self, websocket, data: dict):
+        """
+        Учитывает очередную часть загружаемого файла, не сохраняя ее
+
+        Args:
+            websocket: WebSocket соединение
+            data: Данные запроса {'type': 'file_chunk', 'upload_id': '...', 'data': '...'}
+        """
+        analyzer = self.sessions[websocket].uploads.get(str(data.get('upload_id')))
+        if analyzer is None:
+            await self.send_error(websocket, "Неизвестная загрузка")
+            return
+        if isinstance(analyzer, ArchiveAnalysis):
+            await self.send_error(websocket, "Части архива передаются бинарными сообщениями")
+            return
+        chunk = data.get('data', '')
+        UPLOAD_BYTES.inc(len(chunk))
+        analyzer.feed(chunk)
+
+    async def _handle_file_end(self, websocket, data: dict):
+        """
+        Завершает загрузку файла по частям и отправляет результат
+
+        Args:
+            websocket: WebSocket соединение
+            data: Данные запроса {'type': 'file_end', 'upload_id': '...'}
+        """
+        upload_id = str(data.get('upload_id'))
+        uploads = self.sessions[websocket].uploads
+        if isinstance(uploads.get(upload_id), ArchiveAnalysis):
+            await self._finish_archive(websocket, upload_id, uploads)
+            return
+        analyzer = uploads.pop(upload_id, None)
+        if analyzer is None:
+            await self.send_error(websocket, "Неизвестная загрузка")
+            return
+
+        analysis = analyzer.result()
+        UPLOADS.inc()
+        self.sessions[websocket].record(analysis)
+        message = analysis.to_dict()
+        message['upload_id'] = upload_id
+        await self._send(websocket, message)
+
+    async def _finish_archive(self, websocket, upload_id: str, uploads: dict):
+        """
+        Дожидается распаковки и анализа оставшихся файлов архива и отправляет их результаты
+
+        Загрузка остается в сессии до конца анализа, чтобы ее можно было отменить сообщением
+        cancel с upload_id; разрыв соединения прерывает распаковку.
+
+        Args:
+            websocket: WebSocket соединение
+            upload_id: Идентификатор загрузки
+            uploads: Загрузки сессии соединения
+        """
+        archive = uploads[upload_id]
+        try:
+            async for result in archive.results():
+                await self._send_member_result(websocket, upload_id, archive, *result)
+        except asyncio.CancelledError:
+            archive.abort()
+            raise
+        finally:
+            if uploads.get(upload_id) is archive:
+                del uploads[upload_id]
+        if archive.aborted:
+            return
+
+        if archive.error is not None:
+            await self._send(websocket, {
+                'type': 'error',
+                'message': f"Ошибка чтения архива: {archive.error}",
+                'filename': archive.filename,
+                'upload_id': upload_id
+            })
+        await self._send(websocket, {
+            'type': 'archive_complete',
+            'upload_id': upload_id,
+            'filename': archive.filename,
+            'count': archive.members,
+            'failed': archive.failed
+        })
+
+    async def _send_member_result(self, websocket, upload_id: str, archive: ArchiveAnalysis, index: int,
+                                  name: str, result: Union[FileAnalysis, Exception]):
+        """Отправляет результат файла архива с идентификатором загрузки и номером файла в архиве"""
+        if isinstance(result, Exception):
+            prefix = "Ошибка декодирования файла" if isinstance(result, (UnicodeDecodeError, LookupError)) \
+                else "Ошибка при анализе файла"
+            message = {'type': 'error', 'message': f"{prefix}: {result}", 'filename': name}
+        else:
+            self.sessions[websocket].record(result)
+            message = result.to_dict()
+        message.update(upload_id=upload_id, archive=archive.filename, index=index)
+        await self._send(websocket, message)
+
+    async def _attach_session(self, websocket, token: Optional[str]):
+        """
+        Выдает клиенту токен сессии или продолжает сессию по токену после переподключения
+
+        Продолженная сессия получает результаты, полученные соединением до запроса (более
+        новые результаты заменяют прежние). Если сессия еще принадлежит старому соединению
+        (разрыв не замечен сервером), старое соединение закрывается.
+
+        Args:
+            websocket: WebSocket соединение
+            token: Токен прежней сессии; пустой или None - выдать токен текущей сессии
+        """
+        session = self.sessions[websocket]
+        resumed = None
+        if token and token != session.token:
+            resumed = self.session_store.take(str(token))
+            if resumed is None:
+                resumed = self._take_live_session(str(token), websocket)
+        if resumed is not None:
+            for analysis in session.results.values():
+                resumed.record(analysis)
+            resumed.uploads.update(session.uploads)
+            self._session_owners.pop(session.token, None)
+            self.sessions[websocket] = session = resumed
+
+        session.resumable = True
+        self._session_owners[session.token] = websocket
+        await self._send(websocket, {
+            'type': 'session',
+            'session': session.token,
+            'resumed': resumed is not None,
+            'stats': session.stats().to_dict(),
+            'results': [analysis.to_dict() for analysis in session.results.values()]
+        })
+
+    def _take_live_session(self, token: str, websocket) -> Optional[ClientSession]:
+        """Забирает сессию у другого (вероятно, оборванного) соединения и закрывает его"""
+        owner = self._session_owners.pop(token, None)
+        if owner is None or owner is websocket or owner not in self.sessions:
+            return None
+        session = self.sessions[owner]
+        self.sessions[owner] = ClientSession()
+        asyncio.ensure_future(owner.close(4000, "session resumed elsewhere"))
+        return session
+
     async def _send_stats(self, websocket):
         """
         Отправляет статистику клиенту
@@ -111,31 +709,28 @@ class WebSocketHandler(WebSocketHandlerInterface):
             websocket: WebSocket соединение
         """
         try:
-            with self.results_lock:
-                client_results = self.client_results.get(websocket, {})
-
-            # Подсчитываем статистику только для результатов конкретного клиента
-            total_words = sum(r.word_count for r in client_results.values())
-            total_chars = sum(r.char_count for r in client_results.values())
-            total_lines = sum(r.line_count for r in client_results.values())
-            total_files = len(client_results)
-
-            stats = Stats(
-                total_files=total_files,
-                total_words=total_words,
-                total_chars=total_chars,
-                total_lines=total_lines
-            )
-
+            # Итоги сессии накапливаются при сохранении результатов
             message = {
                 'type': 'stats',
-                'stats': stats.to_dict()
+                'stats': self.sessions[websocket].stats().to_dict()
             }
-            await websocket.send(json.dumps(message))
+            await self._send(websocket, message)
 
         except Exception as e:
             await self.send_error(websocket, f"Ошибка при получении статистики: {str(e)}")
 
+    async def _send(self, websocket, message: dict):
+        """
+        Отправляет JSON-сообщение клиенту и учитывает время отправки
+
+        Args:
+            websocket: WebSocket соединение
+            message: Сообщение
+        """
+        started = time.perf_counter()
+        await websocket.send(json.dumps(message))
+        SEND_LATENCY.observe(time.perf_counter() - started)
+
     async def send_error(self, websocket, message: str):
         """
         Отправляет сообщение об ошибке клиенту
@@ -149,6 +744,6 @@ class WebSocketHandler(WebSocketHandlerInterface):
                 'type': 'error',
                 'message': message
             }
-            await websocket.send(json.dumps(error_message))
+            await self._send(websocket, error_message)
         except:
             pass
\ No newline at end of file
@@ -0,0 +1,81 @@
+import codecs
+from typing import Tuple, Union
+
+from websocket.engine import DEFAULT_METRICS, MetricsEngine, parse_encoding
+from websocket.models import FileAnalysis
+
+
+class IncrementalAnalyzer:
+    """Подсчет метрик по частям содержимого файла"""
+
+    def __init__(self, filename: str, encoding: str = "utf-8", metrics: Tuple[str, ...] = DEFAULT_METRICS):
+        """
+        Инициализирует анализатор загружаемого по частям файла
+
+        Args:
+            filename: Имя файла
+            encoding: Кодировка частей, передаваемых в байтах
+            metrics: Метрики в каноническом порядке (см. engine.parse_metrics)
+
+        Raises:
+            LookupError: Если кодировка неизвестна или не является текстовой
+        """
+        self.filename = filename
+        self.encoding = parse_encoding(encoding)
+        # Слова и строки на границах частей учитывает движок метрик
+        self.engine = MetricsEngine(metrics)
+        # Старшая половина суррогатной пары, разрезанной границей части
+        self._pending = ''
+        # Декодер байтовых частей; создается при первой такой части
+        self._decoder = None
+        self._raw_bytes = 0
+
+    def feed(self, chunk: str):
+        """
+        Учитывает очередную часть содержимого
+
+        Args:
+            chunk: Часть содержимого файла
+        """
+        if self._pending:
+            if chunk and '\udc00' <= chunk[0] <= '\udfff':
+                # Склеиваем суррогатную пару в один символ, как при разборе целого JSON
+                pair = (self._pending + chunk[0]).encode('utf-16-le', 'surrogatepass').decode('utf-16-le')
+                chunk = pair + chunk[1:]
+            else:
+                chunk = self._pending + chunk
+            self._pending = ''
+        if chunk and '\ud800' <= chunk[-1] <= '\udbff':
+            self._pending = chunk[-1]
+            chunk = chunk[:-1]
+        self.engine.feed(chunk)
+
+    def feed_bytes(self, chunk: Union[bytes, memoryview]):
+        """
+        Учитывает очередную часть содержимого в байтах
+
+        Инкрементальный декодер сохраняет многобайтовый символ, разрезанный границей частей
+
+        Args:
+            chunk: Часть содержимого файла в байтах
+
+        Raises:
+            UnicodeDecodeError: Если часть не декодируется в кодировке загрузки
+        """
+        if self._decoder is None:
+            self._decoder = codecs.getincrementaldecoder(self.encoding)()
+        self._raw_bytes += len(chunk)
+        self.feed(self._decoder.decode(chunk))
+
+    def result(self) -> FileAnalysis:
+        """Возвращает результат анализа всех полученных частей"""
+        if self._decoder is not None:
+            self.feed(self._decoder.decode(b'', final=True))
+        if self._pending:
+            self.engine.feed(self._pending)
+            self._pending = ''
+        values = self.engine.result()
+        if self._decoder is not None and "bytes" in values:
+            # Размер исходных байт, а не текста в UTF-8 - как при анализе файла целиком
+            values["bytes"] = self._raw_bytes
+        return FileAnalysis.from_metrics(self.filename, values)
@@ -1,24 +1,51 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+# Поля FileAnalysis для метрик движка анализа (websocket/engine.py)
+METRIC_FIELDS = {
+    'lines': 'line_count',
+    'words': 'word_count',
+    'chars': 'char_count',
+    'bytes': 'byte_count',
+    'longest_line': 'longest_line',
+    'unique_words': 'unique_words'
+}
 
 
 @dataclass
 class FileAnalysis:
-    """Модель для хранения результатов анализа файла"""
+    """Модель для хранения результатов анализа файла; незапрошенные метрики равны None"""
     filename: str
-    word_count: int
-    char_count: int
-    line_count: int
+    word_count: Optional[int]
+    char_count: Optional[int]
+    line_count: Optional[int]
+    byte_count: Optional[int] = None
+    longest_line: Optional[int] = None
+    unique_words: Optional[int] = None
+
+    @classmethod
+    def from_metrics(cls, filename: str, values: Dict[str, int]) -> 'FileAnalysis':
+        """Создает результат из словаря {метрика: значение}"""
+        fields = {METRIC_FIELDS[metric]: value for metric, value in values.items()}
+        return cls(
+            filename=filename,
+            word_count=fields.pop('word_count', None),
+            char_count=fields.pop('char_count', None),
+            line_count=fields.pop('line_count', None),
+            **fields
+        )
 
     def to_dict(self) -> dict:
-        """Преобразует объект в словарь для отправки клиенту"""
-        return {
+        """Преобразует объект в словарь для отправки клиенту; незапрошенные метрики не передаются"""
+        result = {
             'type': 'analysis',
-            'filename': self.filename,
-            'word_count': self.word_count,
-            'char_count': self.char_count,
-            'line_count': self.line_count
+            'filename': self.filename
         }
+        for field in METRIC_FIELDS.values():
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        return result
 
 
 @dataclass
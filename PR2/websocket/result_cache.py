@@ -0,0 +1,130 @@
+import codecs
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Dict, Optional, Tuple, Union
+
+from websocket.models import FileAnalysis
+
+ContentKey = Tuple[int, bytes]
+# Ключ результата: ключ содержимого и набор метрик анализа
+AnalysisKey = Tuple[int, bytes, Tuple[str, ...]]
+
+
+def content_key(content: Union[str, bytes, memoryview], encoding: str = "utf-8") -> ContentKey:
+    """
+    Вычисляет ключ кэша по содержимому файла
+
+    Текст хэшируется в UTF-8, поэтому текст и те же данные в байтах UTF-8 дают одинаковый ключ.
+    Одиночные суррогаты (допустимы в строках JSON) кодируются как есть (surrogatepass), а ключ
+    такого текста отличается от ключа тех же байт: строгий декодер UTF-8 их не принимает
+
+    Args:
+        content: Содержимое файла (текст или байты)
+        encoding: Кодировка байтового содержимого
+
+    Returns:
+        Пара (длина в байтах, 128-битный хэш BLAKE2b)
+    """
+    marker = b""
+    if isinstance(content, str):
+        encoding = "utf-8"
+        try:
+            data = content.encode("utf-8")
+        except UnicodeEncodeError:
+            data, marker = content.encode("utf-8", "surrogatepass"), b"surrogatepass\0"
+    else:
+        data = content
+    hasher = content_hasher(encoding)
+    hasher.update(marker)
+    hasher.update(data)
+    return len(data), hasher.digest()
+
+
+def content_hasher(encoding: str = "utf-8"):
+    """
+    Создает хэш байтового содержимого для ключа кэша, вычисляемого по частям
+
+    Ключ содержимого - пара (длина в байтах, digest() хэша), как у content_key
+
+    Args:
+        encoding: Кодировка содержимого
+
+    Returns:
+        Объект hashlib, в который передаются байты содержимого
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    name = codecs.lookup(encoding).name
+    if name != "utf-8":
+        # Одинаковые байты в разных кодировках - разный текст
+        hasher.update(name.encode("ascii") + b"\0")
+    return hasher
+
+
+class ResultCache:
+    """LRU-кэш результатов анализа, ограниченный числом записей и объемом памяти"""
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 16 << 20):
+        """
+        Инициализирует кэш результатов
+
+        Args:
+            max_entries: Максимальное количество записей
+            max_bytes: Максимальный оценочный объем памяти записей в байтах
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[AnalysisKey, Tuple[FileAnalysis, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: AnalysisKey) -> Optional[FileAnalysis]:
+        """Возвращает результат по ключу и отмечает его как недавно использованный"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: AnalysisKey, analysis: FileAnalysis):
+        """Сохраняет результат, вытесняя давно неиспользованные записи"""
+        size = self._entry_size(key, analysis)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (analysis, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша для подбора его размера"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    @staticmethod
+    def _entry_size(key: AnalysisKey, analysis: FileAnalysis) -> int:
+        """Оценивает объем памяти записи"""
+        size = sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(analysis)
+        for field in fields(analysis):
+            size += sys.getsizeof(getattr(analysis, field.name))
+        return size
@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, Hashable, List, Optional
+
+# Владелец задач анализа (соединение); обработчик задает его на время обслуживания соединения,
+# и задачи, запущенные из этого контекста, планируются в очереди соединения
+job_owner: contextvars.ContextVar[Optional[Hashable]] = contextvars.ContextVar("job_owner", default=None)
+
+
+class _Job:
+    """Задача, ожидающая свободного воркера"""
+
+    __slots__ = ("size", "key", "future", "function", "args", "executor")
+
+    def __init__(self, size: int, key: float, future: Future, function: Callable, args: tuple,
+                 executor: Optional[Executor] = None):
+        self.size = size
+        self.key = key
+        self.future = future
+        self.function = function
+        self.args = args
+        self.executor = executor
+
+
+class _OwnerQueue:
+    """Очередь задач одного владельца"""
+
+    __slots__ = ("owner", "jobs", "finish", "version")
+
+    def __init__(self, owner: Hashable, finish: float):
+        self.owner = owner
+        # Куча (ключ SJF со старением, порядковый номер, задача)
+        self.jobs: List[tuple] = []
+        # Виртуальное время владельца: сколько работы ему уже выдано
+        self.finish = finish
+        # Версия записи владельца в общей куче (устаревшие записи пропускаются)
+        self.version = 0
+
+
+class JobScheduler:
+    """
+    Планировщик задач анализа перед пулом исполнителя
+
+    В пуле одновременно не больше slots задач, остальные ждут здесь, и порядок их запуска
+    определяет планировщик, а не очередь FIFO пула:
+
+    - между владельцами (соединениями) - справедливое чередование: выбирается владелец,
+      у которого работа завершилась бы раньше всех по его виртуальному времени (объем уже
+      выданной ему работы плюс объем следующей задачи), поэтому соединение с потоком задач
+      не вытесняет остальных, а мелкая задача другого соединения идет раньше крупной;
+    - внутри владельца - сначала короткие задачи со старением: ключ задачи - момент
+      поступления плюс size / aging_rate, поэтому крупная задача ждет не дольше, чем
+      ее размер, деленный на aging_rate, сколько бы мелких задач ни поступало после нее.
+
+    Планировщик используется только из event loop; завершение задачи из потока пула
+    передается в event loop через call_soon_threadsafe.
+    """
+
+    def __init__(self, executor: Executor, slots: int, aging_rate: float = 16 << 20, job_overhead: int = 4096):
+        """
+        Инициализирует планировщик
+
+        Args:
+            executor: Пул исполнителя
+            slots: Число задач, одновременно переданных в пул (обычно число воркеров)
+            aging_rate: Скорость старения внутри очереди владельца в байтах в секунду
+            job_overhead: Условный объем любой задачи: пустые задачи тоже чего-то стоят
+        """
+        self.executor = executor
+        self.slots = slots
+        self.aging_rate = aging_rate
+        self.job_overhead = job_overhead
+        self.running = 0
+        self._owners: Dict[Hashable, _OwnerQueue] = {}
+        # Общая куча (время завершения, порядковый номер, версия, очередь владельца)
+        self._heap: List[tuple] = []
+        self._virtual_time = 0.0
+        self._pending = 0
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pending(self) -> int:
+        """Число задач, ожидающих свободного воркера"""
+        return self._pending
+
+    def submit(self, size: int, function: Callable, *args, executor: Optional[Executor] = None) -> Future:
+        """
+        Ставит задачу в очередь владельца из контекста (см. job_owner)
+
+        Args:
+            size: Объем содержимого задачи
+            function: Функция, выполняемая в пуле
+            *args: Аргументы функции
+            executor: Пул для этой задачи вместо основного (задача все равно занимает одно из slots
+                      мест, поэтому чередуется с остальными задачами)
+
+        Returns:
+            Future задачи; отмена до запуска убирает задачу из очереди
+        """
+        self._loop = asyncio.get_running_loop()
+        owner = job_owner.get()
+        queue = self._owners.get(owner)
+        if queue is None:
+            # Простаивавший владелец начинает с текущего виртуального времени, без накопленного кредита
+            queue = self._owners[owner] = _OwnerQueue(owner, self._virtual_time)
+        future = Future()
+        key = time.monotonic() + size / self.aging_rate
+        job = _Job(size, key, future, function, args, executor)
+        head = queue.jobs[0][2] if queue.jobs else None
+        heapq.heappush(queue.jobs, (key, next(self._seq), job))
+        self._pending += 1
+        future.add_done_callback(self._job_cancelled)
+        if queue.jobs[0][2] is not head:
+            self._push_owner(queue)
+        self._dispatch()
+        return future
+
+    def cancel_pending(self):
+        """Отменяет все ожидающие задачи (при остановке сервиса)"""
+        for queue in self._owners.values():
+            for _, _, job in queue.jobs:
+                job.future.cancel()
+            queue.jobs.clear()
+        self._owners.clear()
+        self._heap.clear()
+
+    def _push_owner(self, queue: _OwnerQueue):
+        """Обновляет запись владельца в общей куче по его следующей задаче"""
+        queue.version += 1
+        size = queue.jobs[0][2].size
+        finish = max(queue.finish, self._virtual_time) + size + self.job_overhead
+        heapq.heappush(self._heap, (finish, next(self._seq), queue.version, queue))
+
+    def _next_job(self) -> Optional[_Job]:
+        """Выбирает следующую задачу; None - очередь пуста"""
+        while self._heap:
+            _, _, version, queue = heapq.heappop(self._heap)
+            if version != queue.version or not queue.jobs:
+                continue
+            _, _, job = heapq.heappop(queue.jobs)
+            if not job.future.cancelled():
+                self._pending -= 1
+            start = max(queue.finish, self._virtual_time)
+            self._virtual_time = start
+            queue.finish = start + job.size + self.job_overhead
+            if queue.jobs:
+                self._push_owner(queue)
+            else:
+                del self._owners[queue.owner]
+            return job
+        return None
+
+    def _job_cancelled(self, future: Future):
+        # Отменить можно только задачу в очереди; сама запись удаляется при выборе следующей задачи
+        if future.cancelled():
+            self._pending -= 1
+
+    def _dispatch(self):
+        """Передает задачи в пул, пока есть свободные места"""
+        while self.running < self.slots:
+            job = self._next_job()
+            if job is None:
+                return
+            # Задача, отмененная в очереди, не запускается
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self.running += 1
+            try:
+                inner = (job.executor or self.executor).submit(job.function, *job.args)
+            except BaseException as e:
+                self.running -= 1
+                job.future.set_exception(e)
+                continue
+            inner.add_done_callback(lambda done, future=job.future: self._job_done(done, future))
+
+    def _job_done(self, inner: Future, future: Future):
+        """Завершение задачи в пуле (вызывается из потока пула)"""
+        if inner.cancelled():
+            # Задачу отменил пул (shutdown с cancel_futures); задача уже не в очереди, и future
+            # в состоянии RUNNING не отменить, поэтому ожидающие получают CancelledError asyncio,
+            # а не concurrent.futures (в 3.11 это разные классы)
+            future.set_exception(asyncio.CancelledError())
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+        try:
+            self._loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Event loop уже закрыт: новых задач не будет
+            pass
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
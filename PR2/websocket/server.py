@@ -1,24 +1,49 @@
+import asyncio
+from typing import Optional
+
 import websockets
 
+from monitoring.metrics import REGISTRY, write_snapshot
+from websocket.admission import AdmissionController
 from websocket.analysis_service import FileAnalysisService
 from websocket.interfaces import ServerInterface
 from websocket.handler import WebSocketHandler
+from websocket.session import SessionStore
 
 class WebSocketServer(ServerInterface):
     """Сервер для обработки WebSocket соединений"""
     
-    def __init__(self, host: str = 'localhost', port: int = 8765):
+    def __init__(self, host: str = 'localhost', port: int = 8765,
+                 backend: str = "thread", max_workers: int = 4,
+                 admission: Optional[AdmissionController] = None, files_root: Optional[str] = None,
+                 reuse_port: bool = False, metrics_dir: Optional[str] = None,
+                 metrics_interval: float = 1.0, session_store: Optional[SessionStore] = None):
         """
         Инициализирует WebSocket сервер
         
         Args:
             host: Хост для привязки сервера
             port: Порт для привязки сервера
+            backend: Исполнитель анализа файлов: "thread" или "process"
+            max_workers: Количество рабочих потоков или процессов анализа
+            admission: Контроль допуска задач анализа (общий бюджет и лимиты на соединение)
+            files_root: Каталог, файлы которого клиенты могут анализировать по ссылке (запрос paths)
+            reuse_port: Привязать порт с SO_REUSEPORT, чтобы несколько процессов-воркеров
+                        принимали соединения на одном порту (ядро распределяет соединения между ними)
+            metrics_dir: Каталог, куда процесс-воркер записывает снимки своих метрик
+                         (их суммирует /metrics супервизора); None - не записывать
+            metrics_interval: Период записи снимков метрик в секундах
+            session_store: Хранилище сессий отключившихся клиентов (время хранения и лимиты памяти)
         """
         self.host = host
         self.port = port
-        self.analysis_service = FileAnalysisService()
-        self.handler = WebSocketHandler(self.analysis_service)
+        self.analysis_service = FileAnalysisService(max_workers=max_workers, backend=backend)
+        self.admission = admission or AdmissionController()
+        self.handler = WebSocketHandler(self.analysis_service, admission=self.admission, files_root=files_root,
+                                        session_store=session_store)
+        self.reuse_port = reuse_port
+        self.metrics_dir = metrics_dir
+        self.metrics_interval = metrics_interval
         self.server = None
     
     async def start(self):
@@ -26,14 +51,31 @@ class WebSocketServer(ServerInterface):
         self.server = await websockets.serve(
             self.handler.handle_client,
             self.host,
-            self.port
+            self.port,
+            reuse_port=self.reuse_port or None
         )
         print(f"WebSocket сервер запущен на http://{self.host}:{self.port}")
-        await self.server.wait_closed()
+        if self.metrics_dir is None:
+            await self.server.wait_closed()
+            return
+        snapshots = asyncio.ensure_future(self._write_snapshots())
+        try:
+            await self.server.wait_closed()
+        finally:
+            snapshots.cancel()
+            write_snapshot(REGISTRY, self.metrics_dir)
+
+    async def _write_snapshots(self):
+        """Периодически записывает снимок метрик процесса"""
+        while True:
+            write_snapshot(REGISTRY, self.metrics_dir)
+            await asyncio.sleep(self.metrics_interval)
     
     async def stop(self):
         """Останавливает сервер"""
         if self.server:
             self.server.close()
             await self.server.wait_closed()
-            print("WebSocket сервер остановлен") 
\ No newline at end of file
+            print("WebSocket сервер остановлен")
+        # Ожидание пула выполняется вне event loop
+        await self.analysis_service.close() 
\ No newline at end of file
@@ -0,0 +1,175 @@
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Dict, Optional, Union
+
+from websocket.archive import ArchiveAnalysis
+from websocket.incremental import IncrementalAnalyzer
+from websocket.models import FileAnalysis, Stats
+
+
+def _analysis_size(analysis: FileAnalysis) -> int:
+    """Оценивает объем памяти результата анализа"""
+    size = sys.getsizeof(analysis)
+    for field in fields(analysis):
+        size += sys.getsizeof(getattr(analysis, field.name))
+    return size
+
+
+class ClientSession:
+    """
+    Состояние одного WebSocket соединения
+
+    Хранит результаты анализа по именам файлов вместе с накопленными итогами,
+    поэтому статистика возвращается за O(1) независимо от числа файлов.
+    Сессия используется только из event loop и не требует блокировок.
+    """
+
+    def __init__(self):
+        # Токен для продолжения сессии после переподключения (см. SessionStore)
+        self.token = secrets.token_urlsafe(16)
+        # Токен сообщен клиенту: после отключения сессию стоит сохранить
+        self.resumable = False
+        self.results: Dict[str, FileAnalysis] = {}
+        # Незавершенные загрузки по частям (файлы и архивы)
+        self.uploads: Dict[str, Union[IncrementalAnalyzer, ArchiveAnalysis]] = {}
+        self.total_words = 0
+        self.total_chars = 0
+        self.total_lines = 0
+        # Оценочный объем памяти результатов в байтах
+        self.size = 0
+
+    def record(self, analysis: FileAnalysis):
+        """
+        Сохраняет результат анализа, заменяя прежний результат файла с тем же именем
+
+        Args:
+            analysis: Результат анализа файла
+        """
+        previous = self.results.get(analysis.filename)
+        if previous is not None:
+            self._add(previous, -1)
+        self.results[analysis.filename] = analysis
+        self._add(analysis, 1)
+
+    def discard_uploads(self):
+        """Отбрасывает незавершенные загрузки; распаковка архивов прерывается"""
+        for upload in self.uploads.values():
+            if isinstance(upload, ArchiveAnalysis):
+                upload.abort()
+        self.uploads.clear()
+
+    def stats(self) -> Stats:
+        """Статистика по всем файлам сессии"""
+        return Stats(
+            total_files=len(self.results),
+            total_words=self.total_words,
+            total_chars=self.total_chars,
+            total_lines=self.total_lines
+        )
+
+    def _add(self, analysis: FileAnalysis, sign: int):
+        # Незапрошенные метрики (None) в итоги не входят
+        self.total_words += sign * (analysis.word_count or 0)
+        self.total_chars += sign * (analysis.char_count or 0)
+        self.total_lines += sign * (analysis.line_count or 0)
+        self.size += sign * _analysis_size(analysis)
+
+
+class SessionStore:
+    """
+    Сессии отключившихся клиентов, ожидающие переподключения
+
+    Сессия хранится ttl секунд с момента отключения; при превышении лимитов числа сессий
+    или их общего объема вытесняются сессии, отключившиеся раньше всех. Все сессии живут
+    одинаковое время, поэтому порядок отключения совпадает с порядком истечения срока,
+    и устаревшие сессии удаляются с начала очереди без отдельного таймера.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_sessions: int = 10000, max_bytes: int = 64 << 20):
+        """
+        Инициализирует хранилище сессий
+
+        Args:
+            ttl: Время хранения сессии после отключения в секундах
+            max_sessions: Максимальное число хранимых сессий
+            max_bytes: Максимальный оценочный объем результатов хранимых сессий в байтах
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # Токен -> (сессия, момент истечения срока) в порядке отключения
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.resumed = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def park(self, session: ClientSession, now: Optional[float] = None):
+        """
+        Сохраняет сессию отключившегося клиента
+
+        Незавершенные загрузки по частям не сохраняются: клиент не знает, какие части дошли
+
+        Args:
+            session: Сессия клиента
+            now: Текущее время по time.monotonic (для тестов)
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        session.discard_uploads()
+        if session.size > self.max_bytes or self.max_sessions <= 0:
+            self.evictions += 1
+            return
+        self._pop(session.token)
+        self._sessions[session.token] = (session, now + self.ttl)
+        self._bytes += session.size
+        while len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+            _, (evicted, _) = self._sessions.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def take(self, token: str, now: Optional[float] = None) -> Optional[ClientSession]:
+        """
+        Забирает сохраненную сессию для переподключившегося клиента
+
+        Args:
+            token: Токен сессии
+            now: Текущее время по time.monotonic (для тестов)
+
+        Returns:
+            Сессия или None, если токен неизвестен или срок хранения истек
+        """
+        self._expire(time.monotonic() if now is None else now)
+        session = self._pop(token)
+        if session is not None:
+            self.resumed += 1
+        return session
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики хранилища для подбора ttl и лимитов"""
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'resumed': self.resumed,
+            'expired': self.expired,
+            'evictions': self.evictions
+        }
+
+    def _pop(self, token: str) -> Optional[ClientSession]:
+        entry = self._sessions.pop(token, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[0].size
+        return entry[0]
+
+    def _expire(self, now: float):
+        """Удаляет сессии с истекшим сроком хранения"""
+        while self._sessions:
+            token, (session, expires) = next(iter(self._sessions.items()))
+            if expires > now:
+                break
+            self._pop(token)
+            self.expired += 1
@@ -0,0 +1,99 @@
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List
+
+
+class SharedBufferPool:
+    """Пул переиспользуемых сегментов разделяемой памяти для передачи данных в процессы"""
+
+    def __init__(self, min_segment_size: int = 1 << 16, max_idle_bytes: int = 256 << 20):
+        """
+        Инициализирует пул сегментов
+
+        Args:
+            min_segment_size: Минимальный размер сегмента; размеры округляются до степени двойки
+            max_idle_bytes: Сколько байт свободных сегментов хранится для повторного использования
+        """
+        # Трекер запускается до создания процессов-воркеров, чтобы они унаследовали его:
+        # иначе каждый воркер запустит свой трекер и при выходе удалит подключенные сегменты
+        resource_tracker.ensure_running()
+        self.min_segment_size = min_segment_size
+        self.max_idle_bytes = max_idle_bytes
+        self._idle: Dict[int, List[shared_memory.SharedMemory]] = {}
+        self._idle_bytes = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def size_class(self, size: int) -> int:
+        """Размер сегмента, в который помещается size байт"""
+        return max(self.min_segment_size, 1 << max(size - 1, 0).bit_length())
+
+    def acquire(self, size: int) -> shared_memory.SharedMemory:
+        """Выдает свободный сегмент не меньше size байт"""
+        segment_size = self.size_class(size)
+        with self._lock:
+            idle = self._idle.get(segment_size)
+            if idle:
+                self._idle_bytes -= segment_size
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return shared_memory.SharedMemory(create=True, size=segment_size)
+
+    def write(self, payload: bytes) -> shared_memory.SharedMemory:
+        """Выдает сегмент и копирует в него данные"""
+        segment = self.acquire(len(payload))
+        segment.buf[:len(payload)] = payload
+        return segment
+
+    def release(self, segment: shared_memory.SharedMemory):
+        """Возвращает сегмент в пул или уничтожает его, если пул заполнен"""
+        segment_size = self.size_class(segment.size)
+        with self._lock:
+            if segment_size == segment.size and self._idle_bytes + segment_size <= self.max_idle_bytes:
+                self._idle.setdefault(segment_size, []).append(segment)
+                self._idle_bytes += segment_size
+                return
+        self._destroy(segment)
+
+    def close(self):
+        """Уничтожает все свободные сегменты"""
+        with self._lock:
+            segments = [segment for idle in self._idle.values() for segment in idle]
+            self._idle.clear()
+            self._idle_bytes = 0
+        for segment in segments:
+            self._destroy(segment)
+
+    @staticmethod
+    def _destroy(segment: shared_memory.SharedMemory):
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def read_shared_text(name: str, length: int, encoding: str = "utf-8", errors: str = "strict") -> str:
+    """
+    Декодирует текст прямо из сегмента разделяемой памяти (вызывается в воркере)
+
+    Сегмент отключается сразу после чтения: супервизор может уничтожить его, когда вернет
+    в пул, и отображение, оставленное в воркере, держало бы память сегмента занятой
+
+    Args:
+        name: Имя сегмента
+        length: Длина данных в байтах
+        encoding: Кодировка данных
+        errors: Обработка ошибок декодирования (surrogatepass - для текста с одиночными суррогатами)
+
+    Returns:
+        Декодированный текст
+    """
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        with segment.buf[:length] as view:
+            return str(view, encoding, errors)
+    finally:
+        segment.close()